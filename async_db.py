@@ -0,0 +1,443 @@
+"""Asyncio counterpart of db.py, for API front ends running on an event loop.
+
+The database drivers block, so every connection call runs on a thread pool
+owned by AsyncPool, and coroutines wait for a free connection on an
+asyncio.Semaphore: the event loop itself never waits on the database.
+The SQL is db.py's own (its cursor-level _select_*/_write_* helpers), the
+functions return the same values as their db.py namesakes, and writes keep
+the shared catalog cache current the same way.
+
+    async with async_db.transaction() as conn:
+        rows = await conn.execute("SELECT ...", params)
+"""
+import asyncio
+import contextlib
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import metrics
+from backends import DB_ERRORS
+from metrics import instrumented
+
+
+class ConnectionFailed(Exception):
+    """No connection could be borrowed (where db.connect_db() returns None)."""
+
+
+class AsyncConnection:
+    """A borrowed connection; its calls run one at a time on the pool's threads."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._cursor = None
+        self._lock = asyncio.Lock()
+        self._pending = None
+
+    async def _call(self, fn, *args):
+        async with self._lock:
+            # A call whose awaiting task was cancelled may still be running.
+            if self._pending is not None and not self._pending.done():
+                await asyncio.wait([self._pending])
+            self._pending = self._pool.submit(fn, *args)
+            # Shielded so cancelling the caller never abandons the connection
+            # mid-statement; the pool waits for the call before releasing it.
+            return await asyncio.shield(self._pending)
+
+    def _run_with_cursor(self, fn, *args):
+        if self._cursor is None:
+            self._cursor = self._conn.cursor()
+        return fn(self._cursor, *args)
+
+    async def run(self, fn, *args):
+        """Runs fn(cursor, *args) on a worker thread and returns its result."""
+        return await self._call(self._run_with_cursor, fn, *args)
+
+    async def execute(self, query, params=()):
+        """Runs one statement; returns its rows for a SELECT, else the row count."""
+        def execute(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall() if cursor.description else cursor.rowcount
+        return await self.run(execute)
+
+    async def commit(self):
+        await self._call(self._conn.commit)
+
+    async def rollback(self):
+        await self._call(self._conn.rollback)
+
+
+class AsyncPool:
+    """Bounds concurrent connections with a semaphore over a db.ConnectionPool.
+
+    The wrapped pool keeps its health check and idle eviction; it is
+    created on first use, on a worker thread, since warming it up connects.
+    """
+
+    def __init__(self, factory, min_size=db.POOL_MIN_SIZE, max_size=db.POOL_MAX_SIZE,
+                 acquire_timeout=db.POOL_ACQUIRE_TIMEOUT, **pool_options):
+        self.factory = factory
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self._pool_options = dict(pool_options, min_size=min_size, max_size=max_size)
+        self._pool = None
+        self._init_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_size)
+        # One thread per connection, so a borrowed connection never waits for a thread.
+        self._executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix="async-db")
+
+    def submit(self, fn, *args, **kwargs):
+        return asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def _inner_pool(self):
+        if self._pool is None:
+            async with self._init_lock:
+                if self._pool is None:
+                    self._pool = await self.submit(db.ConnectionPool, self.factory, **self._pool_options)
+        return self._pool
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """Borrows a connection; raises ConnectionFailed if none can be had in time."""
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionFailed(f"No free connection after {self.acquire_timeout}s.")
+        try:
+            try:
+                pool = await self._inner_pool()
+            except DB_ERRORS as e:
+                print("Database connection failed:", e)
+                raise ConnectionFailed(str(e)) from e
+            acquiring = self.submit(pool.acquire)
+            try:
+                conn = await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # The connection may still arrive; hand it straight back.
+                acquiring.add_done_callback(
+                    lambda f: f.exception() is None and self._executor.submit(f.result().close))
+                raise
+            except DB_ERRORS + (db.PoolTimeoutError,) as e:
+                print("Database connection failed:", e)
+                raise ConnectionFailed(str(e)) from e
+            # Includes the wait for a semaphore slot, unlike the "db" series.
+            metrics.observe_acquire("async_db", time.monotonic() - started)
+
+            wrapper = AsyncConnection(self, conn)
+            try:
+                yield wrapper
+            finally:
+                if wrapper._pending is not None and not wrapper._pending.done():
+                    await asyncio.wait([wrapper._pending])
+                # release() rolls back whatever was left uncommitted
+                await asyncio.shield(self.submit(conn.close))
+        finally:
+            self._slots.release()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Borrows a connection for one transaction: committed on exit, rolled back on error."""
+        async with self.connection() as conn:
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            await conn.commit()
+
+    def stats(self):
+        return self._pool.stats() if self._pool is not None else {}
+
+    async def close(self):
+        if self._pool is not None:
+            await self.submit(self._pool.close)
+        self._executor.shutdown(wait=False)
+
+
+_pool = None
+
+
+def configure_pool(factory=None, **options):
+    """Replaces the shared async pool; await close_pool() first to release the old one."""
+    global _pool
+    backend = db.get_backend()
+    if factory is None:
+        factory = backend.connect
+        options.setdefault("health_check", backend.ping)
+    _pool = AsyncPool(factory, **options)
+    return _pool
+
+
+def get_pool():
+    if _pool is None:
+        configure_pool()
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+def connection():
+    return get_pool().connection()
+
+
+def transaction():
+    return get_pool().transaction()
+
+
+async def run_in_transaction(fn, *args, attempts=db.ORDER_RETRY_ATTEMPTS, base_delay=db.ORDER_RETRY_BASE_DELAY):
+    """Runs fn(cursor, *args) in its own transaction, re-running it on lock waits and deadlocks."""
+    for attempt in range(attempts):
+        try:
+            async with transaction() as conn:
+                return await conn.run(fn, *args)
+        except DB_ERRORS as e:
+            if attempt == attempts - 1 or not db.get_backend().is_retryable(e):
+                raise
+            await asyncio.sleep(base_delay * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+@instrumented
+async def check_user_credentials(username):
+    try:
+        async with connection() as conn:
+            return await conn.run(db._select_password, username)
+    except ConnectionFailed:
+        return None
+
+
+#  PRODUCT
+
+def _load_catalog(cursor):
+    return db._catalog.products(functools.partial(db._select_products, cursor))
+
+
+def _search_catalog(cursor, prefix, limit, in_stock_only):
+    return db._catalog.search(functools.partial(db._select_products, cursor), prefix, limit, in_stock_only)
+
+
+async def _read_catalog(cached, read, *args):
+    """cached(*args) on the event loop while the catalog is fresh, else read(cursor, *args) on a worker.
+
+    The cache never blocks the loop: a miss, an expired entry or a refresh
+    in progress on another thread sends the read to a pooled connection.
+    Returns None if the database is unreachable.
+    """
+    result = cached(*args)
+    if result is not None:
+        return result
+    try:
+        async with connection() as conn:
+            return await conn.run(read, *args)
+    except ConnectionFailed:
+        return None
+
+
+@instrumented
+async def get_products():
+    products = await _read_catalog(db._catalog.cached, _load_catalog)
+    return [] if products is None else list(products)
+
+
+@instrumented
+async def search_products(prefix, limit=db.SEARCH_LIMIT, in_stock_only=False):
+    matches = await _read_catalog(db._catalog.cached_search, _search_catalog, prefix.strip(), limit, in_stock_only)
+    return [] if matches is None else matches
+
+
+@instrumented
+async def get_products_page(after=None, limit=db.PAGE_SIZE, in_stock_only=False):
+    products = await _read_catalog(db._catalog.cached, _load_catalog)
+    if products is None:
+        return [], None
+    return db._products_page(products, after, limit, in_stock_only)
+
+
+@instrumented
+async def handle_add_or_update(name, price, stock):
+    try:
+        async with transaction() as conn:
+            message, product_id = await conn.run(db._write_add_or_update, name, price, stock)
+    except ConnectionFailed:
+        return "Database connection failed.", False
+    except DB_ERRORS as e:
+        return f"Database Error during Add/Update: {e}", False
+    db.invalidate_catalog([product_id])
+    return message, True
+
+
+@instrumented
+async def update_product(product_id, name, price, stock):
+    try:
+        async with transaction() as conn:
+            updated = await conn.run(db._write_product, product_id, name, price, stock)
+    except ConnectionFailed:
+        return False
+    except DB_ERRORS as e:
+        print(f"Update error: {e}")
+        return False
+    db._product_written(product_id, name, price, stock, updated)
+    return True
+
+
+@instrumented
+async def delete_product(product_id):
+    try:
+        async with transaction() as conn:
+            deleted = await conn.run(db._write_product_delete, product_id)
+    except (ConnectionFailed,) + DB_ERRORS:
+        return False
+    db._catalog.remove(product_id)
+    return deleted
+
+
+#  ORDERS
+
+@instrumented
+async def get_orders():
+    try:
+        async with connection() as conn:
+            return await conn.run(db._select_orders)
+    except ConnectionFailed:
+        return []
+
+
+@instrumented
+async def get_orders_page(after=None, limit=db.PAGE_SIZE):
+    try:
+        async with connection() as conn:
+            return await conn.run(db._select_orders_page, after, limit)
+    except ConnectionFailed:
+        return [], None
+
+
+@instrumented
+async def get_order_items_bulk(order_ids):
+    order_ids = list(dict.fromkeys(order_ids))
+    if not order_ids:
+        return {}
+    try:
+        async with connection() as conn:
+            return await conn.run(db._select_order_items, order_ids)
+    except ConnectionFailed:
+        return {}
+    except DB_ERRORS as e:
+        print(f"Error fetching order items: {e}")
+        return {}
+
+
+@instrumented
+async def get_order_items(order_id):
+    return (await get_order_items_bulk([order_id])).get(order_id, [])
+
+
+@instrumented
+async def create_new_order(customer_name, order_items_list):
+    problem = db.order_items_problem(order_items_list)
+    if problem:
+        return None, problem
+    requested = db._requested_quantities(order_items_list)
+    try:
+        order_id, message = await run_in_transaction(db._write_order, customer_name, order_items_list, requested)
+    except ConnectionFailed:
+        return None, "Database connection failed."
+    except db.StockShortfall:
+        try:
+            async with connection() as conn:
+                return None, await conn.run(db._insufficient_stock_message, requested)
+        except ConnectionFailed:
+            return None, "Stock changed during checkout. Please try again."
+        except DB_ERRORS as e:
+            return None, f"Database Error: {e}"
+    except DB_ERRORS as e:
+        return None, f"Database Error: {e}"
+    except Exception as e:
+        return None, str(e)
+    if order_id is not None:
+        db.invalidate_catalog(requested)
+        db._orders_changed()
+    return order_id, message
+
+
+@instrumented
+async def update_payment_status(order_id, new_status):
+    if new_status not in db.PAYMENT_STATUSES:
+        return False, "Invalid status."
+    try:
+        async with transaction() as conn:
+            success, message = await conn.run(db._write_payment_status, order_id, new_status)
+            if not success:
+                await conn.rollback()
+        if success:
+            db._orders_changed()
+        return success, message
+    except ConnectionFailed:
+        return False, "Database connection failed."
+    except DB_ERRORS as e:
+        return False, f"Database error: {e}"
+
+
+@instrumented
+async def delete_order(order_id):
+    try:
+        async with transaction() as conn:
+            success, message, restocked = await conn.run(db._write_order_delete, order_id)
+            if not success:
+                await conn.rollback()
+                return False, message
+    except ConnectionFailed:
+        return False, "Database connection failed."
+    except DB_ERRORS as e:
+        return False, f"Error deleting order: {e}"
+    db.invalidate_catalog(restocked)
+    db._orders_changed()
+    return True, message
+
+
+#  INCOME REPORT
+
+@instrumented
+async def get_income_summary(date_range_days=30, first_day=None, last_day=None):
+    try:
+        async with connection() as conn:
+            return await conn.run(db._select_income_summary, date_range_days, first_day, last_day)
+    except ConnectionFailed:
+        return {'total_sales': 0.0, 'range_sales': 0.0, 'last_30_days': 0.0}
+
+
+@instrumented
+async def get_income_series(first_day, last_day, bucket="day"):
+    try:
+        async with connection() as conn:
+            return await conn.run(db._select_income_series, first_day, last_day, bucket)
+    except ConnectionFailed:
+        return []
+
+
+@instrumented
+async def get_income_report_details(date_range_days=60, first_day=None, last_day=None, bucket="day"):
+    try:
+        async with connection() as conn:
+            return await conn.run(db._select_income_details, date_range_days, first_day, last_day, bucket)
+    except ConnectionFailed:
+        return []
+
+
+@instrumented
+async def get_income_report(first_day=None, last_day=None, bucket="day"):
+    """Summary and details over one borrowed connection."""
+    try:
+        async with connection() as conn:
+            summary = await conn.run(db._select_income_summary, 30, first_day, last_day)
+            details = await conn.run(db._select_income_details, 60, first_day, last_day, bucket)
+    except ConnectionFailed:
+        summary, details = {'total_sales': 0.0, 'range_sales': 0.0, 'last_30_days': 0.0}, []
+    return dict(summary, details=details)
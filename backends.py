@@ -0,0 +1,181 @@
+import datetime
+import sqlite3
+import threading
+
+import schema
+
+try:
+    import mariadb
+except ImportError:
+    mariadb = None
+
+
+class BackendError(Exception):
+    """Raised when a storage backend cannot be used in this environment."""
+
+
+# Every driver error db.py is prepared to catch.
+DB_ERRORS = (sqlite3.Error, BackendError) + ((mariadb.Error,) if mariadb else ())
+
+
+def _ensure_schema(backend, conn):
+    """Runs pending migrations once per backend object, on its first connection."""
+    if backend._schema_ready:
+        return
+    with backend._schema_lock:
+        if not backend._schema_ready:
+            schema.migrate(conn, backend.name)
+            backend._schema_ready = True
+
+
+class MariaDBBackend:
+    """Central MariaDB server, the production store."""
+
+    name = "mariadb"
+    # Lock wait timeout and deadlock: the transaction can simply be re-run.
+    retryable_errnos = (1205, 1213)
+    # Strict mode refusing a value (NULL, out of range, wrong type, too long):
+    # re-running the same statement fails the same way.
+    data_errnos = (1048, 1264, 1292, 1366, 1406)
+
+    def __init__(self, **config):
+        self.config = config
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        if mariadb is None:
+            raise BackendError("The 'mariadb' package is not installed.")
+        conn = mariadb.connect(**self.config)
+        _ensure_schema(self, conn)
+        return conn
+
+    def ping(self, conn):
+        conn.ping()
+
+    def is_retryable(self, error):
+        return getattr(error, "errno", None) in self.retryable_errnos
+
+    def is_data_error(self, error):
+        """True if the values themselves were refused, so retrying cannot succeed."""
+        return ((mariadb is not None and isinstance(error, mariadb.DataError))
+                or getattr(error, "errno", None) in self.data_errnos)
+
+    def streaming_cursor(self, conn):
+        """Unbuffered cursor: rows are pulled from the server as they are fetched."""
+        return conn.cursor(buffered=False)
+
+    def prepared_cursor(self, conn):
+        """Binary-protocol cursor: its statement is parsed by the server once."""
+        return conn.cursor(prepared=True)
+
+    def begin(self, conn):
+        # autocommit is off: a transaction is already open, SAVEPOINTs nest in it
+        pass
+
+    def upsert(self, table, columns, source, key_columns, add_columns=(), set_columns=()):
+        """INSERT ... ON DUPLICATE KEY UPDATE; ``source`` is a VALUES or SELECT clause.
+
+        On a key clash, ``add_columns`` are incremented by the new value and
+        ``set_columns`` are overwritten with it.
+        """
+        updates = [f"{c} = {c} + VALUES({c})" for c in add_columns]
+        updates += [f"{c} = VALUES({c})" for c in set_columns]
+        return (f"INSERT INTO {table} ({', '.join(columns)}) {source} "
+                f"ON DUPLICATE KEY UPDATE {', '.join(updates)}")
+
+
+# SQLite has no native DATETIME type; store local times as ISO text so that
+# string comparison and ordering match chronological order.
+def _adapt_datetime(value):
+    return value.isoformat(" ", timespec="seconds")
+
+
+def _convert_datetime(raw):
+    return datetime.datetime.fromisoformat(raw.decode())
+
+
+def _convert_date(raw):
+    return datetime.date.fromisoformat(raw.decode()[:10])
+
+
+sqlite3.register_adapter(datetime.datetime, _adapt_datetime)
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("DATE", _convert_date)
+
+
+class SQLiteBackend:
+    """Embedded SQLite file in WAL mode, for offline tills, tests and benchmarks."""
+
+    name = "sqlite"
+
+    def __init__(self, path="inventory.db"):
+        self.path = path
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,   # pooled connections move between threads
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _ensure_schema(self, conn)
+        return conn
+
+    def ping(self, conn):
+        conn.execute("SELECT 1").fetchone()
+
+    def is_retryable(self, error):
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+    def is_data_error(self, error):
+        """True if the values themselves were refused, so retrying cannot succeed."""
+        message = str(error).lower()
+        return isinstance(error, sqlite3.DataError) or (
+            isinstance(error, sqlite3.IntegrityError) and ("not null" in message or "check constraint" in message))
+
+    def streaming_cursor(self, conn):
+        # sqlite3 cursors already step through results lazily.
+        return conn.cursor()
+
+    def prepared_cursor(self, conn):
+        # sqlite3 keeps compiled statements in a per-connection cache already.
+        return conn.cursor()
+
+    def begin(self, conn):
+        """Opens a write transaction explicitly.
+
+        sqlite3 only begins one implicitly before DML, and releasing an
+        outermost SAVEPOINT would commit. IMMEDIATE takes the write lock
+        up front: two deferred transactions that both read and then write
+        fail with "database is locked" instead of waiting.
+        """
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+
+    def upsert(self, table, columns, source, key_columns, add_columns=(), set_columns=()):
+        """INSERT ... ON CONFLICT DO UPDATE; ``source`` is a VALUES or SELECT clause.
+
+        A SELECT source must have a WHERE clause (SQLite parsing rule).
+        """
+        updates = [f"{c} = {table}.{c} + excluded.{c}" for c in add_columns]
+        updates += [f"{c} = excluded.{c}" for c in set_columns]
+        return (f"INSERT INTO {table} ({', '.join(columns)}) {source} "
+                f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {', '.join(updates)}")
+
+
+def backend_from_env(environ, mariadb_config):
+    """Picks the backend named by INVENTORY_DB_BACKEND (default: mariadb)."""
+    kind = environ.get("INVENTORY_DB_BACKEND", "mariadb").lower()
+    if kind == "sqlite":
+        return SQLiteBackend(environ.get("INVENTORY_SQLITE_PATH", "inventory.db"))
+    if kind == "mariadb":
+        return MariaDBBackend(**mariadb_config)
+    raise BackendError(f"Unknown backend '{kind}'.")
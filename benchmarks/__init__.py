@@ -0,0 +1 @@
+"""Stand-alone performance scripts. Run from the repo root with ``python -m benchmarks.<name>``."""
@@ -0,0 +1,121 @@
+"""Statements and latency of create_new_order against cart size.
+
+    python -m benchmarks.bench_create_order --sizes 1 5 20 100 --repeat 20
+
+Runs on a throw-away SQLite file unless --sqlite-path is given. The
+"per-line" column replays the old three-statements-per-line algorithm on
+the same data for comparison.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import db
+
+
+class CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter[0] += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter[0] += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    """Counts statements sent through cursors (one executemany counts once)."""
+
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        cursor = CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+        cursor.connection = self   # db.run_statement caches its cursors per connection
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def per_line_create_order(customer_name, order_items_list):
+    """The previous create_new_order algorithm: 3 statements per cart line."""
+    conn = db.connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO order_header (customer_name) VALUES (?)", (customer_name,))
+        order_id = cursor.lastrowid
+        total_amount = 0.0
+        for product_id, quantity in order_items_list:
+            cursor.execute("SELECT price, stock FROM products WHERE product_id=?", (product_id,))
+            price, stock = cursor.fetchone()
+            price = float(price)
+            total_amount += price * quantity
+            cursor.execute(
+                "INSERT INTO order_items (order_id, product_id, quantity, price_at_sale) VALUES (?, ?, ?, ?)",
+                (order_id, product_id, quantity, price)
+            )
+            cursor.execute("UPDATE products SET stock=? WHERE product_id=?", (stock - quantity, product_id))
+        cursor.execute(
+            "UPDATE order_header SET total_amount=?, payment_status='Paid' WHERE order_id=?",
+            (total_amount, order_id)
+        )
+        conn.commit()
+        return order_id, ""
+    finally:
+        conn.close()
+
+
+def measure(create, cart, repeat, counter):
+    timings = []
+    statements = 0
+    for _ in range(repeat):
+        counter[0] = 0
+        started = time.perf_counter()
+        order_id, message = create("bench", cart)
+        timings.append((time.perf_counter() - started) * 1000.0)
+        if order_id is None:
+            raise SystemExit(f"Order failed: {message}")
+        statements = counter[0]
+    return statements, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 20, 50, 100])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sqlite-path", default=None)
+    args = parser.parse_args()
+
+    path = args.sqlite_path or os.path.join(tempfile.mkdtemp(), "bench.db")
+    backend = db.SQLiteBackend(path)
+    counter = [0]
+    db.configure_backend(backend)
+    db.configure_pool(lambda: CountingConnection(backend.connect(), counter), health_check=backend.ping)
+
+    max_size = max(args.sizes)
+    stock_needed = 2 * len(args.sizes) * args.repeat * 2
+    for i in range(max_size):
+        db.handle_add_or_update(f"bench-item-{i}", 1.0 + i, stock_needed)
+    ids = [row[0] for row in db.get_products() if row[1].startswith("bench-item-")][:max_size]
+
+    print(f"{'cart':>6} {'stmts':>7} {'ms':>9} {'per-line stmts':>15} {'per-line ms':>12}")
+    for size in args.sizes:
+        cart = [(product_id, 1) for product_id in ids[:size]]
+        stmts, ms = measure(db.create_new_order, cart, args.repeat, counter)
+        old_stmts, old_ms = measure(per_line_create_order, cart, args.repeat, counter)
+        print(f"{size:>6} {stmts:>7} {ms:>9.3f} {old_stmts:>15} {old_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""scrypt cost against login latency, to pick INVENTORY_SCRYPT_N for a till.
+
+    python -m benchmarks.bench_password_hash --budget-ms 250
+
+For each n (r and p as in credentials.py) it times verify_password, which
+is what a login pays, and prints the memory one check needs. It then
+names the largest n whose median stays within the budget. Run it on the
+slowest till that will log in.
+"""
+import argparse
+import statistics
+import time
+
+import credentials
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--log2-n", type=int, nargs="+", default=[12, 13, 14, 15, 16, 17])
+    parser.add_argument("--r", type=int, default=credentials.SCRYPT_R)
+    parser.add_argument("--p", type=int, default=credentials.SCRYPT_P)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="login latency budget for one check")
+    args = parser.parse_args()
+
+    print(f"{'n':>8} {'memory MiB':>11} {'hash ms':>9} {'verify ms':>10}")
+    best = None
+    for log2_n in args.log2_n:
+        n = 2 ** log2_n
+        hash_times, verify_times = [], []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            stored = credentials.hash_password("correct horse", n, args.r, args.p)
+            hash_times.append((time.perf_counter() - started) * 1000.0)
+            started = time.perf_counter()
+            credentials.verify_password("correct horse", stored)
+            verify_times.append((time.perf_counter() - started) * 1000.0)
+        verify_ms = statistics.median(verify_times)
+        print(f"{n:>8} {128 * n * args.r / 2 ** 20:>11.0f} {statistics.median(hash_times):>9.1f} {verify_ms:>10.1f}")
+        if verify_ms <= args.budget_ms:
+            best = n
+
+    if best is None:
+        print(f"No tested n fits {args.budget_ms:.0f} ms; try smaller --log2-n values.")
+    else:
+        print(f"Largest n within {args.budget_ms:.0f} ms: INVENTORY_SCRYPT_N={best}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Time-to-login-screen of the Tk app, over several cold launches.
+
+    python -m benchmarks.bench_startup --runs 10
+
+Launches ``main2.py --startup-time`` repeatedly. The app prints how long it
+took from its first line to a drawn login screen, then exits. This script
+adds the whole-process time, which includes interpreter startup. Needs a
+display. Set INVENTORY_STARTUP_LOG to keep a history of the in-app figure.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main2.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    in_app, process = [], []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, MAIN, "--startup-time"], cwd=os.path.dirname(MAIN),
+                                capture_output=True, text=True)
+        process.append((time.perf_counter() - started) * 1000.0)
+        match = re.search(r"Login screen shown after ([\d.]+) ms", result.stdout)
+        if result.returncode != 0 or not match:
+            raise SystemExit(f"main2.py failed:\n{result.stderr or result.stdout}")
+        in_app.append(float(match.group(1)))
+
+    for label, values in (("to login screen", in_app), ("whole process", process)):
+        print(f"{label:>16}: median {statistics.median(values):7.1f} ms, "
+              f"min {min(values):7.1f} ms, max {max(values):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Deterministic synthetic data: products, order history and order lines.
+
+    python -m benchmarks.datagen --sqlite-path seeded.db --products 2000 --orders 50000
+
+The same seed and volumes always produce the same rows. Order dates are
+spread over the ``days`` before today (so the income report's 30/60-day
+windows have data whatever day it runs), and every order total equals the
+sum of its lines. Rows are bulk-inserted in BULK_CHUNK_SIZE batches, then
+the income rollup is rebuilt.
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+
+import db
+
+PAYMENT_WEIGHTS = (('Paid', 80), ('Pending', 15), ('Cancelled', 5))
+
+
+def generate(seed=1, products=1000, orders=10000, max_lines=8, days=365, stock=1000000):
+    """Seeds an empty database; returns {'products': n, 'orders': n, 'order_items': n}."""
+    rng = random.Random(seed)
+    statuses = [status for status, weight in PAYMENT_WEIGHTS for _ in range(weight)]
+    start = datetime.datetime.combine(datetime.date.today(), datetime.time()) - datetime.timedelta(days=days)
+
+    conn = db.connect_db()
+    if not conn:
+        raise ConnectionError("Database connection failed.")
+    cursor = conn.cursor()
+    try:
+        prices = [round(rng.uniform(0.5, 250.0), 2) for _ in range(products)]
+        product_rows = [(f"synthetic-{seed}-{i:06d}", price, stock) for i, price in enumerate(prices)]
+        for chunk in _chunks(product_rows):
+            cursor.executemany("INSERT INTO products (name, price, stock) VALUES (?, ?, ?)", chunk)
+        cursor.execute("SELECT product_id, name FROM products WHERE name LIKE ?", (f"synthetic-{seed}-%",))
+        by_name = dict((name, product_id) for product_id, name in cursor.fetchall())
+        product_ids = [by_name[row[0]] for row in product_rows]
+
+        cursor.execute("SELECT COALESCE(MAX(order_id), 0) FROM order_header")
+        first_order_id = cursor.fetchone()[0] + 1
+        headers = []
+        lines = []
+        for n in range(orders):
+            order_id = first_order_id + n
+            picks = rng.sample(range(products), rng.randint(1, min(max_lines, products)))
+            total = 0.0
+            for index in picks:
+                quantity = rng.randint(1, 5)
+                total += prices[index] * quantity
+                lines.append((order_id, product_ids[index], quantity, prices[index]))
+            order_date = start + datetime.timedelta(seconds=rng.randrange(days * 86400))
+            headers.append((order_id, f"customer-{rng.randrange(products * 5)}", order_date,
+                            round(total, 2), rng.choice(statuses)))
+
+        for chunk in _chunks(headers):
+            cursor.executemany(
+                "INSERT INTO order_header (order_id, customer_name, order_date, total_amount, payment_status) "
+                "VALUES (?, ?, ?, ?, ?)", chunk
+            )
+        for chunk in _chunks(lines):
+            cursor.executemany(
+                "INSERT INTO order_items (order_id, product_id, quantity, price_at_sale) VALUES (?, ?, ?, ?)", chunk
+            )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    success, message = db.rebuild_income_rollup()
+    if not success:
+        raise RuntimeError(message)
+    db.invalidate_catalog()
+    return {'products': products, 'orders': orders, 'order_items': len(lines)}
+
+
+def _chunks(rows, size=db.BULK_CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--max-lines", type=int, default=8)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--sqlite-path", help="default: a throw-away file")
+    parser.add_argument("--use-env-backend", action="store_true")
+    args = parser.parse_args()
+
+    if not args.use_env_backend:
+        path = args.sqlite_path or os.path.join(tempfile.mkdtemp(), "seeded.db")
+        db.configure_backend(db.SQLiteBackend(path))
+        print(f"Seeding {path}")
+    counts = generate(args.seed, args.products, args.orders, args.max_lines, args.days)
+    print(f"Inserted {counts['products']} products, {counts['orders']} orders, {counts['order_items']} order lines.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Load test for order_service: POST /orders latency percentiles and throughput.
+
+    python -m benchmarks.load_order_service --clients 1 16 64 --requests 2000
+    python -m benchmarks.load_order_service --batch-size 1     # batching off
+    python -m benchmarks.load_order_service --url http://127.0.0.1:8765 --product-ids 1 2 3
+
+By default an in-process service is started on a free port over a throw-away
+SQLite file seeded with load-* products. Each client thread keeps one HTTP
+keep-alive connection and posts random 1-4 line orders back to back. For
+every client count it prints requests/sec, p50/p90/p99/max latency, and the
+status codes seen (201 placed, 409 refused for stock, 503 backpressure).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import db
+import order_service
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def client(host, port, ids, requests, seed, latencies, statuses, lock):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    mine = []
+    codes = {}
+    for _ in range(requests):
+        items = [{'product_id': product_id, 'quantity': rng.randint(1, 3)}
+                 for product_id in rng.sample(ids, rng.randint(1, min(4, len(ids))))]
+        body = json.dumps({'customer_name': f"load-{seed}", 'items': items})
+        started = time.perf_counter()
+        try:
+            conn.request("POST", "/orders", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+            status = "error"
+        mine.append(time.perf_counter() - started)
+        codes[status] = codes.get(status, 0) + 1
+    conn.close()
+    with lock:
+        latencies.extend(mine)
+        for status, count in codes.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+
+def seed_products(count, stock):
+    tag = int(time.time())
+    for i in range(count):
+        message, ok = db.handle_add_or_update(f"load-{tag}-{i}", 1.0 + i % 10, stock)
+        if not ok:
+            raise SystemExit(message)
+    return [row[0] for row in db.get_products() if row[1].startswith(f"load-{tag}-")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per client count")
+    parser.add_argument("--url", help="target a running service instead of starting one")
+    parser.add_argument("--product-ids", type=int, nargs="+", help="products to order (with --url)")
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--stock", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=order_service.BATCH_MAX_SIZE)
+    parser.add_argument("--batch-wait-ms", type=float, default=order_service.BATCH_MAX_WAIT * 1000)
+    parser.add_argument("--queue-size", type=int, default=order_service.QUEUE_SIZE)
+    parser.add_argument("--use-env-backend", action="store_true")
+    args = parser.parse_args()
+
+    service = None
+    if args.url:
+        if not args.product_ids:
+            raise SystemExit("--url needs --product-ids.")
+        url = urlsplit(args.url)
+        host, port, ids = url.hostname, url.port or 80, args.product_ids
+    else:
+        if not args.use_env_backend:
+            db.configure_backend(db.SQLiteBackend(os.path.join(tempfile.mkdtemp(), "load.db")))
+        ids = seed_products(args.products, args.stock)
+        batcher = order_service.OrderBatcher(args.batch_size, args.batch_wait_ms / 1000, args.queue_size)
+        service = order_service.OrderService("127.0.0.1", 0, batcher)
+        host, port = service.server_address
+        threading.Thread(target=service.serve_forever, daemon=True).start()
+
+    print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+    try:
+        for clients in args.clients:
+            latencies, statuses, lock = [], {}, threading.Lock()
+            per_client = max(1, args.requests // clients)
+            threads = [
+                threading.Thread(target=client, args=(host, port, ids, per_client, seed, latencies, statuses, lock))
+                for seed in range(clients)
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            latencies.sort()
+            ms = [percentile(latencies, f) * 1000 for f in (0.5, 0.9, 0.99, 1.0)]
+            print(f"{clients:>8} {len(latencies) / elapsed:>8.0f} "
+                  + " ".join(f"{value:>8.1f}" for value in ms)
+                  + f"  {dict(sorted(statuses.items(), key=str))}")
+    finally:
+        if service is not None:
+            print(service.batcher.stats())
+            service.shutdown()
+            service.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Concurrent checkout stress test for the optimistic stock reservation.
+
+    python -m benchmarks.stress_stock_contention --writers 1 2 4 8 --orders 200
+
+For each writer count, fresh products with limited stock are created and
+that many threads place random orders against them. Reports orders/sec
+and fails (exit code 1) if any stock goes negative or if the units sold
+plus the remaining stock do not equal the starting stock.
+
+Uses a throw-away SQLite file by default. SQLite allows a single writer at
+a time, so use --use-env-backend with INVENTORY_DB_BACKEND=mariadb to see
+scaling on a server. Only products named stress-* are created and checked.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import db
+
+
+def create_products(run_tag, count, stock):
+    ids = []
+    for i in range(count):
+        name = f"stress-{run_tag}-{i}"
+        message, ok = db.handle_add_or_update(name, 1.0 + i % 10, stock)
+        if not ok:
+            raise SystemExit(message)
+    for product_id, name, price, current_stock in db.get_products():
+        if name.startswith(f"stress-{run_tag}-"):
+            ids.append(product_id)
+    return ids
+
+
+def writer(ids, orders, seed, results):
+    rng = random.Random(seed)
+    placed = rejected = failed = 0
+    for _ in range(orders):
+        cart = [(product_id, rng.randint(1, 3)) for product_id in rng.sample(ids, rng.randint(1, 4))]
+        order_id, message = db.create_new_order("stress", cart)
+        if order_id is not None:
+            placed += 1
+        elif message.startswith("Insufficient stock"):
+            rejected += 1
+        else:
+            failed += 1
+    results.append((placed, rejected, failed))
+
+
+def check_invariants(ids, stock):
+    conn = db.connect_db()
+    try:
+        cursor = conn.cursor()
+        placeholders = ", ".join("?" * len(ids))
+        cursor.execute(f"SELECT product_id, stock FROM products WHERE product_id IN ({placeholders})", tuple(ids))
+        remaining = dict(cursor.fetchall())
+        cursor.execute(
+            f"SELECT product_id, SUM(quantity) FROM order_items WHERE product_id IN ({placeholders}) GROUP BY product_id",
+            tuple(ids)
+        )
+        sold = dict(cursor.fetchall())
+    finally:
+        conn.close()
+
+    problems = []
+    for product_id in ids:
+        left = remaining[product_id]
+        units = int(sold.get(product_id, 0))
+        if left < 0:
+            problems.append(f"product {product_id}: negative stock {left}")
+        if left + units != stock:
+            problems.append(f"product {product_id}: {units} sold + {left} left != {stock}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--orders", type=int, default=200, help="orders per writer")
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--stock", type=int, default=150, help="starting stock per product")
+    parser.add_argument("--use-env-backend", action="store_true")
+    args = parser.parse_args()
+
+    if not args.use_env_backend:
+        db.configure_backend(db.SQLiteBackend(os.path.join(tempfile.mkdtemp(), "stress.db")))
+    db.configure_pool(max_size=max(args.writers) + 2)
+
+    print(f"{'writers':>8} {'placed':>7} {'rejected':>9} {'failed':>7} {'orders/s':>9}")
+    all_problems = []
+    for writers in args.writers:
+        ids = create_products(f"{writers}w{int(time.time())}", args.products, args.stock)
+        results = []
+        threads = [
+            threading.Thread(target=writer, args=(ids, args.orders, seed, results))
+            for seed in range(writers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        placed = sum(r[0] for r in results)
+        rejected = sum(r[1] for r in results)
+        failed = sum(r[2] for r in results)
+        print(f"{writers:>8} {placed:>7} {rejected:>9} {failed:>7} {(placed + rejected) / elapsed:>9.1f}")
+        all_problems.extend(check_invariants(ids, args.stock))
+
+    print(db.get_pool_stats())
+    if all_problems:
+        print("INVARIANT VIOLATIONS:")
+        for problem in all_problems:
+            print("  " + problem)
+        raise SystemExit(1)
+    print("OK: no negative stock, sold + remaining == starting stock for every product.")
+
+
+if __name__ == "__main__":
+    main()
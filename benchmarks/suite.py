@@ -0,0 +1,232 @@
+"""Benchmark suite over the db.py API, with JSON results for comparing changes.
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --compare before.json
+
+Seeds a throw-away SQLite file with benchmarks.datagen (same seed and
+volumes, same data), then times each API: catalog load (cold and cached),
+search, product and order paging, full history, order items, order
+placement at several cart sizes, delete with stock restore, the income
+report, the sales report (cold and cached), and concurrent checkout
+throughput. Each case reports median/p90/
+min/max milliseconds and the SQL statements it ran per call, so a change
+that adds round trips shows up even when the timings are noisy.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+import db
+import metrics
+import reporting
+from benchmarks.datagen import generate
+
+
+def _statement_count():
+    return sum(series['count'] for series in metrics.get_metrics()['statements'].values())
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def time_case(fn, repeat, setup=None):
+    """Calls fn() ``repeat`` times (after setup(), untimed); returns its timing summary."""
+    timings = []
+    statements = 0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        before = _statement_count()
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000.0)
+        statements = _statement_count() - before
+    timings.sort()
+    return {
+        'repeat': repeat,
+        'median_ms': statistics.median(timings),
+        'p90_ms': _percentile(timings, 0.9),
+        'min_ms': timings[0],
+        'max_ms': timings[-1],
+        'statements': statements,
+    }
+
+
+def walk_pages(fetch_page):
+    after = None
+    pages = 0
+    while True:
+        rows, after = fetch_page(after)
+        pages += 1
+        if after is None:
+            return pages
+
+
+def checkout_throughput(product_ids, writers, orders, seed):
+    """Places ``orders`` random orders from each of ``writers`` threads; returns orders/sec."""
+    failures = []
+
+    def writer(n):
+        rng = random.Random(seed * 1000 + n)
+        for _ in range(orders):
+            cart = [(product_id, rng.randint(1, 3)) for product_id in rng.sample(product_ids, rng.randint(1, 4))]
+            order_id, message = db.create_new_order("bench-checkout", cart)
+            if order_id is None:
+                failures.append(message)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if failures:
+        raise SystemExit(f"Checkout failed: {failures[0]}")
+    return writers * orders / elapsed
+
+
+def run_suite(args):
+    rng = random.Random(args.seed)
+    product_ids = [row[0] for row in db.get_products()]
+    results = {}
+
+    def case(name, fn, setup=None, repeat=args.repeat):
+        results[name] = time_case(fn, repeat, setup)
+        print(f"{name:<32} {results[name]['median_ms']:>10.3f} {results[name]['p90_ms']:>10.3f} "
+              f"{results[name]['statements']:>6}")
+
+    print(f"{'case':<32} {'median ms':>10} {'p90 ms':>10} {'stmts':>6}")
+    case("catalog_load_cold", db.get_products, setup=db.invalidate_catalog)
+    case("catalog_load_cached", db.get_products)
+    case("search_products", lambda: db.search_products("synthetic-", db.SEARCH_LIMIT, True))
+    case("products_page_walk", lambda: walk_pages(lambda after: db.get_products_page(after)), repeat=max(1, args.repeat // 5))
+    case("orders_first_page", db.get_orders_page)
+    case("orders_page_walk", lambda: walk_pages(db.get_orders_page), repeat=max(1, args.repeat // 5))
+    case("orders_all", db.get_orders, repeat=max(1, args.repeat // 5))
+    first_page_ids = [row[0] for row in db.get_orders_page()[0]]
+    case("order_items_bulk_page", lambda: db.get_order_items_bulk(first_page_ids))
+    case("order_items_one", lambda: db.get_order_items(first_page_ids[0]))
+    case("income_report", db.get_income_report)
+    case("sales_report_cold", reporting.get_sales_report, setup=reporting.clear_cache, repeat=max(1, args.repeat // 5))
+    case("sales_report_cached", reporting.get_sales_report)
+
+    placed = []
+    for size in args.cart_sizes:
+        carts = iter([[(product_id, 1) for product_id in rng.sample(product_ids, size)]
+                      for _ in range(args.repeat)])
+
+        def place():
+            order_id, message = db.create_new_order("bench", next(carts))
+            if order_id is None:
+                raise SystemExit(f"Order failed: {message}")
+            placed.append(order_id)
+        case(f"create_order_cart_{size}", place)
+
+    to_delete = iter(placed)
+
+    def delete():
+        success, message = db.delete_order(next(to_delete))
+        if not success:
+            raise SystemExit(f"Delete failed: {message}")
+    case("delete_order_restock", delete, repeat=min(args.repeat, len(placed)))
+
+    throughput = {}
+    for writers in args.writers:
+        throughput[str(writers)] = checkout_throughput(product_ids, writers, args.checkout_orders, args.seed)
+        print(f"checkout_{writers}_writers{'':<16} {throughput[str(writers)]:>10.1f} orders/s")
+    return results, throughput
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline['meta']['volumes'] != report['meta']['volumes']:
+        print("Warning: the baseline was seeded with different volumes.")
+    print(f"\n{'case':<32} {'base ms':>10} {'now ms':>10} {'change':>8} {'stmts':>9}")
+    for name, now in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        change = (now['median_ms'] - base['median_ms']) / base['median_ms'] * 100.0 if base['median_ms'] else 0.0
+        stmts = f"{base['statements']}->{now['statements']}"
+        print(f"{name:<32} {base['median_ms']:>10.3f} {now['median_ms']:>10.3f} {change:>+7.1f}% {stmts:>9}")
+    for writers, now in report['checkout_orders_per_sec'].items():
+        base = baseline['checkout_orders_per_sec'].get(writers)
+        if base:
+            print(f"{'checkout_' + writers + '_writers':<32} {base:>10.1f} {now:>10.1f} "
+                  f"{(now - base) / base * 100.0:>+7.1f}%   orders/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--max-lines", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--cart-sizes", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--checkout-orders", type=int, default=100, help="orders per writer")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="print changes against an earlier --output file")
+    parser.add_argument("--sqlite-path", help="default: a throw-away file")
+    parser.add_argument("--use-env-backend", action="store_true", help="run against an empty database from the environment")
+    args = parser.parse_args()
+
+    if args.use_env_backend:
+        backend = db.get_backend()
+        db.configure_pool(max_size=max(args.writers) + 2)
+    else:
+        path = args.sqlite_path or os.path.join(tempfile.mkdtemp(), "suite.db")
+        backend = db.SQLiteBackend(path)
+        db.configure_backend(backend, max_size=max(args.writers) + 2)
+    metrics.configure(slow_query_ms=float("inf"))   # keep the slow-query log out of the timings
+
+    started = time.perf_counter()
+    counts = generate(args.seed, args.products, args.orders, args.max_lines)
+    print(f"Seeded {counts} in {time.perf_counter() - started:.1f}s\n")
+
+    results, throughput = run_suite(args)
+    report = {
+        'meta': {
+            'created': datetime.datetime.now().isoformat(timespec="seconds"),
+            'commit': _git_commit(),
+            'backend': backend.name,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'volumes': counts,
+            'repeat': args.repeat,
+        },
+        'results': results,
+        'checkout_orders_per_sec': throughput,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Cart pricing and stock checks against a short-lived snapshot of the cart's products.
+
+The order screen's product table can be minutes old, so the cart keeps
+its own snapshot of name, price and stock for just the products in it.
+The snapshot is re-read in one batched query (db.get_cart_products) when
+an item is added and again before checkout once it is older than
+SNAPSHOT_TTL seconds. Every shortfall is reported at once, and a cart that
+cannot be placed fails before create_new_order is called.
+create_new_order's conditional stock update stays the final check.
+"""
+import os
+import threading
+import time
+
+import db
+from backends import DB_ERRORS
+
+SNAPSHOT_TTL = float(os.environ.get("INVENTORY_CART_TTL", 2.0))   # seconds
+
+
+class Cart:
+    """Quantities per product plus the snapshot they were last checked against.
+
+    ``version`` goes up whenever the lines, prices or stock the cart shows
+    change, so the screen can tell when to redraw. Methods may run on
+    worker threads; a lock keeps the lines and the snapshot consistent and
+    is never held across a database read.
+    """
+
+    def __init__(self, ttl=SNAPSHOT_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.RLock()
+        self._quantities = {}       # product_id -> quantity, in the order added
+        self._snapshot = {}         # product_id -> (name, price, stock)
+        self._taken_at = None
+        self._queries = 0
+
+    def __len__(self):
+        return len(self._quantities)
+
+    def _stale(self, product_ids):
+        return (self._taken_at is None or time.monotonic() - self._taken_at > self.ttl
+                or any(product_id not in self._snapshot for product_id in product_ids))
+
+    def revalidate(self, extra_ids=(), force=False):
+        """Re-reads the snapshot in one query if it is stale; returns (success, message).
+
+        ``extra_ids`` are products about to be added. A failed read leaves
+        the previous snapshot in place.
+        """
+        with self._lock:
+            product_ids = list(self._quantities) + [i for i in extra_ids if i not in self._quantities]
+            if not product_ids or not (force or self._stale(product_ids)):
+                return True, ""
+        # Not under the lock: the Tk thread redraws from lines() meanwhile
+        try:
+            snapshot = db.get_cart_products(product_ids)
+        except DB_ERRORS as e:
+            return False, f"Database Error: {e}"
+        if snapshot is None:
+            return False, "Database connection failed."
+        with self._lock:
+            self._queries += 1
+            if any(self._snapshot.get(product_id) != row for product_id, row in snapshot.items()):
+                self.version += 1
+            for product_id in product_ids:
+                self._snapshot.pop(product_id, None)     # deleted products drop out
+            self._snapshot.update(snapshot)
+            self._taken_at = time.monotonic()
+            return True, ""
+
+    def shortfalls(self, quantities=None):
+        """[(product_id, available, requested)] for every line the snapshot cannot cover; unknown products have 0."""
+        with self._lock:
+            quantities = self._quantities if quantities is None else quantities
+            available = {product_id: row[2] for product_id, row in self._snapshot.items()}
+            return db.stock_shortfalls(quantities, available)
+
+    def _problems(self, quantities):
+        """A message naming every unknown or short product, or "" if the cart can be placed."""
+        missing = [product_id for product_id in quantities if product_id not in self._snapshot]
+        if missing:
+            return f"Product ID {', '.join(str(product_id) for product_id in missing)} not found."
+        shortfalls = self.shortfalls(quantities)
+        if shortfalls:
+            return db.shortfall_message(shortfalls, {k: row[0] for k, row in self._snapshot.items()})
+        return ""
+
+    def add(self, product_id, quantity, shown=None):
+        """Adds quantity of a product after checking the whole cart; returns (success, message).
+
+        Nothing is added if the product is unknown or the new total would
+        exceed its stock; the message then names every short product.
+        ``shown`` is the (name, price, stock) the screen displayed: when the
+        database cannot be reached it is used instead, for tills that sell
+        through the order journal and check stock when the sale is replayed.
+        """
+        if quantity <= 0:
+            return False, "Quantity must be positive."
+        success, message = self.revalidate(extra_ids=[product_id])
+        with self._lock:
+            if not success:
+                if shown is None:
+                    return False, message
+                self._snapshot.setdefault(product_id, tuple(shown))
+            quantities = dict(self._quantities)
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+            problems = self._problems(quantities)
+            if problems:
+                return False, problems
+            self._quantities = quantities
+            self.version += 1
+            name = self._snapshot[product_id][0]
+            if not success:
+                return True, f"Added {quantity} x {name} (not verified: {message})"
+            return True, f"Added {quantity} x {name}."
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._quantities.pop(product_id, None) is not None:
+                self._snapshot.pop(product_id, None)
+                self.version += 1
+
+    def clear(self):
+        with self._lock:
+            self._quantities = {}
+            self._snapshot = {}
+            self._taken_at = None
+            self.version += 1
+
+    def order_items(self):
+        """[(product_id, quantity)] as create_new_order takes them."""
+        with self._lock:
+            return list(self._quantities.items())
+
+    def lines(self):
+        """[(product_id, name, quantity, price, subtotal)] at snapshot prices."""
+        with self._lock:
+            return [
+                (product_id, self._snapshot[product_id][0], quantity, self._snapshot[product_id][1],
+                 self._snapshot[product_id][1] * quantity)
+                for product_id, quantity in self._quantities.items()
+                if product_id in self._snapshot
+            ]
+
+    def total(self):
+        return sum(line[4] for line in self.lines())
+
+    def checkout(self, customer_name):
+        """Places the cart as one order; returns (order_id, message) like create_new_order.
+
+        A stale snapshot is re-read first, and a cart with shortfalls fails
+        there, listing all of them, without opening a write transaction.
+        The placed lines leave the cart.
+        """
+        if not self._quantities:
+            return None, "The cart is empty."
+        success, message = self.revalidate()
+        if not success:
+            return None, message
+        with self._lock:
+            problems = self._problems(self._quantities)
+            if problems:
+                return None, problems
+            order_items_list = self.order_items()
+
+        order_id, message = db.create_new_order(customer_name, order_items_list)
+        with self._lock:
+            if order_id is not None:
+                # Take out what was placed; anything added meanwhile stays
+                for product_id, quantity in order_items_list:
+                    left = self._quantities.get(product_id, 0) - quantity
+                    if left > 0:
+                        self._quantities[product_id] = left
+                    else:
+                        self._quantities.pop(product_id, None)
+                self.version += 1
+            else:
+                self._taken_at = None   # stock moved under us: re-read before the next try
+        return order_id, message
+
+    def stats(self):
+        with self._lock:
+            return {'lines': len(self._quantities), 'version': self.version, 'queries': self._queries}
@@ -0,0 +1,133 @@
+"""Streaming bulk import of supplier catalogs (CSV or Parquet).
+
+Rows are read in chunks and upserted by product name with one executemany
+per chunk, run through db.run_statement so it is timed into the metrics
+and the slow-query log: a new name is inserted, an existing one gets the
+new price and its stock increased (the same rule as handle_add_or_update).
+Rows with no name or a negative price or stock are skipped. A commit is
+issued every ``commit_every`` rows, so a failure only rolls back the rows
+since the last commit.
+
+    python manage.py import-catalog supplier.csv
+"""
+import csv
+import os
+import time
+
+import db
+from backends import DB_ERRORS
+
+CHUNK_SIZE = 1000
+COMMIT_EVERY = 10000
+COLUMNS = ("name", "price", "stock")
+
+
+def read_csv_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yields lists of raw dict rows; the header must name the COLUMNS."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        fields = {field.strip().lower(): field for field in reader.fieldnames or []}
+        missing = [c for c in COLUMNS if c not in fields]
+        if missing:
+            raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+        chunk = []
+        for row in reader:
+            chunk.append({c: row[fields[c]] for c in COLUMNS})
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_parquet_chunks(path, chunk_size=CHUNK_SIZE):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet import needs the 'pyarrow' package.")
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=list(COLUMNS)):
+        yield batch.to_pylist()
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE, file_format=None):
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format == "csv":
+        return read_csv_chunks(path, chunk_size)
+    if file_format in ("parquet", "pq"):
+        return read_parquet_chunks(path, chunk_size)
+    raise ValueError(f"Unsupported catalog format '{file_format}' (use csv or parquet).")
+
+
+def _clean(raw):
+    """Converts one raw row to (name, price, stock); None if it is unusable."""
+    try:
+        name = str(raw["name"]).strip()
+        price = float(raw["price"])
+        stock = int(float(raw["stock"]))
+    except (TypeError, ValueError, KeyError):
+        return None
+    if not name or price < 0 or stock < 0:
+        return None
+    return name, price, stock
+
+
+def import_catalog(path, file_format=None, chunk_size=CHUNK_SIZE, commit_every=COMMIT_EVERY, progress=None):
+    """Upserts every row of a catalog file; returns (success, message, stats).
+
+    ``progress(rows_done, rows_per_sec)`` is called after every chunk.
+    """
+    stats = {'rows': 0, 'committed': 0, 'rejected': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+    conn = db.connect_db()
+    if not conn:
+        return False, "Database connection failed.", stats
+
+    upsert = db.get_backend().upsert(
+        "products", COLUMNS, "VALUES (?, ?, ?)",
+        key_columns=("name",), add_columns=("stock",), set_columns=("price",),
+    )
+    started = time.perf_counter()
+    uncommitted = 0
+    cursor = conn.cursor()
+    try:
+        for chunk in read_chunks(path, chunk_size, file_format):
+            rows = []
+            for raw in chunk:
+                row = _clean(raw)
+                if row is None:
+                    stats['rejected'] += 1
+                else:
+                    rows.append(row)
+            if rows:
+                db.run_statement(cursor, "catalog.import_upsert", upsert, rows, fetch=None, many=True)
+            stats['rows'] += len(rows)
+            uncommitted += len(rows)
+            if uncommitted >= commit_every:
+                conn.commit()
+                stats['committed'] = stats['rows']
+                uncommitted = 0
+
+            elapsed = time.perf_counter() - started
+            if progress:
+                progress(stats['rows'], stats['rows'] / elapsed if elapsed else 0.0)
+        conn.commit()
+        stats['committed'] = stats['rows']
+        error = None
+    except (ValueError, OSError) as e:
+        conn.rollback()
+        error = f"Import failed: {e}"
+    except DB_ERRORS as e:
+        conn.rollback()
+        error = f"Database Error during import: {e}"
+    finally:
+        conn.close()
+        # Committed chunks changed stock and prices even if a later one failed
+        db.invalidate_catalog()
+
+    stats['seconds'] = time.perf_counter() - started
+    stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+    if error:
+        return False, f"{error} ({stats['committed']} rows were committed before it).", stats
+    message = (f"Imported {stats['rows']} products in {stats['seconds']:.1f}s "
+               f"({stats['rows_per_sec']:.0f} rows/s, {stats['rejected']} rejected).")
+    return True, message, stats
@@ -0,0 +1,201 @@
+"""Salted scrypt password hashes and an in-memory cache of verified logins.
+
+Passwords are stored as ``scrypt$<n>$<r>$<p>$<salt>$<hash>`` (base64), so
+each row carries the cost it was hashed with and the cost can be raised
+later: a login whose hash is older (or still a legacy plaintext value) is
+re-hashed at the current cost once the password has been verified.
+Comparisons use hmac.compare_digest, and unknown users cost a full hash
+too, so timing tells nothing about which usernames exist.
+
+scrypt is memory-hard: one check needs 128 * n * r bytes (16 MiB at the
+defaults) and tens of milliseconds. Pick n for the till's login budget with
+
+    python -m benchmarks.bench_password_hash --budget-ms 250
+
+and set INVENTORY_SCRYPT_N. After a successful login, SessionCache lets
+the same user unlock again for SESSION_TTL seconds without a database
+round trip or an scrypt run.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+import db
+from backends import DB_ERRORS
+
+SCRYPT_N = int(os.environ.get("INVENTORY_SCRYPT_N", 2 ** 14))   # CPU/memory cost, a power of 2
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+SESSION_TTL = 8 * 3600      # seconds; one shift
+PROVISION_WORKERS = 4
+
+
+def _scrypt(password, salt, n, r, p, length=HASH_BYTES):
+    # maxmem must cover scrypt's 128 * n * r byte table (OpenSSL's default cap is 32 MiB)
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p + 2) + (1 << 20), dklen=length)
+
+
+def hash_password(password, n=None, r=None, p=None):
+    """A new salted hash of ``password`` in the stored format."""
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, n, r, p)
+    return f"scrypt${n}${r}${p}${base64.b64encode(salt).decode()}${base64.b64encode(digest).decode()}"
+
+
+def _parse(stored):
+    try:
+        scheme, n, r, p, salt, digest = stored.split("$")
+        if scheme != "scrypt":
+            return None
+        return int(n), int(r), int(p), base64.b64decode(salt), base64.b64decode(digest)
+    except ValueError:
+        return None
+
+
+_DUMMY_SALT = os.urandom(SALT_BYTES)
+
+
+def verify_password(password, stored):
+    """Returns (matches, needs_rehash) for a stored value (None for an unknown user).
+
+    A legacy plaintext value is compared in constant time and always needs
+    a rehash; a hash made at a lower cost than the current one does too.
+    """
+    if stored is None:
+        _scrypt(password, _DUMMY_SALT, SCRYPT_N, SCRYPT_R, SCRYPT_P)   # same cost as a real check
+        return False, False
+    parsed = _parse(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    n, r, p, salt, digest = parsed
+    matches = hmac.compare_digest(_scrypt(password, salt, n, r, p, len(digest)), digest)
+    return matches, matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+class SessionCache:
+    """Logins verified within the last ``ttl`` seconds, kept in memory.
+
+    Entries hold an HMAC of the username and password under a random
+    per-process key, never the password or its stored hash. A wrong
+    password is not cached and falls through to the database.
+    """
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._key = os.urandom(32)
+        self._lock = threading.Lock()
+        self._sessions = {}    # username -> (token, expires_at)
+        self._hits = 0
+        self._misses = 0
+
+    def _token(self, username, password):
+        return hmac.new(self._key, f"{username}\0{password}".encode(), hashlib.sha256).digest()
+
+    def check(self, username, password):
+        token = self._token(username, password)
+        with self._lock:
+            entry = self._sessions.get(username)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._sessions[username]
+                entry = None
+            if entry is not None and hmac.compare_digest(entry[0], token):
+                self._hits += 1
+                return True
+            self._misses += 1
+            return False
+
+    def remember(self, username, password):
+        with self._lock:
+            self._sessions[username] = (self._token(username, password), time.monotonic() + self.ttl)
+
+    def forget(self, usernames=None):
+        """Drops the given users' sessions (all sessions with no argument)."""
+        with self._lock:
+            if usernames is None:
+                self._sessions = {}
+            else:
+                for username in usernames:
+                    self._sessions.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions), 'hits': self._hits, 'misses': self._misses}
+
+
+_sessions = SessionCache()
+
+
+def check_session(username, password):
+    """True if this login was verified recently; never touches the database."""
+    return _sessions.check(username, password)
+
+
+def get_session_stats():
+    return _sessions.stats()
+
+
+def authenticate(username, password):
+    """True if the password is right; a recent login by the same user skips the database."""
+    if _sessions.check(username, password):
+        return True
+    matches, needs_rehash = verify_password(password, db.check_user_credentials(username))
+    if not matches:
+        return False
+    if needs_rehash:
+        success, message = _store_hashes([(username, hash_password(password))])
+        if not success:
+            print(f"Could not upgrade the password hash of {username}: {message}")
+    _sessions.remember(username, password)
+    return True
+
+
+def _write_password_hashes(cursor, rows):
+    db.run_statement(
+        cursor, "user.upsert",
+        db.get_backend().upsert("User", ("username", "password"), "VALUES (?, ?)",
+                                key_columns=("username",), set_columns=("password",)),
+        rows, fetch=None, many=True
+    )
+
+
+def _store_hashes(rows):
+    conn = db.connect_db()
+    if not conn:
+        return False, "Database connection failed."
+    try:
+        _write_password_hashes(conn.cursor(), rows)
+        conn.commit()
+    except DB_ERRORS as e:
+        conn.rollback()
+        return False, f"Database Error: {e}"
+    finally:
+        conn.close()
+    _sessions.forget([username for username, stored in rows])
+    return True, f"Saved {len(rows)} users."
+
+
+def provision_users(users, workers=PROVISION_WORKERS):
+    """Creates or resets many (username, password) logins in one transaction; returns (success, message).
+
+    Hashing dominates, so passwords are hashed on ``workers`` threads
+    (hashlib.scrypt releases the GIL) and written with one executemany.
+    Existing sessions of these users are dropped.
+    """
+    users = list(users)
+    if not users:
+        return True, "No users to provision."
+    if any(not username or not password for username, password in users):
+        return False, "Every user needs a username and a password."
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, os.cpu_count() or 1, len(users)))) as pool:
+        hashes = list(pool.map(hash_password, [password for username, password in users]))
+    success, message = _store_hashes([(username, stored) for (username, password), stored in zip(users, hashes)])
+    return success, f"Provisioned {len(users)} users." if success else message
@@ -1,56 +1,799 @@
-import mariadb
 import datetime
-import calendar 
+import bisect
+import collections
+import itertools
+import os
+import random
+import threading
+import time
+
+import metrics
+from backends import DB_ERRORS, MariaDBBackend, SQLiteBackend, backend_from_env
+from metrics import instrumented
+from schema import INCOME_DAILY_BACKFILL, INCOME_DAILY_DDL
+
+DB_CONFIG = {
+    "user": "root",
+    "password": "nin1234",
+    "host": "localhost",
+    "port": 3306,
+    "database": "inventorydb",
+}
+
+# Pool sizing. Every db function borrows a connection from the pool through
+# connect_db() and hands it back when it calls close().
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 10
+POOL_IDLE_TIMEOUT = 300      # seconds an unused connection may sit idle
+POOL_ACQUIRE_TIMEOUT = 10    # seconds to wait for a free connection
+
+# Rows per page for the keyset-paginated list functions.
+PAGE_SIZE = 200
+SEARCH_LIMIT = 100
+# Ids per IN (...) list in bulk lookups; stays under SQLite's bind limit.
+BULK_CHUNK_SIZE = 500
+
+# Catalog cache: seconds before products are re-read, to pick up writes
+# made by other processes. Writes made through db.py are seen immediately.
+CATALOG_CACHE_TTL = 30
+
+# Prepared statements kept per pooled connection (least recently used go first).
+STATEMENT_CACHE_SIZE = 64
+
+# Retry policy for order writes that hit lock waits or deadlocks.
+ORDER_RETRY_ATTEMPTS = 5
+ORDER_RETRY_BASE_DELAY = 0.02  # seconds, doubled on every attempt
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free in time."""
+
+
+def _ping_connection(conn):
+    """Health check run on every borrow; raises if the connection is dead."""
+    if hasattr(conn, "ping"):
+        conn.ping()
+    else:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+
+
+class PooledConnection:
+    """Wraps a raw connection so that close() returns it to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def cursor(self, *args, **kwargs):
+        return self._raw.cursor(*args, **kwargs)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool.release(raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    """Thread-safe pool with min/max size, borrow health check and idle eviction."""
+
+    def __init__(self, factory, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 idle_timeout=POOL_IDLE_TIMEOUT, acquire_timeout=POOL_ACQUIRE_TIMEOUT,
+                 health_check=_ping_connection):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1.")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check = health_check
+
+        self._cond = threading.Condition()
+        self._idle = []          # (raw connection, time it was returned)
+        self._in_use = 0
+        self._closed = False
+
+        self._opened = 0
+        self._discarded = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+        for _ in range(min_size):
+            try:
+                self._idle.append((self._open(), time.monotonic()))
+            except Exception as e:
+                print("Pool warm-up failed:", e)
+                break
+
+    def _open(self):
+        conn = self.factory()
+        self._opened += 1
+        return conn
+
+    def _discard(self, raw):
+        self._discarded += 1
+        _statements.forget(raw)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _evict_idle_locked(self):
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic()
+        keep = []
+        total = len(self._idle) + self._in_use
+        # Oldest connections sit at the front of the idle list.
+        for raw, returned_at in self._idle:
+            if now - returned_at > self.idle_timeout and total > self.min_size:
+                self._discard(raw)
+                total -= 1
+            else:
+                keep.append((raw, returned_at))
+        self._idle = keep
+
+    def acquire(self):
+        """Borrows a healthy connection, opening one if the pool has room."""
+        started = time.monotonic()
+        waited = False
+        while True:
+            raw = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("Connection pool is closed.")
+                    self._evict_idle_locked()
+                    if self._idle:
+                        raw, _ = self._idle.pop()
+                        break
+                    if self._in_use < self.max_size:
+                        break
+                    remaining = self.acquire_timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"No free connection after {self.acquire_timeout}s "
+                            f"({self._in_use} of {self.max_size} in use)."
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                # Reserve the slot so that connecting/pinging can happen unlocked.
+                self._in_use += 1
+
+            try:
+                if raw is None:
+                    raw = self.factory()
+                    with self._cond:
+                        self._opened += 1
+                elif self.health_check:
+                    try:
+                        self.health_check(raw)
+                    except Exception:
+                        with self._cond:
+                            self._in_use -= 1
+                            self._discard(raw)
+                        continue
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._acquired += 1
+                if waited:
+                    self._waits += 1
+                    self._wait_time += elapsed
+            metrics.observe_acquire("db", elapsed)
+            return PooledConnection(self, raw)
+
+    def release(self, raw):
+        """Returns a connection, rolling back anything left uncommitted."""
+        try:
+            raw.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._discard(raw)
+            self._evict_idle_locked()
+            self._cond.notify()
+
+    def evict_idle(self):
+        with self._cond:
+            self._evict_idle_locked()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'opened': self._opened,
+                'discarded': self._discarded,
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'avg_wait_ms': (self._wait_time / self._waits * 1000.0) if self._waits else 0.0,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for raw, _ in self._idle:
+                self._discard(raw)
+            self._idle = []
+            self._cond.notify_all()
+
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_backend():
+    """Returns the active storage backend, chosen from the environment on first use."""
+    global _backend
+    with _pool_lock:
+        if _backend is None:
+            _backend = backend_from_env(os.environ, DB_CONFIG)
+        return _backend
+
+
+def configure_backend(backend, **pool_options):
+    """Switches every db function to another backend (e.g. SQLiteBackend(path))."""
+    global _backend
+    with _pool_lock:
+        _backend = backend
+    return configure_pool(backend.connect, health_check=backend.ping, **pool_options)
+
+
+def configure_pool(factory=None, **options):
+    """Replaces the shared pool, e.g. with a stand-in backend factory for tests."""
+    global _pool
+    backend = get_backend()
+    if factory is None:
+        factory = backend.connect
+        options.setdefault("health_check", backend.ping)
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(factory, **options)
+    _catalog.invalidate()
+    return _pool
+
+
+def get_pool():
+    global _pool
+    backend = get_backend()
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(backend.connect, health_check=backend.ping)
+        return _pool
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
+
+class StatementRegistry:
+    """Named statements, prepared once per connection and reused afterwards.
+
+    run_statement() keeps one cursor per (connection, SQL text). On MariaDB
+    it is a prepared cursor, so the server parses the statement once per
+    connection and later executions only send parameters. On SQLite it is a
+    plain cursor over the connection's compiled-statement cache. Per-name
+    counters show where the time goes.
+    """
+
+    def __init__(self, cache_size=STATEMENT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cursors = {}     # id(connection) -> OrderedDict(sql -> cursor)
+        self._stats = {}       # name -> [executions, seconds, rows, prepares]
+
+    def cursor_for(self, conn, name, sql):
+        with self._lock:
+            cached = self._cursors.setdefault(id(conn), collections.OrderedDict())
+            cursor = cached.get(sql)
+            if cursor is not None:
+                cached.move_to_end(sql)
+                return cursor
+        cursor = get_backend().prepared_cursor(conn)
+        with self._lock:
+            cached[sql] = cursor
+            self._counters(name)[3] += 1
+            while len(cached) > self.cache_size:
+                _, evicted = cached.popitem(last=False)
+                evicted.close()
+        return cursor
+
+    def _counters(self, name):
+        counters = self._stats.get(name)
+        if counters is None:
+            counters = self._stats[name] = [0, 0.0, 0, 0]
+        return counters
+
+    def record(self, name, seconds, rows):
+        with self._lock:
+            counters = self._counters(name)
+            counters[0] += 1
+            counters[1] += seconds
+            counters[2] += rows
+
+    def forget(self, conn):
+        """Drops the cursors of a connection that is being closed."""
+        with self._lock:
+            self._cursors.pop(id(conn), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    'executions': executions,
+                    'total_ms': seconds * 1000.0,
+                    'avg_ms': seconds / executions * 1000.0 if executions else 0.0,
+                    'rows': rows,
+                    'prepares': prepares,
+                }
+                for name, (executions, seconds, rows, prepares) in sorted(self._stats.items())
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
+
+
+_statements = StatementRegistry()
+
+
+def run_statement(cursor, name, sql, params=(), fetch="all", many=False):
+    """Executes ``sql`` on the prepared cursor for cursor's connection.
+
+    ``fetch`` is "all" (list of rows), "one" (first row or None) or None
+    (returns the cursor, for rowcount/lastrowid). With ``many`` the params
+    are a sequence of rows for executemany. Results are always read in
+    full, so the reused cursor never holds an open result set. Every
+    execution is timed into metrics (and the slow-query log).
+    """
+    prepared = _statements.cursor_for(cursor.connection, name, sql)
+    started = time.perf_counter()
+    try:
+        if many:
+            prepared.executemany(sql, params)
+        else:
+            prepared.execute(sql, params)
+        if fetch is None:
+            result = prepared
+            rows = max(prepared.rowcount, 0)
+        else:
+            result = prepared.fetchall()
+            rows = len(result)
+            if fetch == "one":
+                result = result[0] if result else None
+    except BaseException:
+        metrics.observe_statement(name, sql, time.perf_counter() - started, 0, params, many, error=True)
+        raise
+    elapsed = time.perf_counter() - started
+    _statements.record(name, elapsed, rows)
+    metrics.observe_statement(name, sql, elapsed, rows, params, many)
+    return result
+
+
+def execute_statement(cursor, name, sql, params=()):
+    """Runs a one-off statement (DDL, savepoints) on ``cursor`` itself, timed like run_statement."""
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, params)
+    except BaseException:
+        metrics.observe_statement(name, sql, time.perf_counter() - started, 0, params, error=True)
+        raise
+    elapsed = time.perf_counter() - started
+    rows = max(cursor.rowcount, 0)
+    _statements.record(name, elapsed, rows)
+    metrics.observe_statement(name, sql, elapsed, rows, params)
+    return cursor
+
+
+def get_statement_stats():
+    """{name: {executions, total_ms, avg_ms, rows, prepares}} since start or the last reset."""
+    return _statements.stats()
+
+
+def reset_statement_stats():
+    _statements.reset_stats()
+
 
 # Connection 
 def connect_db():
     try:
-        conn = mariadb.connect(
-            user="root",
-            password="nin1234",
-            host="localhost",    
-            port=3306,
-            database="inventorydb"
-        )
-        return conn
-    except mariadb.Error as e:
+        return get_pool().acquire()
+    except DB_ERRORS + (PoolTimeoutError,) as e:
         print("Database connection failed:", e)
         return None
 
 
+# The _select_*/_write helpers below take a cursor and leave connection
+# handling and commits to their caller, so db.py and async_db.py share
+# the same SQL.
+
+def _select_password(cursor, username):
+    result = run_statement(cursor, "user.password", "SELECT password FROM User WHERE username = ?",
+                           (username,), fetch="one")
+    return result[0] if result else None
+
+
+@instrumented
 def check_user_credentials(username):
    
     conn = connect_db()
     if not conn:
         return None 
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT password FROM User WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result[0] if result else None 
+    try:
+        return _select_password(conn.cursor(), username)
+    finally:
+        conn.close()
 
 
 #  PRODUCT 
 
-def get_products():
-    """Fetches all product records, converting price to float."""
-    conn = connect_db() 
-    if not conn:
-        return []
-    cursor = conn.cursor()
-    cursor.execute("SELECT product_id, name, price, stock FROM products")
-    result = cursor.fetchall()
-    conn.close()
-    
-   
+class CatalogCache:
+    """In-process copy of the products table, keyed by product_id.
+
+    Writers in this process patch or invalidate entries when they commit;
+    ``ttl`` bounds how long changes made by other processes (other tills)
+    can go unseen. ``version`` goes up whenever the cached data changes, so
+    screens can tell whether what they show is stale.
+    """
+
+    def __init__(self, ttl=CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.RLock()
+        self._products = {}
+        self._sorted = None        # rows ordered by product_id, rebuilt lazily
+        self._by_name = None       # (casefolded name, product_id), rebuilt lazily
+        self._stale = set()        # ids to re-read on the next access
+        self._loaded_at = None
+        self._hits = 0
+        self._misses = 0
+        self._partial_refreshes = 0
+        self._fetching = 0         # reads in progress outside the lock
+        self._touched = {}         # product_id -> (version, patched or removed), while reads are in progress
+        self._reset_at = 0         # version of the last whole-catalog invalidate()
+
+    def _changed(self):
+        self._sorted = None
+        self._by_name = None
+        self.version += 1
+
+    def _expired(self):
+        return self._loaded_at is None or (
+            self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl)
+
+    def cached(self):
+        """Rows sorted by id if they can be served without a database read, else None.
+
+        Never waits: while another thread holds the lock this also returns
+        None, so event-loop callers can fall back to a worker thread.
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if self._expired() or self._stale:
+                return None
+            self._hits += 1
+            if self._sorted is None:
+                self._sorted = [self._products[k] for k in sorted(self._products)]
+            return self._sorted
+        finally:
+            self._lock.release()
+
+    def products(self, fetch):
+        """Returns all rows sorted by id; fetch(ids or None) reads from the database.
+
+        fetch runs without the lock held: it may wait for a pooled
+        connection, and writers call patch()/invalidate() while holding
+        one. Entries written while the read was in progress keep their
+        newer cached state when the rows are published.
+        """
+        with self._lock:
+            if not (self._expired() or self._stale):
+                self._hits += 1
+                return self._rows()
+            ids = None if self._expired() else list(self._stale)
+            if ids is None:
+                self._misses += 1
+            else:
+                self._partial_refreshes += 1
+            version = self.version
+            self._fetching += 1
+
+        try:
+            rows = fetch(ids)
+        except BaseException:
+            with self._lock:
+                self._done_fetching()
+            raise
+        with self._lock:
+            try:
+                return self._publish(rows, ids, version)
+            finally:
+                self._done_fetching()
+
+    def _done_fetching(self):
+        self._fetching -= 1
+        if not self._fetching:
+            self._touched = {}
+
+    def _publish(self, rows, ids, version):
+        """Merges rows read from ``version`` on into the cache; returns all rows sorted by id."""
+        if rows is None:
+            return self._rows() if ids is not None else []
+        if self._reset_at > version:
+            # The whole catalog was invalidated meanwhile: serve these once, read again next time
+            return sorted(rows)
+        touched = {product_id: written for product_id, (at, written) in self._touched.items() if at > version}
+        if ids is None:
+            products = {row[0]: row for row in rows}
+        else:
+            products = dict(self._products)
+            for product_id in ids:
+                products.pop(product_id, None)
+            products.update((row[0], row) for row in rows)
+        for product_id in [product_id for product_id, written in touched.items() if written]:
+            # Patched or removed after the read began: the cached entry (or its absence) is newer
+            if product_id in self._products:
+                products[product_id] = self._products[product_id]
+            else:
+                products.pop(product_id, None)
+        if products != self._products:
+            self._products = products
+            self._changed()
+        fetched = None if ids is None else set(ids)
+        self._stale = {product_id for product_id in self._stale
+                       if product_id in touched or (fetched is not None and product_id not in fetched)}
+        if ids is None:
+            self._loaded_at = time.monotonic()
+        return self._rows()
+
+    def _rows(self):
+        if self._sorted is None:
+            self._sorted = [self._products[k] for k in sorted(self._products)]
+        return self._sorted
+
+    def search(self, fetch, prefix, limit, in_stock_only=False):
+        """Case-insensitive name prefix search, by bisecting a sorted name index."""
+        self.products(fetch)
+        with self._lock:
+            return self._search(prefix, limit, in_stock_only)
+
+    def cached_search(self, prefix, limit, in_stock_only=False):
+        """search() if it can be answered without a database read or a wait, else None (see cached())."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if self._expired() or self._stale:
+                return None
+            self._hits += 1
+            return self._search(prefix, limit, in_stock_only)
+        finally:
+            self._lock.release()
+
+    def _search(self, prefix, limit, in_stock_only):
+        if self._by_name is None:
+            self._by_name = sorted((row[1].casefold(), row[0]) for row in self._products.values())
+        key = prefix.casefold()
+        matches = []
+        for name, product_id in itertools.islice(
+                self._by_name, bisect.bisect_left(self._by_name, (key,)), None):
+            if not name.startswith(key) or len(matches) == limit:
+                break
+            row = self._products[product_id]
+            if in_stock_only and row[3] <= 0:
+                continue
+            matches.append(row)
+        return matches
+
+    def invalidate(self, product_ids=None):
+        """Marks some products (or, with no ids, the whole catalog) for re-reading."""
+        with self._lock:
+            self._changed()
+            if product_ids is None:
+                self._loaded_at = None
+                self._reset_at = self.version
+            else:
+                for product_id in product_ids:
+                    self._stale.add(int(product_id))
+                    self._touch(int(product_id), written=False)
+
+    def patch(self, row):
+        with self._lock:
+            row = (int(row[0]), row[1], float(row[2]), int(row[3]))
+            self._products[row[0]] = row
+            self._stale.discard(row[0])
+            self._changed()
+            self._touch(row[0])
+
+    def remove(self, product_id):
+        with self._lock:
+            self._products.pop(int(product_id), None)
+            self._stale.discard(int(product_id))
+            self._changed()
+            self._touch(int(product_id))
+
+    def _touch(self, product_id, written=True):
+        if self._fetching:
+            self._touched[product_id] = (self.version, written)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses + self._partial_refreshes
+            return {
+                'version': self.version,
+                'products': len(self._products),
+                'hits': self._hits,
+                'misses': self._misses,
+                'partial_refreshes': self._partial_refreshes,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+            }
+
+
+_catalog = CatalogCache()
+
+
+def _select_products(cursor, product_ids=None):
+    query = "SELECT product_id, name, price, stock FROM products"
+    params = ()
+    if product_ids is not None:
+        if not product_ids:
+            return []
+        query += f" WHERE product_id IN ({', '.join('?' * len(product_ids))})"
+        params = tuple(product_ids)
+    result = run_statement(cursor, "products.select", query, params)
+
     formatted_result = []
     for product_id, name, price, stock in result:
         formatted_result.append((product_id, name, float(price), stock))
     return formatted_result
 
 
+def _fetch_products(product_ids=None):
+    """Reads products from the database; None if the connection failed."""
+    if product_ids is not None and not product_ids:
+        return []
+    conn = connect_db() 
+    if not conn:
+        return None
+    try:
+        return _select_products(conn.cursor(), product_ids)
+    finally:
+        conn.close()
+
+
+@instrumented
+def get_cart_products(product_ids):
+    """Current {product_id: (name, price, stock)} of a few products, read in one query.
+
+    Bypasses the catalog cache, whose rows may be up to CATALOG_CACHE_TTL
+    old; None if the connection failed. Unknown ids are left out.
+    """
+    rows = _fetch_products(list(dict.fromkeys(product_ids)))
+    if rows is None:
+        return None
+    return {product_id: (name, price, stock) for product_id, name, price, stock in rows}
+
+
+@instrumented
+def get_products():
+    """Fetches all product records, converting price to float (served from the catalog cache)."""
+    return list(_catalog.products(_fetch_products))
+
+
+def get_catalog_version():
+    """Changes whenever the cached catalog changes; compare to detect stale screens."""
+    return _catalog.version
+
+
+def check_catalog_version():
+    """Re-validates the catalog cache (no database read while it is fresh) and returns its version."""
+    _catalog.products(_fetch_products)
+    return _catalog.version
+
+
+def get_catalog_cache_stats():
+    return _catalog.stats()
+
+
+def invalidate_catalog(product_ids=None):
+    _catalog.invalidate(product_ids)
+
+
+@instrumented
+def search_products(prefix, limit=SEARCH_LIMIT, in_stock_only=False):
+    """Products whose name starts with ``prefix`` (case-insensitive), by name.
+
+    Answered from the catalog cache, so it is cheap enough to call on every
+    keystroke of a filter box.
+    """
+    return _catalog.search(_fetch_products, prefix.strip(), limit, in_stock_only)
+
+
+@instrumented
+def get_products_page(after=None, limit=PAGE_SIZE, in_stock_only=False):
+    """Fetches one page of products ordered by product_id (keyset pagination).
+
+    Pass the returned cursor back as ``after`` to get the next page; it is
+    None once the last page has been returned. Served from the catalog cache.
+    Raises ValueError if ``limit`` is below 1.
+    """
+    return _products_page(_catalog.products(_fetch_products), after, limit, in_stock_only)
+
+
+def _check_page_limit(limit):
+    # A keyset page needs at least one row to carry the cursor for the next one
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+        raise ValueError(f"Page limit must be a positive whole number, not {limit!r}.")
+
+
+def _products_page(products, after, limit, in_stock_only):
+    """One page of ``products`` (rows sorted by id) after the id ``after``; returns (rows, next cursor)."""
+    _check_page_limit(limit)
+    start = bisect.bisect_right(products, after, key=lambda row: row[0]) if after is not None else 0
+
+    rows = []
+    for row in itertools.islice(products, start, None):
+        if in_stock_only and row[3] <= 0:
+            continue
+        if len(rows) == limit:
+            return rows, rows[-1][0]
+        rows.append(row)
+    return rows, None
+
+
+def _write_add_or_update(cursor, name, price, stock):
+    """Returns (message, product_id) for the product added or restocked."""
+    result = run_statement(cursor, "products.by_name", "SELECT product_id, stock FROM products WHERE name = ?",
+                           (name,), fetch="one")
+
+    if result:
+        product_id, current_stock = result
+        new_stock = current_stock + stock 
+        run_statement(
+            cursor, "products.restock",
+            "UPDATE products SET price = ?, stock = stock + ? WHERE product_id = ?", 
+            (price, stock, product_id), fetch=None
+        )
+        return f"Product '{name}' already exists. Stock updated from {current_stock} to {new_stock}.", product_id
+    else:
+        inserted = run_statement(
+            cursor, "products.insert",
+            "INSERT INTO products (name, price, stock) VALUES (?, ?, ?)",
+            (name, price, stock), fetch=None
+        )
+        return f"Product '{name}' added successfully.", inserted.lastrowid
+
+
+@instrumented
 def handle_add_or_update(name, price, stock):
     """Checks if product exists, updates stock/price, or inserts new product."""
     conn = connect_db()
@@ -59,25 +802,10 @@ def handle_add_or_update(name, price, stock):
         
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT product_id, stock FROM products WHERE name = ?", (name,))
-        result = cursor.fetchone()
-
-        if result:
-            product_id, current_stock = result
-            new_stock = current_stock + stock 
-            cursor.execute(
-                "UPDATE products SET price = ?, stock = ? WHERE product_id = ?", 
-                (price, new_stock, product_id)
-            )
-            conn.commit()
-            return f"Product '{name}' already exists. Stock updated from {current_stock} to {new_stock}.", True
-        else:
-            cursor.execute(
-                "INSERT INTO products (name, price, stock) VALUES (?, ?, ?)",
-                (name, price, stock)
-            )
-            conn.commit()
-            return f"Product '{name}' added successfully.", True
+        message, product_id = _write_add_or_update(cursor, name, price, stock)
+        conn.commit()
+        _catalog.invalidate([product_id])
+        return message, True
 
     except Exception as e:
         conn.rollback()
@@ -86,6 +814,32 @@ def handle_add_or_update(name, price, stock):
         if conn:
             conn.close()
 
+
+def _write_product(cursor, product_id, name, price, stock):
+    """Returns the number of rows changed (0 if the product is gone, or unchanged on MariaDB)."""
+    return run_statement(
+        cursor, "products.update",
+        "UPDATE products SET name = ?, price = ?, stock = ? WHERE product_id = ?",
+        (name, price, stock, product_id), fetch=None
+    ).rowcount
+
+
+def _write_product_delete(cursor, product_id):
+    deleted = run_statement(cursor, "products.delete", "DELETE FROM products WHERE product_id = ?",
+                            (product_id,), fetch=None)
+    return deleted.rowcount > 0
+
+
+def _product_written(product_id, name, price, stock, updated):
+    """Brings the catalog cache up to date after _write_product committed ``updated`` rows."""
+    if updated > 0:
+        _catalog.patch((product_id, name, price, stock))
+    else:
+        # Deleted elsewhere (or unchanged): re-read rather than resurrect it
+        invalidate_catalog([product_id])
+
+
+@instrumented
 def update_product(product_id, name, price, stock):
     """Updates the details of an existing product."""
     conn = connect_db()
@@ -94,19 +848,18 @@ def update_product(product_id, name, price, stock):
     
     cursor = conn.cursor()
     try:
-        cursor.execute(
-            "UPDATE products SET name = ?, price = ?, stock = ? WHERE product_id = ?",
-            (name, price, stock, product_id)
-        )
+        updated = _write_product(cursor, product_id, name, price, stock)
         conn.commit()
+        _product_written(product_id, name, price, stock, updated)
         return True
-    except mariadb.Error as e:
+    except DB_ERRORS as e:
         print(f"Update error: {e}")
         return False
     finally:
         if conn:
             conn.close()
 
+@instrumented
 def delete_product(product_id):
     """Deletes a product by ID."""
     conn = connect_db()
@@ -115,10 +868,11 @@ def delete_product(product_id):
 
     cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
+        deleted = _write_product_delete(cursor, product_id)
         conn.commit()
-        return cursor.rowcount > 0
-    except mariadb.Error as e:
+        _catalog.remove(product_id)
+        return deleted
+    except DB_ERRORS as e:
         return False
     finally:
         if conn:
@@ -127,135 +881,551 @@ def delete_product(product_id):
 
 # --- ORDER MANAGEMENT FUNCTIONS ---
 
+def _format_order_row(order_id, customer_name, order_date, total_amount, payment_status):
+    order_date_str = order_date.strftime("%Y-%m-%d %H:%M") if isinstance(order_date, datetime.datetime) else str(order_date)
+    return (
+        order_id, 
+        customer_name, 
+        order_date_str, 
+        f"{float(total_amount):.2f}", 
+        payment_status
+    )
+
+
+def _select_orders(cursor):
+    rows = run_statement(
+        cursor, "orders.all",
+        "SELECT order_id, customer_name, order_date, total_amount, payment_status FROM order_header ORDER BY order_date DESC"
+    )
+    return [_format_order_row(*row) for row in rows]
+
+
+@instrumented
 def get_orders():
     """Fetches all order headers, formatting the date and total amount."""
     conn = connect_db()
     if not conn:
         return []
-    cursor = conn.cursor()
-    cursor.execute("SELECT order_id, customer_name, order_date, total_amount, payment_status FROM order_header ORDER BY order_date DESC")
-    result = cursor.fetchall()
-    
-    formatted_result = []
-    for order_id, customer_name, order_date, total_amount, payment_status in result:
-        order_date_str = order_date.strftime("%Y-%m-%d %H:%M") if isinstance(order_date, datetime.datetime) else str(order_date)
-        formatted_result.append((
-            order_id, 
-            customer_name, 
-            order_date_str, 
-            f"{float(total_amount):.2f}", 
-            payment_status
-        ))
-        
-    conn.close()
-    return formatted_result
+    try:
+        return _select_orders(conn.cursor())
+    finally:
+        conn.close()
+
+
+def _select_orders_page(cursor, after, limit):
+    _check_page_limit(limit)
+    query = "SELECT order_id, customer_name, order_date, total_amount, payment_status FROM order_header"
+    params = ()
+    if after is not None:
+        last_date, last_id = after
+        query += " WHERE order_date < ? OR (order_date = ? AND order_id < ?)"
+        params = (last_date, last_date, last_id)
+    query += " ORDER BY order_date DESC, order_id DESC LIMIT ?"
+    result = run_statement(cursor, "orders.page", query, params + (limit + 1,))
+
+    page = result[:limit]
+    next_after = (page[-1][2], page[-1][0]) if len(result) > limit else None
+    return [_format_order_row(*row) for row in page], next_after
+
+
+@instrumented
+def get_orders_page(after=None, limit=PAGE_SIZE):
+    """Fetches one page of order headers, newest first (keyset pagination).
+
+    Pages are keyed on (order_date, order_id), so later pages cost the same
+    as the first one. Pass the returned cursor back as ``after`` for the next
+    page; it is None once the last page has been returned. Raises ValueError
+    if ``limit`` is below 1.
+    """
+    _check_page_limit(limit)
+    conn = connect_db()
+    if not conn:
+        return [], None
+    try:
+        return _select_orders_page(conn.cursor(), after, limit)
+    finally:
+        conn.close()
+
     
+# Bumped after every order write this process commits; get_orders_version()
+# adds the orders_version row so orders written by other tills count too.
+_orders_writes = itertools.count(1)
+_orders_write_version = 0
+
+
+def _orders_changed():
+    global _orders_write_version
+    _orders_write_version = next(_orders_writes)
+
+
+def _bump_orders_version(cursor, past=False):
+    """Called last by every order write, inside its transaction (see schema migrations 6 and 7).
+
+    ``past`` also bumps the closed-periods row: for writes that may change
+    a day before today (status changes, deletes, back-dated orders).
+    """
+    if past:
+        run_statement(cursor, "orders.version_bump_past",
+                      "UPDATE orders_version SET version = version + 1 WHERE id IN (1, 2)", fetch=None)
+    else:
+        run_statement(cursor, "orders.version_bump",
+                      "UPDATE orders_version SET version = version + 1 WHERE id = 1", fetch=None)
+
+
+@instrumented
+def get_orders_version():
+    """Changes when orders are placed, edited or deleted; None if the database is unreachable.
+
+    Compare it to the value from the last load to skip reloading history
+    and reports that have not changed. One primary-key read of the
+    orders_version counter that every order write bumps, on any till.
+    """
+    conn = connect_db()
+    if not conn:
+        return None
+    try:
+        row = run_statement(conn.cursor(), "orders.version",
+                            "SELECT version FROM orders_version WHERE id = 1", fetch="one")
+    finally:
+        conn.close()
+    return _orders_write_version, row[0] if row else 0
+
+
+@instrumented
 def get_order_items(order_id):
     """Fetches all items belonging to a specific order ID."""
+    return get_order_items_bulk([order_id]).get(order_id, [])
+
+
+def _select_order_items(cursor, order_ids):
+    grouped = {}
+    for start in range(0, len(order_ids), BULK_CHUNK_SIZE):
+        chunk = order_ids[start:start + BULK_CHUNK_SIZE]
+        rows = run_statement(cursor, "orders.items", f"""
+            SELECT oi.order_id, oi.order_item_id, p.name, oi.quantity, oi.price_at_sale
+            FROM order_items oi
+            JOIN products p ON oi.product_id = p.product_id
+            WHERE oi.order_id IN ({', '.join('?' * len(chunk))})
+            ORDER BY oi.order_id, oi.order_item_id
+        """, tuple(chunk))
+        for order_id, order_item_id, name, quantity, price in rows:
+            grouped.setdefault(order_id, []).append((order_item_id, name, quantity, price))
+    return grouped
+
+
+@instrumented
+def get_order_items_bulk(order_ids):
+    """Fetches the items of many orders at once: {order_id: [(order_item_id, name, quantity, price_at_sale)]}.
+
+    One connection and one joined query per BULK_CHUNK_SIZE ids, instead of
+    a connection and a query per order. Orders without items are left out.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    if not order_ids:
+        return {}
     conn = connect_db()
     if not conn:
-        return []
-        
-    cursor = conn.cursor()
-    
+        return {}
+
     try:
-        cursor.execute("""
-            SELECT 
-                oi.order_item_id,  -- <--- **THIS IS THE FIX**
-                p.name, 
-                oi.quantity, 
-                oi.price_at_sale 
-            FROM 
-                order_items oi
-            JOIN 
-                products p ON oi.product_id = p.product_id
-            WHERE 
-                oi.order_id = ?
-        """, (order_id,))
-        result = cursor.fetchall()
-        return result
-        
-    except mariadb.Error as e:
+        return _select_order_items(conn.cursor(), order_ids)
+
+    except DB_ERRORS as e:
         print(f"Error fetching order items: {e}")
-        return []
-        
+        return {}
+
     finally:
-        if conn:
-            conn.close()
+        conn.close()
+
+
+def reserve_stock(cursor, requested):
+    """Optimistically takes {product_id: quantity} out of stock, all or nothing.
+
+    A single conditional UPDATE (``stock = stock - ? ... AND stock >= ?``)
+    does the check and the decrement atomically in the database, so no row
+    is read-locked and concurrent tills cannot oversell. Returns False when
+    at least one product no longer has enough stock; the caller must then
+    roll back, since the other rows were decremented.
+    """
+    if not requested:
+        return True
+    cases = " ".join("WHEN ? THEN ?" for _ in requested)
+    placeholders = ", ".join("?" * len(requested))
+    case_params = []
+    for product_id, quantity in requested.items():
+        case_params.extend((product_id, quantity))
+    reserved = run_statement(
+        cursor, "order.reserve_stock",
+        f"UPDATE products SET stock = stock - (CASE product_id {cases} END) "
+        f"WHERE product_id IN ({placeholders}) AND stock >= (CASE product_id {cases} END)",
+        tuple(case_params) + tuple(requested) + tuple(case_params), fetch=None
+    )
+    return reserved.rowcount == len(requested)
+
+
+def run_with_retry(operation, attempts=ORDER_RETRY_ATTEMPTS, base_delay=ORDER_RETRY_BASE_DELAY):
+    """Runs operation(), retrying transient lock/deadlock errors with jittered backoff."""
+    for attempt in range(attempts):
+        try:
+            return operation()
+        except DB_ERRORS as e:
+            if attempt == attempts - 1 or not get_backend().is_retryable(e):
+                raise
+            time.sleep(base_delay * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def stock_shortfalls(requested, available):
+    """[(product_id, available, requested)] for every product in ``requested`` with too little stock."""
+    return [
+        (product_id, available.get(product_id, 0), quantity)
+        for product_id, quantity in requested.items()
+        if quantity > available.get(product_id, 0)
+    ]
+
+
+def shortfall_message(shortfalls, names=None):
+    """One sentence per shortfall, so the cashier sees every short product at once."""
+    sentences = []
+    for product_id, available, quantity in shortfalls:
+        label = f"{names[product_id]} (Product ID {product_id})" if names and product_id in names else f"Product ID {product_id}"
+        sentences.append(f"Insufficient stock for {label}. Available: {available}, Requested: {quantity}.")
+    return " ".join(sentences)
+
+
+# How an order write ended (place_order, place_orders), for callers that
+# act on the result instead of showing its message
+ORDER_PLACED = "placed"
+ORDER_REFUSED = "refused"            # final: short stock, unknown product, invalid cart
+ORDER_RETRY = "retry"                # the database was reached; the same order may go through later
+ORDER_UNAVAILABLE = "unavailable"    # no connection, nothing was tried
+ORDER_FAILED = "failed"              # the database refused the values; resending cannot help
+
+
+def _stock_refusal(cursor, requested):
+    """(message, outcome) for an order whose conditional stock update failed and was rolled back."""
+    placeholders = ", ".join("?" * len(requested))
+    available = dict(run_statement(
+        cursor, "order.stock_check",
+        f"SELECT product_id, stock FROM products WHERE product_id IN ({placeholders})",
+        tuple(requested)
+    ))
+    shortfalls = stock_shortfalls(requested, available)
+    if shortfalls:
+        return shortfall_message(shortfalls), ORDER_REFUSED
+    # Nothing is short any more: a concurrent order moved the stock meanwhile
+    return "Stock changed during checkout. Please try again.", ORDER_RETRY
+
+
+def _insufficient_stock_message(cursor, requested):
+    return _stock_refusal(cursor, requested)[0]
+
+
+def _db_error_outcome(error):
+    return ORDER_FAILED if get_backend().is_data_error(error) else ORDER_RETRY
+
+
+class StockShortfall(Exception):
+    """Raised by _write_order when reserve_stock finds a product short."""
+
+    def __init__(self, requested):
+        super().__init__("Stock changed during checkout.")
+        self.requested = requested
+
+
+def order_items_problem(order_items_list):
+    """Why a cart cannot be placed at all (empty, or a quantity below 1), else None.
+
+    Checked before any transaction opens: a zero quantity would make
+    reserve_stock's rowcount check fail on MariaDB (unchanged rows are not
+    counted), and a negative one would add stock.
+    """
+    if not order_items_list:
+        return "The cart is empty."
+    for product_id, quantity in order_items_list:
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            return f"Quantity for Product ID {product_id} must be a positive whole number."
+    return None
+
+
+def _requested_quantities(order_items_list):
+    # Same product may appear on several lines; stock is checked per product.
+    requested = {}
+    for product_id, quantity in order_items_list:
+        requested[product_id] = requested.get(product_id, 0) + quantity
+    return requested
+
+
+def _write_order(cursor, customer_name, order_items_list, requested, order_date=None):
+    """Writes one Paid order; returns (order_id, message), order_id None if refused.
+
+    Raises StockShortfall when the conditional stock update fails; the
+    caller must roll back before reporting (_stock_refusal).
+    order_date defaults to the database's current time.
+    """
+    problem = order_items_problem(order_items_list)
+    if problem:
+        return None, problem
+    products = {}
+    if requested:
+        placeholders = ", ".join("?" * len(requested))
+        rows = run_statement(
+            cursor, "order.cart_products",
+            f"SELECT product_id, price, stock FROM products WHERE product_id IN ({placeholders})",
+            tuple(requested)
+        )
+        for product_id, price, stock in rows:
+            products[product_id] = (float(price), stock)
+
+    for product_id, quantity in order_items_list:
+        if product_id not in products:
+            raise Exception(f"Product ID {product_id} not found.")
+
+    # Cheap early exit; reserve_stock below is the authoritative check.
+    shortfalls = stock_shortfalls(requested, {product_id: products[product_id][1] for product_id in requested})
+    if shortfalls:
+        return None, shortfall_message(shortfalls)
+
+    if order_date is None:
+        order_id = run_statement(
+            cursor, "order.header_insert",
+            "INSERT INTO order_header (customer_name) VALUES (?)",
+            (customer_name,), fetch=None
+        ).lastrowid
+    else:
+        order_id = run_statement(
+            cursor, "order.header_insert_dated",
+            "INSERT INTO order_header (customer_name, order_date) VALUES (?, ?)",
+            (customer_name, order_date), fetch=None
+        ).lastrowid
+    total_amount = 0.0
+
+    line_rows = []
+    for product_id, quantity in order_items_list:
+        price = products[product_id][0]
+        total_amount += price * quantity
+        line_rows.append((order_id, product_id, quantity, price))
+
+    if line_rows:
+        run_statement(
+            cursor, "order.items_insert",
+            "INSERT INTO order_items (order_id, product_id, quantity, price_at_sale) VALUES (?, ?, ?, ?)",
+            line_rows, fetch=None, many=True
+        )
+
+    # Reduce stock immediately
+    if not reserve_stock(cursor, requested):
+        raise StockShortfall(requested)
+
+    run_statement(
+        cursor, "order.header_paid",
+        "UPDATE order_header SET total_amount=?, payment_status='Paid' WHERE order_id=?",
+        (total_amount, order_id), fetch=None
+    )
+    _apply_income_delta(cursor, order_id, 1)
+    _bump_orders_version(cursor, past=order_date is not None)
+    return order_id, f"Order {order_id} placed and Paid (stock reduced)."
+
+
+def _write_keyed_order(cursor, customer_name, order_items_list, requested,
+                       idempotency_key=None, order_date=None):
+    """_write_order, placed at most once per idempotency_key.
+
+    A key seen before returns the order it placed, without writing again,
+    so a client that lost the reply to a commit can safely resend.
+    """
+    if idempotency_key is None:
+        return _write_order(cursor, customer_name, order_items_list, requested, order_date)
+    row = run_statement(cursor, "order.by_key",
+                        "SELECT order_id FROM order_idempotency WHERE idempotency_key=?",
+                        (idempotency_key,), fetch="one")
+    if row:
+        return row[0], f"Order {row[0]} already placed."
+    order_id, message = _write_order(cursor, customer_name, order_items_list, requested, order_date)
+    if order_id is not None:
+        run_statement(cursor, "order.key_insert",
+                      "INSERT INTO order_idempotency (idempotency_key, order_id) VALUES (?, ?)",
+                      (idempotency_key, order_id), fetch=None)
+    return order_id, message
 
-def create_new_order(customer_name, order_items_list):
-    """Creates new order, calculates total, updates stock, and commits atomically."""
+
+@instrumented
+def place_order(customer_name, order_items_list, idempotency_key=None, order_date=None):
+    """create_new_order, returning (order_id, message, outcome); outcome is an ORDER_* code."""
+    problem = order_items_problem(order_items_list)
+    if problem:
+        return None, problem, ORDER_REFUSED
     conn = connect_db()
     if not conn:
-        return None, "Database connection failed."
+        return None, "Database connection failed.", ORDER_UNAVAILABLE
 
     cursor = conn.cursor()
-    
-    try:
-       
-        cursor.execute(
-            "INSERT INTO order_header (customer_name) VALUES (?)",
-            (customer_name,)
-        )
-        order_id = cursor.lastrowid
-        total_amount = 0.0
-        
-       
-        for product_id, quantity in order_items_list:
-           
-            cursor.execute("SELECT price, stock FROM products WHERE product_id=?", (product_id,))
-            product_data = cursor.fetchone()
-            
-            if not product_data:
-                raise Exception(f"Product ID {product_id} not found.")
-
-          
-            price = float(product_data[0]) 
-            current_stock = product_data[1]
-            
-            if quantity > current_stock:
-                conn.rollback() 
-                return None, f"Insufficient stock for Product ID {product_id}. Available: {current_stock}, Requested: {quantity}."
-                
-            line_total = price * quantity
-            total_amount += line_total
-            
-           
-            cursor.execute(
-                "INSERT INTO order_items (order_id, product_id, quantity, price_at_sale) VALUES (?, ?, ?, ?)",
-                (order_id, product_id, quantity, price)
-            )
-            
-            # Reduce stock immediately
-            new_stock = current_stock - quantity
-            cursor.execute(
-                "UPDATE products SET stock=? WHERE product_id=?",
-                (new_stock, product_id)
-            )
+    requested = _requested_quantities(order_items_list)
 
-       
-        cursor.execute(
-            "UPDATE order_header SET total_amount=?, payment_status='Paid' WHERE order_id=?",
-            (total_amount, order_id)
-        )
-        
-        conn.commit()
-        return order_id, f"Order {order_id} placed and Paid (stock reduced)."
-        
-    except mariadb.Error as e:
-        conn.rollback()
-        return None, f"Database Error: {e}"
+    def attempt():
+        try:
+            order_id, message = _write_keyed_order(cursor, customer_name, order_items_list, requested,
+                                                   idempotency_key, order_date)
+        except BaseException:
+            conn.rollback()
+            raise
+        if order_id is None:
+            conn.rollback()
+        else:
+            conn.commit()
+            _catalog.invalidate(requested)
+            _orders_changed()
+        return order_id, message
+
+    try:
+        order_id, message = run_with_retry(attempt)
+        return order_id, message, ORDER_REFUSED if order_id is None else ORDER_PLACED
+    except StockShortfall:
+        try:
+            return (None,) + _stock_refusal(cursor, requested)
+        except DB_ERRORS as e:
+            return None, f"Database Error: {e}", ORDER_RETRY
+    except DB_ERRORS as e:
+        return None, f"Database Error: {e}", _db_error_outcome(e)
     except Exception as e:
-        conn.rollback()
-        return None, str(e)
+        return None, str(e), ORDER_REFUSED
     finally:
         if conn:
             conn.close()
 
 
+@instrumented
+def create_new_order(customer_name, order_items_list, idempotency_key=None, order_date=None):
+    """Creates new order, calculates total, updates stock, and commits atomically.
+
+    Set-based: the statement count is constant in the cart size (one SELECT
+    for all prices, one executemany for the lines, one conditional stock
+    UPDATE via reserve_stock) instead of three round trips per cart line.
+    With an idempotency_key, resending the same order returns the order
+    already placed (see _write_keyed_order). Returns (order_id, message);
+    place_order also says whether a failed order is worth resending.
+    """
+    return place_order(customer_name, order_items_list, idempotency_key, order_date)[:2]
+
+
+def _write_order_in_savepoint(cursor, customer_name, order_items_list, requested,
+                              idempotency_key=None, order_date=None):
+    """_write_keyed_order inside SAVEPOINT; a refused order is undone without ending the transaction.
+
+    Returns (order_id, message, outcome).
+    """
+    execute_statement(cursor, "batch.savepoint", "SAVEPOINT batch_order")
+    try:
+        order_id, message = _write_keyed_order(cursor, customer_name, order_items_list, requested,
+                                               idempotency_key, order_date)
+        outcome = ORDER_REFUSED if order_id is None else ORDER_PLACED
+    except StockShortfall:
+        execute_statement(cursor, "batch.rollback_savepoint", "ROLLBACK TO SAVEPOINT batch_order")
+        order_id = None
+        message, outcome = _stock_refusal(cursor, requested)
+    except DB_ERRORS:
+        raise
+    except Exception as e:
+        execute_statement(cursor, "batch.rollback_savepoint", "ROLLBACK TO SAVEPOINT batch_order")
+        order_id, message, outcome = None, str(e), ORDER_REFUSED
+    execute_statement(cursor, "batch.release_savepoint", "RELEASE SAVEPOINT batch_order")
+    return order_id, message, outcome
+
+
+@instrumented
+def place_orders(orders, idempotency_keys=None, order_dates=None):
+    """create_orders_batch, returning [(order_id, message, outcome)] like place_order."""
+    if not orders:
+        return []
+    keys = idempotency_keys or [None] * len(orders)
+    dates = order_dates or [None] * len(orders)
+    conn = connect_db()
+    if not conn:
+        return [(None, "Database connection failed.", ORDER_UNAVAILABLE)] * len(orders)
+
+    cursor = conn.cursor()
+    requested = [_requested_quantities(items) for customer_name, items in orders]
+
+    def attempt():
+        try:
+            get_backend().begin(conn)
+            results = [
+                _write_order_in_savepoint(cursor, customer_name, items, order_requested, key, order_date)
+                for (customer_name, items), order_requested, key, order_date
+                in zip(orders, requested, keys, dates)
+            ]
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return results
+
+    try:
+        results = run_with_retry(attempt)
+    except DB_ERRORS as e:
+        print(f"Order batch failed, placing orders one by one: {e}")
+        results = None
+    finally:
+        conn.close()
+
+    if results is None:
+        return [place_order(customer_name, items, key, order_date)
+                for (customer_name, items), key, order_date in zip(orders, keys, dates)]
+    placed = set()
+    for (order_id, message, outcome), order_requested in zip(results, requested):
+        if order_id is not None:
+            placed.update(order_requested)
+    _catalog.invalidate(placed)
+    _orders_changed()
+    return results
+
+
+@instrumented
+def create_orders_batch(orders, idempotency_keys=None, order_dates=None):
+    """Places several (customer_name, order_items_list) orders in one transaction.
+
+    Returns [(order_id, message)] in the same order, as create_new_order
+    would. Each order runs in its own SAVEPOINT, so a refused order (stock
+    shortfall, unknown product) is undone alone and the rest still commit
+    together: one commit, and one fsync, for the whole batch. If the batch
+    fails on a database error, the orders are placed one by one instead.
+    idempotency_keys and order_dates, if given, run parallel to orders.
+    """
+    return [result[:2] for result in place_orders(orders, idempotency_keys, order_dates)]
+
+
+PAYMENT_STATUSES = ('Pending', 'Paid', 'Cancelled')
+
+
+def _write_payment_status(cursor, order_id, new_status):
+    """Returns (success, message); commit only on success."""
+    status_row = run_statement(cursor, "order.status", "SELECT payment_status FROM order_header WHERE order_id=?",
+                               (order_id,), fetch="one")
+    if not status_row:
+        return False, f"Order {order_id} not found."
+    old_status = status_row[0]
+    if old_status == new_status:
+        return True, f"Order {order_id} status updated to {new_status}."
+
+    updated = run_statement(
+        cursor, "order.status_update",
+        "UPDATE order_header SET payment_status=? WHERE order_id=? AND payment_status=?",
+        (new_status, order_id, old_status), fetch=None
+    )
+    if updated.rowcount != 1:
+        return False, f"Order {order_id} was changed by another till. Please refresh."
+
+    if old_status == 'Paid':
+        _apply_income_delta(cursor, order_id, -1)
+    elif new_status == 'Paid':
+        _apply_income_delta(cursor, order_id, 1)
+    _bump_orders_version(cursor, past=True)
+    return True, f"Order {order_id} status updated to {new_status}."
+
+
+@instrumented
 def update_payment_status(order_id, new_status):
-    """Updates the payment status of an order."""
-    if new_status not in ['Pending', 'Paid', 'Cancelled']:
+    """Updates the payment status of an order (and the income rollup)."""
+    if new_status not in PAYMENT_STATUSES:
         return False, "Invalid status."
 
     conn = connect_db()
@@ -264,19 +1434,55 @@ def update_payment_status(order_id, new_status):
 
     cursor = conn.cursor()
     try:
-        cursor.execute(
-            "UPDATE order_header SET payment_status=? WHERE order_id=?",
-            (new_status, order_id)
-        )
-        conn.commit()
-        return True, f"Order {order_id} status updated to {new_status}."
-    except mariadb.Error as e:
+        success, message = _write_payment_status(cursor, order_id, new_status)
+        if success:
+            conn.commit()
+            _orders_changed()
+        else:
+            conn.rollback()
+        return success, message
+    except DB_ERRORS as e:
+        conn.rollback()
         return False, f"Database error: {e}"
     finally:
         if conn:
             conn.close()
 
 
+def _write_order_delete(cursor, order_id):
+    """Returns (success, message, restocked product ids); commit only on success."""
+    status_row = run_statement(cursor, "order.status", "SELECT payment_status FROM order_header WHERE order_id=?",
+                               (order_id,), fetch="one")
+    
+    if status_row and status_row[0] == 'Paid':
+        items = run_statement(cursor, "order.lines", "SELECT product_id, quantity FROM order_items WHERE order_id=?",
+                              (order_id,))
+        
+        if items:
+            run_statement(
+                cursor, "order.restock",
+                "UPDATE products SET stock = stock + ? WHERE product_id = ?",
+                [(quantity, product_id) for product_id, quantity in items], fetch=None, many=True
+            )
+        restocked = [product_id for product_id, quantity in items]
+
+        _apply_income_delta(cursor, order_id, -1)
+    else:
+        restocked = []
+
+    if status_row:
+        deleted = run_statement(
+            cursor, "order.delete",
+            "DELETE FROM order_header WHERE order_id=? AND payment_status=?",
+            (order_id, status_row[0]), fetch=None
+        )
+        if deleted.rowcount != 1:
+            return False, f"Order {order_id} was changed by another till. Please refresh.", []
+        _bump_orders_version(cursor, past=True)
+    return True, f"Order {order_id} deleted successfully (stock adjusted).", restocked
+
+
+@instrumented
 def delete_order(order_id):
     """Deletes an order and handles related stock adjustments."""
     conn = connect_db()
@@ -285,24 +1491,16 @@ def delete_order(order_id):
 
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT payment_status FROM order_header WHERE order_id=?", (order_id,))
-        status_row = cursor.fetchone()
-        
-        if status_row and status_row[0] == 'Paid':
-            cursor.execute("SELECT product_id, quantity FROM order_items WHERE order_id=?", (order_id,))
-            items = cursor.fetchall()
-            
-            for product_id, quantity in items:
-                cursor.execute(
-                    "UPDATE products SET stock = stock + ? WHERE product_id = ?",
-                    (quantity, product_id)
-                )
-        
-        cursor.execute("DELETE FROM order_header WHERE order_id=?", (order_id,))
+        success, message, restocked = _write_order_delete(cursor, order_id)
+        if not success:
+            conn.rollback()
+            return False, message
         conn.commit()
-        return True, f"Order {order_id} deleted successfully (stock adjusted)."
+        _catalog.invalidate(restocked)
+        _orders_changed()
+        return True, message
         
-    except mariadb.Error as e:
+    except DB_ERRORS as e:
         conn.rollback()
         return False, f"Error deleting order: {e}"
     finally:
@@ -311,63 +1509,301 @@ def delete_order(order_id):
 
 
 # INCOME REPORT
-    
-def get_income_summary(date_range_days=30):
+#
+# income_daily holds one row per calendar day with the count and revenue of
+# that day's Paid orders. create_new_order, update_payment_status and
+# delete_order keep it current inside their own transactions, so the
+# reports below read a few hundred small rows instead of scanning
+# order_header. rebuild_income_rollup() recomputes it from scratch.
+
+def _apply_income_delta(cursor, order_id, sign):
+    """Adds (sign=1) or removes (sign=-1) one order in its day's rollup row."""
+    run_statement(
+        cursor, "income.apply_delta",
+        get_backend().upsert(
+            "income_daily",
+            ("sale_date", "order_count", "revenue"),
+            "SELECT DATE(order_date), ?, total_amount * ? FROM order_header WHERE order_id = ?",
+            key_columns=("sale_date",),
+            add_columns=("order_count", "revenue"),
+        ),
+        (sign, sign, order_id), fetch=None
+    )
+
+
+@instrumented
+def rebuild_income_rollup():
+    """Recomputes income_daily from order_header (creates it if missing)."""
     conn = connect_db()
     if not conn:
-        return {'total_sales': 0.0, 'last_30_days': 0.0}
-    
+        return False, "Database connection failed."
+
     cursor = conn.cursor()
-    
-    cursor.execute("SELECT SUM(total_amount) FROM order_header WHERE payment_status = 'Paid'")
-    total_sales = cursor.fetchone()[0] or 0.0
-    
-    thirty_days_ago = datetime.datetime.now() - datetime.timedelta(days=date_range_days)
-    cursor.execute(
-        "SELECT SUM(total_amount) FROM order_header WHERE order_date >= ? AND payment_status = 'Paid'",
-        (thirty_days_ago,)
-    )
-    last_30_days = cursor.fetchone()[0] or 0.0
+    try:
+        execute_statement(cursor, "income.create", INCOME_DAILY_DDL)
+        for statement in INCOME_DAILY_BACKFILL:
+            execute_statement(cursor, "income.backfill", statement)
+        days = cursor.rowcount
+        _bump_orders_version(cursor, past=True)   # bulk loads write order_header directly, then rebuild
+        conn.commit()
+        return True, f"Income rollup rebuilt ({days} days)."
+    except DB_ERRORS as e:
+        conn.rollback()
+        return False, f"Error rebuilding income rollup: {e}"
+    finally:
+        if conn:
+            conn.close()
+
+
+
+INCOME_BUCKETS = ('hour', 'day', 'week', 'month')
+INCOME_MEMO_MAX = 100000    # memoized periods; past this the memo starts over
+# Seconds after midnight before yesterday counts as closed: covers orders
+# stamped just before midnight that commit after it, and till clock skew
+INCOME_CLOSE_DELAY = 600
+
+
+def bucket_start(moment, bucket):
+    """Start of the hour, day, week (from Monday) or month holding the datetime ``moment``."""
+    if bucket == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = datetime.datetime.combine(moment.date(), datetime.time())
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown income bucket {bucket!r}; use one of {', '.join(INCOME_BUCKETS)}.")
+
+
+def _next_bucket(start, bucket):
+    if bucket == 'hour':
+        return start + datetime.timedelta(hours=1)
+    if bucket == 'day':
+        return start + datetime.timedelta(days=1)
+    if bucket == 'week':
+        return start + datetime.timedelta(days=7)
+    return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def income_periods(first_day, last_day, bucket):
+    """[(start, end)] datetimes, one per bucket, covering first_day to last_day inclusive.
+
+    The first and last periods are clipped to the range, so a weekly report
+    starting on a Wednesday begins with a short week.
+    """
+    if bucket not in INCOME_BUCKETS:
+        raise ValueError(f"Unknown income bucket {bucket!r}; use one of {', '.join(INCOME_BUCKETS)}.")
+    if first_day > last_day:
+        raise ValueError(f"The range starts ({first_day}) after it ends ({last_day}).")
+    start = datetime.datetime.combine(first_day, datetime.time())
+    end = datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time())
+    periods = []
+    while start < end:
+        period_end = min(_next_bucket(bucket_start(start, bucket), bucket), end)
+        periods.append((start, period_end))
+        start = period_end
+    return periods
+
+
+def _period_label(start, bucket):
+    if bucket == 'hour':
+        return start.strftime("%Y-%m-%d %H:00")
+    if bucket == 'week':
+        return f"Week of {start:%Y-%m-%d}"
+    if bucket == 'month':
+        return start.strftime("%Y-%m")
+    return start.strftime("%Y-%m-%d")
+
+
+class IncomeMemo:
+    """Order count and revenue of closed periods, i.e. periods that ended before today.
+
+    A closed period changes only when an old order does: a status change,
+    a delete or a journaled sale replayed late, on any till. Each of those
+    bumps the closed-periods row of orders_version (see
+    _bump_orders_version), so the memo is kept only while that counter is
+    the one it was filled under.
+    """
+
+    def __init__(self, max_size=INCOME_MEMO_MAX):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._periods = {}      # (bucket, start, end) -> (order_count, revenue)
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, fingerprint, keys):
+        """{key: (order_count, revenue)} for the memoized keys; forgets everything if the fingerprint moved."""
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._periods = {}
+                self._fingerprint = fingerprint
+            found = {key: self._periods[key] for key in keys if key in self._periods}
+            self._hits += len(found)
+            self._misses += len(keys) - len(found)
+            return found
+
+    def store(self, fingerprint, totals):
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                return
+            if len(self._periods) + len(totals) > self.max_size:
+                self._periods = {}
+            self._periods.update(totals)
+
+    def clear(self):
+        with self._lock:
+            self._periods = {}
+            self._fingerprint = None
+
+    def stats(self):
+        with self._lock:
+            return {'periods': len(self._periods), 'hits': self._hits, 'misses': self._misses}
+
+
+_income_memo = IncomeMemo()
+
+
+def get_income_memo_stats():
+    return _income_memo.stats()
+
+
+def _sum_income(cursor, keys, bucket):
+    """{(bucket, start, end): (order_count, revenue)} for ascending, non-overlapping keys.
+
+    One range query over [first start, last end): income_daily for day and
+    coarser buckets, the Paid orders themselves for hours. Rows between
+    the keys (periods already memoized) are skipped.
+    """
+    starts = [start for _, start, end in keys]
+    totals = {key: [0, 0.0] for key in keys}
+
+    def add(moment, count, revenue):
+        index = bisect.bisect_right(starts, moment) - 1
+        if index >= 0 and moment < keys[index][2]:
+            total = totals[keys[index]]
+            total[0] += count
+            total[1] += float(revenue)
+
+    if bucket == 'hour':
+        rows = run_statement(cursor, "income.orders_between", """
+            SELECT order_date, total_amount FROM order_header
+            WHERE order_date >= ? AND order_date < ? AND payment_status = 'Paid'
+        """, (keys[0][1], keys[-1][2]))
+        for order_date, amount in rows:
+            add(order_date, 1, amount)
+    else:
+        rows = run_statement(cursor, "income.days_between", """
+            SELECT sale_date, order_count, revenue FROM income_daily
+            WHERE sale_date >= ? AND sale_date < ?
+        """, (keys[0][1].date(), keys[-1][2].date()))
+        for sale_date, count, revenue in rows:
+            add(datetime.datetime.combine(sale_date, datetime.time()), count, revenue)
+    return {key: tuple(total) for key, total in totals.items()}
+
+
+def _select_income_series(cursor, first_day, last_day, bucket="day"):
+    """[(start, end, order_count, revenue)] per period, oldest first; closed periods come from the memo."""
+    periods = income_periods(first_day, last_day, bucket)
+    today = (datetime.datetime.now() - datetime.timedelta(seconds=INCOME_CLOSE_DELAY)).date()
+    midnight = datetime.datetime.combine(today, datetime.time())
+    row = run_statement(cursor, "income.closed_version",
+                        "SELECT version FROM orders_version WHERE id = 2", fetch="one")
+    fingerprint = row[0] if row else object()   # no counter row: never reuse the memo
+    keys = [(bucket, start, end) for start, end in periods]
+    totals = _income_memo.lookup(fingerprint, [key for key in keys if key[2] <= midnight])
+    missing = [key for key in keys if key not in totals]
+    if missing:
+        computed = _sum_income(cursor, missing, bucket)
+        totals.update(computed)
+        _income_memo.store(fingerprint, {key: value for key, value in computed.items() if key[2] <= midnight})
+    return [(start, end) + totals[(bucket, start, end)] for start, end in periods]
+
+
+@instrumented
+def get_income_series(first_day, last_day, bucket="day"):
+    """Paid order count and revenue per hour, day, week or month from first_day to last_day (inclusive).
+
+    Returns [(start, end, order_count, revenue)], oldest first, including
+    empty periods. Later calls read only the periods still open (today's)
+    again; see IncomeMemo.
+    """
+    conn = connect_db()
+    if not conn:
+        return []
+    try:
+        return _select_income_series(conn.cursor(), first_day, last_day, bucket)
+    finally:
+        conn.close()
+
+
+def _select_income_summary(cursor, date_range_days=30, first_day=None, last_day=None):
+    total_sales = run_statement(cursor, "income.total", "SELECT SUM(revenue) FROM income_daily", fetch="one")[0] or 0.0
+
+    last_day = last_day or datetime.date.today()
+    # Both ends are inclusive: the last 30 days are today and the 29 before it
+    first_day = first_day or last_day - datetime.timedelta(days=date_range_days - 1)
+    range_sales = run_statement(
+        cursor, "income.between",
+        "SELECT SUM(revenue) FROM income_daily WHERE sale_date >= ? AND sale_date <= ?",
+        (first_day, last_day), fetch="one"
+    )[0] or 0.0
 
-    conn.close()
-    
     return {
         'total_sales': float(total_sales),
-        'last_30_days': float(last_30_days)
+        'range_sales': float(range_sales),
+        'last_30_days': float(range_sales),     # the old name, kept for existing clients
     }
 
-def get_income_report_details():
+
+@instrumented
+def get_income_summary(date_range_days=30, first_day=None, last_day=None):
+    """All-time sales, and sales from first_day to last_day (default: the last date_range_days days)."""
     conn = connect_db()
     if not conn:
-        return []
-    cursor = conn.cursor()
-    
-    sixty_days_ago = datetime.datetime.now() - datetime.timedelta(days=60)
-    cursor.execute("""
-        SELECT 
-            DATE_FORMAT(order_date, '%Y-%m-%d') AS date_period, 
-            COUNT(order_id), 
-            SUM(total_amount)
-        FROM order_header
-        WHERE order_date >= ? AND payment_status = 'Paid'
-        GROUP BY date_period
-        ORDER BY date_period DESC
-    """, (sixty_days_ago,))
-    
-    details = []
-    for row in cursor.fetchall():
-        date_period, count, income = row
-        details.append((date_period, count, f"{float(income):.2f}"))
+        return {'total_sales': 0.0, 'range_sales': 0.0, 'last_30_days': 0.0}
 
-    conn.close()
+    try:
+        return _select_income_summary(conn.cursor(), date_range_days, first_day, last_day)
+    finally:
+        conn.close()
+
+
+def _select_income_details(cursor, date_range_days=60, first_day=None, last_day=None, bucket="day"):
+    last_day = last_day or datetime.date.today()
+    first_day = first_day or last_day - datetime.timedelta(days=date_range_days - 1)
+    details = []
+    for start, end, count, income in reversed(_select_income_series(cursor, first_day, last_day, bucket)):
+        if count > 0:
+            details.append((_period_label(start, bucket), count, f"{income:.2f}"))
     return details
 
-def get_income_report():
-    summary = get_income_summary()
-    details = get_income_report_details()
-    
-    return {
-        'total_sales': summary['total_sales'],
-        'last_30_days': summary['last_30_days'],
-        'details': details
-    }
\ No newline at end of file
+
+@instrumented
+def get_income_report_details(date_range_days=60, first_day=None, last_day=None, bucket="day"):
+    """[(period label, order count, revenue)], newest first; periods without sales are left out."""
+    conn = connect_db()
+    if not conn:
+        return []
+    try:
+        return _select_income_details(conn.cursor(), date_range_days, first_day, last_day, bucket)
+    finally:
+        conn.close()
+
+
+@instrumented
+def get_income_report(first_day=None, last_day=None, bucket="day"):
+    """Summary and details over one connection; with no range, 30 days are summed and 60 listed."""
+    conn = connect_db()
+    if not conn:
+        return {'total_sales': 0.0, 'range_sales': 0.0, 'last_30_days': 0.0, 'details': []}
+    try:
+        cursor = conn.cursor()
+        summary = _select_income_summary(cursor, 30, first_day, last_day)
+        details = _select_income_details(cursor, 60, first_day, last_day, bucket)
+    finally:
+        conn.close()
+    return dict(summary, details=details)
@@ -0,0 +1,104 @@
+import queue
+
+
+class _Job:
+    __slots__ = ("future", "scope", "generation", "on_done", "on_error")
+
+    def __init__(self, future, scope, generation, on_done, on_error):
+        self.future = future
+        self.scope = scope
+        self.generation = generation
+        self.on_done = on_done
+        self.on_error = on_error
+
+
+class DBExecutor:
+    """Runs db.py calls on worker threads and hands the results back to Tk.
+
+    Tk widgets must only be touched from the main thread, so finished jobs
+    are put on a queue that the Tk loop drains with after() polling; the
+    on_done/on_error callbacks run there. Jobs submitted with a ``scope``
+    can be cancelled as a group (e.g. when the user leaves a frame): queued
+    jobs never start and running ones have their callbacks dropped.
+    """
+
+    def __init__(self, root, max_workers=4, poll_ms=25, on_busy=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_busy = on_busy      # on_busy(True/False) when work starts/stops
+        self.max_workers = max_workers
+        self._pool = None           # started by the first submit(), off the startup path
+        self._results = queue.Queue()
+        self._jobs = []             # outstanding jobs; only touched on the Tk thread
+        self._generations = {}
+        self._polling = False
+        self._busy = False
+
+    def submit(self, fn, *args, on_done=None, on_error=None, scope=None, **kwargs):
+        """Runs fn(*args, **kwargs) on a worker; returns its Future."""
+        if self._pool is None:
+            # concurrent.futures pulls in logging and friends; import it on first use
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+        future = self._pool.submit(fn, *args, **kwargs)
+        job = _Job(future, scope, self._generations.get(scope, 0), on_done, on_error)
+        self._jobs.append(job)
+        future.add_done_callback(lambda f: self._results.put(job))
+        self._update_busy()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return future
+
+    def cancel(self, scope):
+        """Drops every outstanding job of ``scope``; their callbacks never run."""
+        self._generations[scope] = self._generations.get(scope, 0) + 1
+        for job in self._jobs:
+            if job.scope == scope:
+                job.future.cancel()
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    job = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._jobs.remove(job)
+                if job.future.cancelled() or job.generation != self._generations.get(job.scope, 0):
+                    continue
+                self._run_callback(job)
+        finally:
+            # A callback that raised must not stop polling for the jobs behind it
+            try:
+                self._update_busy()
+            finally:
+                if self._jobs:
+                    self.root.after(self.poll_ms, self._poll)
+                else:
+                    self._polling = False
+
+    def _run_callback(self, job):
+        try:
+            error = job.future.exception()
+            if error is not None:
+                if job.on_error:
+                    job.on_error(error)
+                else:
+                    print(f"Background database call failed: {error}")
+            elif job.on_done:
+                job.on_done(job.future.result())
+        except Exception as e:
+            # e.g. a TclError from a widget destroyed while the job ran
+            self.root.report_callback_exception(type(e), e, e.__traceback__)
+
+    def _update_busy(self):
+        busy = bool(self._jobs)
+        if busy != self._busy:
+            self._busy = busy
+            if self.on_busy:
+                self.on_busy(busy)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,69 @@
+"""Dashboard icons, pre-rendered at their display size and cached on disk.
+
+Resizing a PNG with Pillow's LANCZOS filter takes longer than showing a
+screen, and Pillow itself is slow to import. So each icon is rendered once
+into ICON_CACHE_DIR, named after its source file's size and mtime and the
+target size, and later launches load that file straight into a Tk
+PhotoImage without touching Pillow:
+
+    python manage.py render-icons      # e.g. at install time on a till PC
+"""
+import os
+
+ICON_CACHE_DIR = os.environ.get("INVENTORY_ICON_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "inventory", "icons")
+DASHBOARD_ICONS = ("product_icon.png", "order_icon.png", "income_icon.png")
+DASHBOARD_ICON_SIZE = (120, 120)
+
+
+def cached_icon_path(path, size, cache_dir=None):
+    """Where the rendered icon lives; changes when the source file does."""
+    stat = os.stat(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir or ICON_CACHE_DIR,
+                        f"{stem}-{size[0]}x{size[1]}-{stat.st_size}-{stat.st_mtime_ns}.png")
+
+
+def render_icon(path, size, cache_dir=None):
+    """Renders ``path`` at ``size`` into the cache (once); returns the cached file's path."""
+    target = cached_icon_path(path, size, cache_dir)
+    if os.path.exists(target):
+        return target
+    from PIL import Image   # deferred: only needed when the cache is cold
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = target + ".tmp"
+    with Image.open(path) as img:
+        img.resize(size, Image.LANCZOS).save(tmp_path, format="PNG")
+    os.replace(tmp_path, target)
+    return target
+
+
+def load_icon(path, size, cache_dir=None):
+    """A Tk PhotoImage of ``path`` at ``size``, or None if the icon cannot be loaded."""
+    import tkinter as tk
+
+    try:
+        return tk.PhotoImage(file=render_icon(path, size, cache_dir))
+    except ImportError:
+        # No Pillow: show the source shrunk by Tk's integer subsampling instead
+        try:
+            image = tk.PhotoImage(file=path)
+        except (tk.TclError, OSError):
+            return None
+        factor = max(1, -(-image.width() // size[0]), -(-image.height() // size[1]))
+        return image.subsample(factor) if factor > 1 else image
+    except (tk.TclError, OSError):
+        # Missing or unreadable icon files
+        return None
+
+
+def render_dashboard_icons(base_dir=".", cache_dir=None):
+    """Fills the cache for the dashboard icons; returns (rendered paths, error messages)."""
+    rendered, errors = [], []
+    for name in DASHBOARD_ICONS:
+        try:
+            rendered.append(render_icon(os.path.join(base_dir, name), DASHBOARD_ICON_SIZE, cache_dir))
+        except (ImportError, OSError) as e:
+            errors.append(f"{name}: {e}")
+    return rendered, errors
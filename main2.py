@@ -1,8 +1,28 @@
+import time
+_STARTED = time.perf_counter()   # start of time-to-login-screen (after interpreter startup)
+
+import datetime
+import functools
+import os
+import sys
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog 
-from PIL import Image, ImageTk
-from db import get_products, handle_add_or_update, update_product, delete_product ,check_user_credentials
-from db import get_orders, create_new_order, delete_order, update_payment_status, get_income_report, get_order_items
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from db import get_products, handle_add_or_update, update_product, delete_product
+from db import delete_order, update_payment_status, get_income_report, get_order_items
+from db import get_order_items_bulk
+from db import get_orders_page, get_products_page, search_products
+from db import check_catalog_version, get_catalog_version, get_orders_version, INCOME_BUCKETS
+from widgets import VirtualTable, PagedTreeLoader
+from dbworker import DBExecutor
+from catalog_import import import_catalog
+from icons import DASHBOARD_ICON_SIZE, load_icon
+from credentials import authenticate, check_session
+from order_journal import get_journal
+from cart import Cart
+from reporting import get_product_breakdown
+import metrics
+
+JOURNAL_POLL_MS = 1000
 
 
 class StatusDialog(tk.Toplevel):
@@ -75,34 +95,107 @@ class InventoryApp(tk.Tk):
 
         
         self.active_frame = None
+        # Screens built once and kept alive: name -> (frame, on_show)
+        self.frames = {}
 
-        # Load icons
-        self.product_icon = self.load_icon("product_icon.png", (120, 120))
-        self.order_icon = self.load_icon("order_icon.png", (120, 120))
-        self.income_icon = self.load_icon("income_icon.png", (120, 120))
+        # db.py calls run on worker threads; results come back via after()
+        self.db_worker = DBExecutor(self, on_busy=self.set_busy)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # With INVENTORY_ORDER_JOURNAL set, sales are journaled locally and synced in the background
+        self.order_journal = get_journal()
+        if self.order_journal is not None:
+            self.after(JOURNAL_POLL_MS, self.poll_order_journal)
 
-       
         self.show_login()
 
-    # Load image helper
-    def load_icon(self, path, size):
-        try:
-            img = Image.open(path)
-            img = img.resize(size, Image.LANCZOS)
-            return ImageTk.PhotoImage(img)
-        except Exception as e:
-            # Fallback if image files are missing
-            return None
-
-    # Clear previous frame
+    # Load dashboard icons on first use, so the login screen never waits for them
+    def load_icons(self):
+        if not hasattr(self, "product_icon"):
+            self.product_icon = load_icon("product_icon.png", DASHBOARD_ICON_SIZE)
+            self.order_icon = load_icon("order_icon.png", DASHBOARD_ICON_SIZE)
+            self.income_icon = load_icon("income_icon.png", DASHBOARD_ICON_SIZE)
+
+    def set_busy(self, busy):
+        self.config(cursor="watch" if busy else "")
+
+    def on_close(self):
+        self.db_worker.shutdown()
+        if self.order_journal is not None:
+            self.order_journal.stop()
+        self.destroy()
+
+    def poll_order_journal(self):
+        """Reports journaled sales the flusher has settled; refused and failed ones need the cashier's attention."""
+        outcomes = self.order_journal.take_outcomes()
+        refused = [outcome for outcome in outcomes if outcome['state'] == 'refused']
+        failed = [outcome for outcome in outcomes if outcome['state'] == 'failed']
+        if outcomes and "orders" in self.frames:
+            self.refresh_order_history(only_if_changed=True)
+            self.refresh_product_table_in_orders(only_if_changed=True)
+            pending = self.order_journal.stats()['pending']
+            if refused or failed:
+                self.order_status_label.config(
+                    text=f"{len(refused) + len(failed)} journaled sale(s) not placed", fg="red")
+            else:
+                self.order_status_label.config(text=f"Sales synced; {pending} waiting", fg="green")
+        if refused:
+            messagebox.showerror("Sale Refused", "These journaled sales could not be placed:\n\n" + "\n".join(
+                f"{outcome['customer_name']}: {outcome['message']}" for outcome in refused))
+        if failed:
+            # Not a stock problem: the database kept rejecting these, so the sale needs re-entering
+            messagebox.showerror("Sale Not Synced", "The database did not accept these journaled sales; "
+                                 "please enter them again:\n\n" + "\n".join(
+                f"{outcome['customer_name']}: {outcome['message']}" for outcome in failed))
+        self.after(JOURNAL_POLL_MS, self.poll_order_journal)
+
+    def run_db(self, fn, *args, on_done=None, on_error=None, scope="frame", **kwargs):
+        """Runs a db.py call in the background; on_done gets its result on the Tk thread.
+
+        Refreshes use the default "frame" scope and are cancelled when the user
+        switches frames. Writes pass scope=None so they always run to completion.
+        """
+        if on_error is None:
+            def on_error(error):
+                messagebox.showerror("Database Error", str(error))
+        return self.db_worker.submit(fn, *args, on_done=on_done, on_error=on_error, scope=scope, **kwargs)
+
+    # Hide a cached previous frame, destroy any other
     def switch_frame(self, new_frame):
-        if self.active_frame is not None:
-            self.active_frame.destroy()
+        self.db_worker.cancel("frame")
+        if self.active_frame is not None and self.active_frame is not new_frame:
+            if any(frame is self.active_frame for frame, on_show in self.frames.values()):
+                self.active_frame.pack_forget()
+            else:
+                self.active_frame.destroy()
         self.active_frame = new_frame
         self.active_frame.pack(fill="both", expand=True)
 
+    def show_cached(self, name, build):
+        """Shows a screen, building it on first use; its on_show() reloads only what changed.
+
+        ``build()`` returns (frame, on_show). Background loads of cached screens
+        run in their own ``name`` scope, so leaving a screen does not drop them.
+        """
+        if name not in self.frames:
+            self.frames[name] = build()
+        frame, on_show = self.frames[name]
+        self.switch_frame(frame)
+        if on_show is not None:
+            on_show()
+
+    def drop_cached_frames(self):
+        for name, (frame, on_show) in self.frames.items():
+            self.db_worker.cancel(name)
+            if frame is self.active_frame:
+                self.active_frame = None
+            frame.destroy()
+        self.frames = {}
+
     # --- LOGIN PANEL ---
     def show_login(self):
+        # Nothing from the previous session (cart, loaded history) outlives a logout
+        self.drop_cached_frames()
         frame = tk.Frame(self, bg="#F5F6FA")
 
         title = tk.Label(frame, text="ADMIN LOGIN", font=("Arial", 26, "bold"), bg="#F5F6FA", fg="#2C3A47")
@@ -138,25 +231,31 @@ class InventoryApp(tk.Tk):
         username = self.username_entry.get()
         password = self.password_entry.get() 
         
-        
-        stored_password = check_user_credentials(username) 
-        
-        if stored_password:
-            
-            if password == stored_password:
+        # A user who logged in earlier this shift unlocks without a database round trip
+        if check_session(username, password):
+            self.login_message_label.config(text="")
+            self.show_dashboard()
+            return
+
+        self.login_message_label.config(text="Checking...", fg="#7F8C8D")
+
+        def on_done(valid):
+            if valid:
                 self.login_message_label.config(text="")
                 self.show_dashboard()
             else:
                 self.login_message_label.config(text="Invalid Username or Password.", fg="red")
                 self.password_entry.delete(0, tk.END)
-        else:
-            
-            self.login_message_label.config(text="Invalid Username or Password.", fg="red")
-            self.password_entry.delete(0, tk.END) 
+
+        self.run_db(authenticate, username, password, on_done=on_done)
 
 
     # DASHBOARD PANEL 
     def show_dashboard(self):
+        self.show_cached("dashboard", self.build_dashboard)
+
+    def build_dashboard(self):
+        self.load_icons()
         frame = tk.Frame(self, bg="#FFFFFF", padx=40, pady=40)
 
         logout_btn = tk.Button(
@@ -193,7 +292,7 @@ class InventoryApp(tk.Tk):
         income_frame = self.create_icon_button(grid, self.income_icon, "Income Report", self.show_income)
         income_frame.grid(row=2, column=0, padx=20)
 
-        self.switch_frame(frame)
+        return frame, None
 
     
     def create_icon_button(self, parent, icon, label, command):
@@ -225,6 +324,9 @@ class InventoryApp(tk.Tk):
 
     
     def show_products(self):
+        self.show_cached("products", self.build_products)
+
+    def build_products(self):
         frame = tk.Frame(self, bg="#F5F6FA", padx=20, pady=20)
 
         return_btn = tk.Button(frame, text="← Back", font=("Arial", 12, "bold"),
@@ -257,30 +359,47 @@ class InventoryApp(tk.Tk):
         stock_entry.grid(row=2, column=1, padx=5)
         
         
+        search_row = tk.Frame(frame, bg="#F5F6FA")
+        search_row.pack(anchor="w", pady=(20, 0))
+        tk.Label(search_row, text="Search", font=("Arial", 14), bg="#F5F6FA").pack(side="left", padx=5)
+        search_var = tk.StringVar()
+        tk.Entry(search_row, textvariable=search_var, font=("Arial", 14), width=30).pack(side="left", padx=5)
+
         table_frame = tk.Frame(frame)
-        table_frame.pack(fill="both", expand=True, pady=(20, 0)) 
+        table_frame.pack(fill="both", expand=True, pady=(10, 0)) 
         
         columns = ("ID", "Name", "Price", "Stock")
-        table = ttk.Treeview(table_frame, columns=columns, show="headings")
-
-        # Scrollbar
-        vsb = ttk.Scrollbar(table_frame, orient="vertical", command=table.yview)
-        table.configure(yscrollcommand=vsb.set)
-        vsb.pack(side='right', fill='y')
-        table.pack(side='left', fill="both", expand=True)
+        table_view = VirtualTable(table_frame, columns)
+        table_view.pack(fill="both", expand=True)
+        table = table_view.tree
         
         for col in columns:
             table.heading(col, text=col)
             table.column(col, width=150, anchor="center")
 
        
+        # Catalog version and filter the table was last filled with
+        shown = {'version': None, 'prefix': None}
+
         def refresh_table():
-            for item in table.get_children():
-                table.delete(item)
+            prefix = search_var.get().strip()
+
+            def fetch():
+                rows = search_products(prefix) if prefix else get_products()
+                return rows, get_catalog_version()
+
+            def on_done(result):
+                rows, version = result
+                # Ignore results for a filter the user has already typed past
+                if search_var.get().strip() != prefix:
+                    return
+                if (version, prefix) != (shown['version'], shown['prefix']):
+                    shown.update(version=version, prefix=prefix)
+                    table_view.set_rows(rows)
+
+            self.run_db(fetch, on_done=on_done, scope="products")
 
-            products = get_products()
-            for prod in products:
-                table.insert("", "end", values=prod)
+        search_var.trace_add("write", lambda *args: refresh_table())
 
        
         def select_item(event):
@@ -314,8 +433,15 @@ class InventoryApp(tk.Tk):
                 
                 stock = int(stock_input)
                 
-                message, success = handle_add_or_update(name, price, stock) 
-                
+            except ValueError:
+                tk.messagebox.showerror("Input Error", "Price must be a number and Stock must be an integer.")
+                self.product_status_label.config(text="Input Error: Check Price and Stock fields.", fg="red")
+                return
+
+            def on_done(result):
+                message, success = result
+                if not frame.winfo_exists():
+                    return
                 if success:
                     refresh_table()
                     self.product_status_label.config(text=message, fg="green")
@@ -325,10 +451,9 @@ class InventoryApp(tk.Tk):
                     stock_entry.delete(0, tk.END)
                 else:
                     self.product_status_label.config(text=message, fg="red")
-                    
-            except ValueError:
-                tk.messagebox.showerror("Input Error", "Price must be a number and Stock must be an integer.")
-                self.product_status_label.config(text="Input Error: Check Price and Stock fields.", fg="red")
+
+            self.run_db(handle_add_or_update, name, price, stock, on_done=on_done, scope=None)
+
 
         def update_product_btn():
             selected = table.focus()
@@ -346,20 +471,25 @@ class InventoryApp(tk.Tk):
                     else:
                         stock = int(values[3]) 
                     
-                    if update_product(product_id, name, price, stock):
+                except ValueError:
+                    tk.messagebox.showerror("Input Error", "Price must be a number and Stock must be an integer.")
+                    self.product_status_label.config(text="Input Error: Check Price and Stock fields.", fg="red")
+                    return
+
+                def on_done(updated):
+                    if not frame.winfo_exists():
+                        return
+                    if updated:
                         refresh_table()
                         self.product_status_label.config(text=f"Product ID {product_id} updated successfully.", fg="green")
 
                         name_entry.delete(0, tk.END)
                         price_entry.delete(0, tk.END)
                         stock_entry.delete(0, tk.END)
-                        
-                except ValueError:
-                    tk.messagebox.showerror("Input Error", "Price must be a number and Stock must be an integer.")
-                    self.product_status_label.config(text="Input Error: Check Price and Stock fields.", fg="red")
-                except Exception as e:
-                    tk.messagebox.showerror("DB Error", f"Failed to update: {e}")
-                    self.product_status_label.config(text="Database Update Error.", fg="red")
+                    else:
+                        self.product_status_label.config(text="Database Update Error.", fg="red")
+
+                self.run_db(update_product, product_id, name, price, stock, on_done=on_done, scope=None)
 
         def delete_product_btn():
             selected = table.focus()
@@ -367,15 +497,58 @@ class InventoryApp(tk.Tk):
                 if tk.messagebox.askyesno("Confirm Delete", "Are you sure you want to delete the selected product?"):
                     values = table.item(selected, "values")
                     product_id = values[0]
-                    if delete_product(product_id):
-                        refresh_table()
-                        self.product_status_label.config(text=f"Product ID {product_id} deleted successfully.", fg="green")
 
-                        name_entry.delete(0, tk.END)
-                        price_entry.delete(0, tk.END)
-                        stock_entry.delete(0, tk.END)
-                    else:
-                         self.product_status_label.config(text="Delete failed. Product may be linked to an order.", fg="red")
+                    def on_done(deleted):
+                        if not frame.winfo_exists():
+                            return
+                        if deleted:
+                            refresh_table()
+                            self.product_status_label.config(text=f"Product ID {product_id} deleted successfully.", fg="green")
+
+                            name_entry.delete(0, tk.END)
+                            price_entry.delete(0, tk.END)
+                            stock_entry.delete(0, tk.END)
+                        else:
+                             self.product_status_label.config(text="Delete failed. Product may be linked to an order.", fg="red")
+
+                    self.run_db(delete_product, product_id, on_done=on_done, scope=None)
+
+        def import_catalog_btn():
+            path = filedialog.askopenfilename(
+                title="Import Catalog",
+                filetypes=[("Catalog files", "*.csv *.parquet"), ("All files", "*.*")])
+            if not path:
+                return
+
+            # Written by the worker thread, shown by the Tk thread below
+            progress = {'text': "Importing..."}
+
+            def on_progress(rows, rows_per_sec):
+                progress['text'] = f"Importing... {rows} rows ({rows_per_sec:.0f} rows/s)"
+
+            def show_progress():
+                if frame.winfo_exists() and not future.done():
+                    self.product_status_label.config(text=progress['text'], fg="#3867D6")
+                    frame.after(250, show_progress)
+
+            def on_done(result):
+                success, message, stats = result
+                if not frame.winfo_exists():
+                    return
+                import_btn.config(state="normal")
+                self.product_status_label.config(text=message, fg="green" if success else "red")
+                refresh_table()
+
+            def on_error(error):
+                # import_catalog reports expected failures itself; anything else lands here
+                if frame.winfo_exists():
+                    import_btn.config(state="normal")
+                    self.product_status_label.config(text=f"Import failed: {error}", fg="red")
+
+            import_btn.config(state="disabled")
+            future = self.run_db(import_catalog, path, progress=on_progress, on_done=on_done,
+                                 on_error=on_error, scope=None)
+            show_progress()
 
        
         btn_frame = tk.Frame(frame, bg="#F5F6FA")
@@ -387,20 +560,27 @@ class InventoryApp(tk.Tk):
                   relief="flat", command=update_product_btn).grid(row=0, column=1, padx=5)
         tk.Button(btn_frame, text="Delete", width=12, bg="#FC5C65", fg="white", font=("Arial", 12, "bold"),
                   relief="flat", command=delete_product_btn).grid(row=0, column=2, padx=5)
+        import_btn = tk.Button(btn_frame, text="Import...", width=12, bg="#8854D0", fg="white", font=("Arial", 12, "bold"),
+                  relief="flat", command=import_catalog_btn)
+        import_btn.grid(row=0, column=3, padx=5)
         
        
-        refresh_table() 
-        
-        self.switch_frame(frame)
+        return frame, refresh_table
 
    
     #  ORDER PANEL 
     
     def show_orders(self):
+        self.show_cached("orders", self.build_orders)
+
+    def build_orders(self):
         frame = tk.Frame(self, bg="#F5F6FA", padx=20, pady=20)
+        run_db = functools.partial(self.run_db, scope="orders")
+        # Versions the product and history tables were last loaded at
+        shown = {'catalog': None, 'orders': None}
         
        
-        self.current_cart = {} 
+        self.current_cart = Cart()
         self.current_total = tk.StringVar(value="0.00")
         
         
@@ -434,8 +614,9 @@ class InventoryApp(tk.Tk):
         cart_table_frame.pack(fill="both", expand=True, pady=(0, 10))
         
         cart_columns = ("ID", "Name", "Qty", "Price", "Subtotal")
-        self.cart_table = ttk.Treeview(cart_table_frame, columns=cart_columns, show="headings", height=8)
-        self.cart_table.pack(side="left", fill="both", expand=True)
+        self.cart_view = VirtualTable(cart_table_frame, cart_columns, height=8)
+        self.cart_view.pack(fill="both", expand=True)
+        self.cart_table = self.cart_view.tree
         self.cart_table.column("ID", width=40, anchor="center")
         self.cart_table.column("Name", width=150, anchor="w")
         self.cart_table.column("Qty", width=50, anchor="center")
@@ -455,9 +636,8 @@ class InventoryApp(tk.Tk):
                 values = self.cart_table.item(selected, 'values')
                 product_id = int(values[0])
                 
-                if product_id in self.current_cart:
-                    del self.current_cart[product_id]
-                    self.refresh_cart_display()
+                self.current_cart.remove(product_id)
+                self.refresh_cart_display()
 
         tk.Button(cart_btn_frame, text="Remove Item", bg="#FCA3A8", fg="black", command=remove_item_from_cart).pack(side="left", fill="x", expand=True, padx=(0, 5))
         tk.Button(cart_btn_frame, text="Clear Cart", bg="#FFD479", fg="black", command=lambda: (self.current_cart.clear(), self.refresh_cart_display())).pack(side="right", fill="x", expand=True)
@@ -475,33 +655,56 @@ class InventoryApp(tk.Tk):
                 return
 
            
-            order_items_list = [(id, item['qty']) for id, item in self.current_cart.items()]
-            
-           
-            order_id, message = create_new_order(customer_name, order_items_list)
+            total = self.current_total.get()
             
-            if order_id is not None:
-                messagebox.showinfo("Success", f"Order {order_id} placed successfully!\nTotal: ₱{self.current_total.get()}")
+            def on_done(result):
+                order_id, message = result
+                if not frame.winfo_exists():
+                    return
+                record_btn.config(state="normal")
+                self.refresh_cart_display()
+                if order_id is not None:
+                    messagebox.showinfo("Success", f"Order {order_id} placed successfully!\nTotal: ₱{total}")
+                    self.refresh_order_history()
+                    self.refresh_product_table_in_orders() 
+                else:
+                    messagebox.showerror("Error", f"Failed to finalize order: {message}")
+                    self.order_status_label.config(text=f"Failed: {message}", fg="red")
+
+            if self.order_journal is not None:
+                # Durable locally at once; poll_order_journal reports the database's verdict
+                self.order_journal.submit(customer_name, self.current_cart.order_items())
                 self.current_cart.clear()
                 self.refresh_cart_display()
-                self.refresh_order_history()
-                self.refresh_product_table_in_orders() 
-            else:
-                messagebox.showerror("Error", f"Failed to finalize order: {message}")
-                self.order_status_label.config(text=f"Failed: {message}", fg="red")
+                self.order_status_label.config(
+                    text=f"Sale for {customer_name} saved (₱{total}); syncing to the database...", fg="#2C3A47")
+                return
 
-        tk.Button(new_order_panel, text="RECORD SALE", 
+            # One sale at a time: block double submission until the commit returns
+            record_btn.config(state="disabled")
+            # Cart.checkout re-checks price and stock in one query and fails fast on shortfalls
+            self.run_db(self.current_cart.checkout, customer_name, on_done=on_done, scope=None)
+
+        record_btn = tk.Button(new_order_panel, text="RECORD SALE", 
                   font=("Arial", 16, "bold"), bg="#20BF6B", fg="white", 
-                  relief="flat", command=finalize_order).pack(fill="x", pady=10)
+                  relief="flat", command=finalize_order)
+        record_btn.pack(fill="x", pady=10)
 
         #  Available Products List
         tk.Label(new_order_panel, text="Available Products (Double Click to Add)", font=("Arial", 14, "bold"), bg="#F5F6FA").pack(anchor="w", pady=(10, 5))
+        product_search_row = tk.Frame(new_order_panel, bg="#F5F6FA")
+        product_search_row.pack(fill="x", pady=(0, 5))
+        tk.Label(product_search_row, text="Search", bg="#F5F6FA").pack(side="left")
+        product_search_var = tk.StringVar()
+        tk.Entry(product_search_row, textvariable=product_search_var).pack(side="left", fill="x", expand=True, padx=5)
+
         product_table_frame = tk.Frame(new_order_panel)
         product_table_frame.pack(fill="both", expand=True)
 
         product_columns = ("ID", "Name", "Price", "Stock")
-        self.product_table = ttk.Treeview(product_table_frame, columns=product_columns, show="headings", height=10)
-        self.product_table.pack(side="left", fill="both", expand=True)
+        product_view = VirtualTable(product_table_frame, product_columns, height=10)
+        product_view.pack(fill="both", expand=True)
+        self.product_table = product_view.tree
         self.product_table.column("ID", width=40, anchor="center")
         self.product_table.column("Name", width=150, anchor="w")
         self.product_table.column("Price", width=70, anchor="e")
@@ -509,20 +712,34 @@ class InventoryApp(tk.Tk):
         for col in product_columns:
             self.product_table.heading(col, text=col)
 
-        # Refresh Product Table 
-        def refresh_product_table_in_orders():
-            for item in self.product_table.get_children():
-                self.product_table.delete(item)
-            products = get_products()
-            for prod in products:
-                if int(prod[3]) > 0: 
-                    self.product_table.insert("", "end", values=prod)
+        # Refresh Product Table (in-stock products, loaded page by page on scroll)
+        product_loader = PagedTreeLoader(
+            product_view,
+            lambda after: get_products_page(after, in_stock_only=True),
+            runner=run_db)
+
+        def refresh_product_table_in_orders(only_if_changed=False):
+            def on_done(version):
+                if only_if_changed and version == shown['catalog']:
+                    return
+                shown['catalog'] = version
+                product_loader.refresh()
+
+            run_db(check_catalog_version, on_done=on_done)
+
+        def filter_product_table(*args):
+            prefix = product_search_var.get().strip()
+            if prefix:
+                product_loader.fetch_page = lambda after: (search_products(prefix, in_stock_only=True), None)
+            else:
+                product_loader.fetch_page = lambda after: get_products_page(after, in_stock_only=True)
+            product_loader.refresh()
+
+        product_search_var.trace_add("write", filter_product_table)
         
        
         self.refresh_product_table_in_orders = refresh_product_table_in_orders
 
-        refresh_product_table_in_orders()
-
 
         # Item Adding 
         def add_item_to_cart(event):
@@ -533,23 +750,25 @@ class InventoryApp(tk.Tk):
                 name = values[1]
                 price = float(values[2])
                 stock = int(values[3])
-                
-                current_qty_in_cart = self.current_cart.get(product_id, {}).get('qty', 0)
 
-               
-                quantity = simpledialog.askinteger("Quantity", f"Enter quantity for {name} (Max available: {stock - current_qty_in_cart}):", 
-                                                    parent=frame, minvalue=1, maxvalue=(stock - current_qty_in_cart))
+                # The table may be stale: its stock is only a hint, Cart.add checks the database
+                quantity = simpledialog.askinteger("Quantity", f"Enter quantity for {name} (In stock: {stock}):",
+                                                    parent=frame, minvalue=1)
                 
                 if quantity:
-                    if product_id in self.current_cart:
-                       
-                        new_qty = current_qty_in_cart + quantity
-                        self.current_cart[product_id]['qty'] = new_qty
-                    else:
-                        
-                        self.current_cart[product_id] = {'name': name, 'price': price, 'qty': quantity}
-
-                    self.refresh_cart_display()
+                    def on_done(result):
+                        success, message = result
+                        if not frame.winfo_exists():
+                            return
+                        self.refresh_cart_display()
+                        if success:
+                            self.order_status_label.config(text=message, fg="#2C3A47")
+                        else:
+                            messagebox.showwarning("Cannot Add Item", message)
+                            self.refresh_product_table_in_orders(only_if_changed=True)
+
+                    displayed = (name, price, stock) if self.order_journal is not None else None
+                    self.run_db(self.current_cart.add, product_id, quantity, displayed, on_done=on_done, scope=None)
                 
         self.product_table.bind("<Double-1>", add_item_to_cart)
         
@@ -565,11 +784,23 @@ class InventoryApp(tk.Tk):
         history_table_frame.pack(fill="both", expand=True)
 
         history_columns = ("ID", "Customer", "Date", "Total", "Status")
-        self.history_table = ttk.Treeview(history_table_frame, columns=history_columns, show="headings")
-        self.history_table.pack(side='left', fill="both", expand=True)
-        vsb = ttk.Scrollbar(history_table_frame, orient="vertical", command=self.history_table.yview)
-        vsb.pack(side='right', fill='y')
-        self.history_table.configure(yscrollcommand=vsb.set)
+        history_view = VirtualTable(history_table_frame, history_columns, expandable=True)
+        history_view.pack(fill="both", expand=True)
+        self.history_table = history_view.tree
+
+        def load_history_items(rows):
+            # One bulk query per loaded page; each order expands to its lines.
+            def on_done(items_by_order):
+                history_view.set_children({
+                    order_id: [("", f"  {name}", f"{quantity} x ₱{float(price):.2f}", f"{quantity * float(price):.2f}", "")
+                               for item_id, name, quantity, price in items]
+                    for order_id, items in items_by_order.items()
+                })
+
+            run_db(get_order_items_bulk, [int(row[0]) for row in rows], on_done=on_done)
+
+        history_loader = PagedTreeLoader(history_view, get_orders_page, runner=run_db,
+                                         on_rows=load_history_items)
 
         self.history_table.column("ID", width=40, anchor="center")
         self.history_table.column("Customer", width=120, anchor="w")
@@ -584,17 +815,19 @@ class InventoryApp(tk.Tk):
         history_btn_frame.pack(fill="x", pady=10)
         
        
-        def refresh_orders_table():
-            for item in self.history_table.get_children():
-                self.history_table.delete(item)
-            orders = get_orders() 
-            for order in orders:
-                self.history_table.insert("", "end", values=order)
+        def refresh_orders_table(only_if_changed=False):
+            def on_done(version):
+                if only_if_changed and version is not None and version == shown['orders']:
+                    return
+                shown['orders'] = version
+                history_loader.refresh()
+
+            run_db(get_orders_version, on_done=on_done)
 
         self.refresh_order_history = refresh_orders_table # 
 
         def view_order_details():
-            selected = self.history_table.focus()
+            selected = history_view.parent_key(self.history_table.focus())
             if selected:
                 values = self.history_table.item(selected, "values")
                 order_id = int(values[0])
@@ -602,31 +835,37 @@ class InventoryApp(tk.Tk):
                 total = values[3]
                 status = values[4]
                 
-                items = get_order_items(order_id)
-                detail_text = f"Order ID: {order_id}\nCustomer: {customer}\nStatus: {status}\n\nItems:\n"
-                
-                for item_id, name, quantity, price in items:
-                    subtotal = quantity * price
-                    detail_text += f"- {name} ({quantity} x ₱{price:.2f}) = ₱{subtotal:.2f}\n"
+                def on_done(items):
+                    detail_text = f"Order ID: {order_id}\nCustomer: {customer}\nStatus: {status}\n\nItems:\n"
+                    
+                    for item_id, name, quantity, price in items:
+                        subtotal = quantity * price
+                        detail_text += f"- {name} ({quantity} x ₱{price:.2f}) = ₱{subtotal:.2f}\n"
 
-                detail_text += f"\nTOTAL: ₱{total}"
-                messagebox.showinfo("Order Details", detail_text)
+                    detail_text += f"\nTOTAL: ₱{total}"
+                    messagebox.showinfo("Order Details", detail_text)
+
+                self.run_db(get_order_items, order_id, on_done=on_done)
 
         def delete_history_order():
             
-            selected = self.history_table.focus()
+            selected = history_view.parent_key(self.history_table.focus())
             if selected:
                 values = self.history_table.item(selected, "values")
                 order_id = int(values[0])
                 
                 if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete Order ID {order_id}?\n\nNOTE: If this order was Paid, stock will be returned to inventory."):
-                    success, msg = delete_order(order_id)
-                    if success:
-                        messagebox.showinfo("Success", msg)
-                        self.refresh_order_history()
-                        self.refresh_product_table_in_orders() 
-                    else:
-                        messagebox.showerror("Error", f"Deletion Failed: {msg}")
+                    def on_done(result):
+                        success, msg = result
+                        if success:
+                            messagebox.showinfo("Success", msg)
+                            if frame.winfo_exists():
+                                self.refresh_order_history()
+                                self.refresh_product_table_in_orders() 
+                        else:
+                            messagebox.showerror("Error", f"Deletion Failed: {msg}")
+
+                    self.run_db(delete_order, order_id, on_done=on_done, scope=None)
 
        
         def change_order_status():
@@ -635,7 +874,7 @@ class InventoryApp(tk.Tk):
                 messagebox.showwarning("Warning", "Please select an order to change status.")
                 return
 
-            order_values = self.history_table.item(selection[0], 'values')
+            order_values = self.history_table.item(history_view.parent_key(selection[0]), 'values')
             order_id = int(order_values[0])
 
             
@@ -646,14 +885,17 @@ class InventoryApp(tk.Tk):
                 return
 
            
-            success, message = update_payment_status(order_id, new_status) 
+            def on_done(result):
+                success, message = result
+                if success:
+                    messagebox.showinfo("Success", message)
+                    if frame.winfo_exists():
+                        self.refresh_order_history() 
+                        self.refresh_product_table_in_orders() 
+                else:
+                    messagebox.showerror("Error", f"Failed to update status: {message}")
 
-            if success:
-                messagebox.showinfo("Success", message)
-                self.refresh_order_history() 
-                self.refresh_product_table_in_orders() 
-            else:
-                messagebox.showerror("Error", f"Failed to update status: {message}")
+            self.run_db(update_payment_status, order_id, new_status, on_done=on_done, scope=None)
         
         # Buttons for History Panel
         tk.Button(history_btn_frame, text="View Details", bg="#1B9CFC", fg="white", command=view_order_details).pack(side="left", padx=5)
@@ -661,37 +903,41 @@ class InventoryApp(tk.Tk):
         tk.Button(history_btn_frame, text="Delete Order", bg="#FC5C65", fg="white", command=delete_history_order).pack(side="left", padx=5)
 
 
-        refresh_orders_table()
-        self.switch_frame(frame)
+        def on_show():
+            refresh_product_table_in_orders(only_if_changed=True)
+            refresh_orders_table(only_if_changed=True)
+
+        return frame, on_show
 
  
     def refresh_cart_display(self):
         """Refreshes the cart Treeview and updates the total label."""
-        if not hasattr(self, 'cart_table'):
+        if not hasattr(self, 'cart_view'):
             return 
-            
-       
-        for item in self.cart_table.get_children():
-            self.cart_table.delete(item)
         
+        # Prices come from the cart's snapshot, not from the product table
         current_total_value = 0.0
+        rows = []
         
-        for id, item in self.current_cart.items():
-            subtotal = item['price'] * item['qty']
+        for id, name, qty, price, subtotal in self.current_cart.lines():
             current_total_value += subtotal
             
-            self.cart_table.insert("", "end", values=(
+            rows.append((
                 id, 
-                item['name'], 
-                item['qty'], 
-                f"{item['price']:.2f}", 
+                name, 
+                qty, 
+                f"{price:.2f}", 
                 f"{subtotal:.2f}"
             ))
         
+        self.cart_view.set_rows(rows)
         self.current_total.set(f"{current_total_value:.2f}")
     
     # INCOME PANEL 
     def show_income(self):
+        self.show_cached("income", self.build_income)
+
+    def build_income(self):
         frame = tk.Frame(self, bg="#F5F6FA", padx=20, pady=20)
 
         
@@ -717,16 +963,45 @@ class InventoryApp(tk.Tk):
        
         card2 = tk.Frame(summary_container, bg="#FFFFFF", padx=20, pady=10, relief="flat", borderwidth=1)
         card2.grid(row=0, column=1, padx=10)
-        tk.Label(card2, text="SALES (LAST 30 DAYS)", font=("Arial", 12), bg="#FFFFFF", fg="#7F8C8D").pack(anchor="w")
+        tk.Label(card2, text="SALES (SELECTED RANGE)", font=("Arial", 12), bg="#FFFFFF", fg="#7F8C8D").pack(anchor="w")
         self.last_30_days_label = tk.Label(card2, text="₱0.00", font=("Arial", 24, "bold"), bg="#FFFFFF", fg="#20BF6B")
         self.last_30_days_label.pack(anchor="w", pady=(5, 0))
 
-      
-        detail_title = tk.Label(frame, text="Detailed Sales Records (Last 60 Days)", font=("Arial", 18, "bold"), bg="#F5F6FA", fg="#2C3A47")
-        detail_title.pack(anchor="w", pady=(30, 10))
-
-        table_frame = tk.Frame(frame)
-        table_frame.pack(fill="both", expand=True) 
+        # Range and bucket controls; closed periods are memoized in db, so widening is cheap
+        controls = tk.Frame(frame, bg="#F5F6FA")
+        controls.pack(anchor="w", pady=(20, 0))
+        presets = {
+            "Last 7 days": lambda today: (today - datetime.timedelta(days=6), today),
+            "Last 30 days": lambda today: (today - datetime.timedelta(days=29), today),
+            "Last 60 days": lambda today: (today - datetime.timedelta(days=59), today),
+            "Last 365 days": lambda today: (today - datetime.timedelta(days=364), today),
+            "This month": lambda today: (today.replace(day=1), today),
+            "This year": lambda today: (today.replace(month=1, day=1), today),
+        }
+        preset_var = tk.StringVar(value="Last 60 days")
+        first_day_var = tk.StringVar()
+        last_day_var = tk.StringVar()
+        bucket_var = tk.StringVar(value="day")
+        tk.Label(controls, text="Range", bg="#F5F6FA").pack(side="left")
+        preset_box = ttk.Combobox(controls, textvariable=preset_var, values=list(presets), state="readonly", width=14)
+        preset_box.pack(side="left", padx=(5, 15))
+        tk.Label(controls, text="From", bg="#F5F6FA").pack(side="left")
+        tk.Entry(controls, textvariable=first_day_var, width=11).pack(side="left", padx=(5, 10))
+        tk.Label(controls, text="To", bg="#F5F6FA").pack(side="left")
+        tk.Entry(controls, textvariable=last_day_var, width=11).pack(side="left", padx=(5, 15))
+        tk.Label(controls, text="By", bg="#F5F6FA").pack(side="left")
+        bucket_box = ttk.Combobox(controls, textvariable=bucket_var, values=INCOME_BUCKETS, state="readonly", width=7)
+        bucket_box.pack(side="left", padx=(5, 15))
+        tk.Button(controls, text="Apply", bg="#4B7BEC", fg="white", relief="flat",
+                  command=lambda: load_income_report()).pack(side="left")
+
+        detail_title = tk.Label(frame, text="Detailed Sales Records", font=("Arial", 18, "bold"), bg="#F5F6FA", fg="#2C3A47")
+        detail_title.pack(anchor="w", pady=(20, 10))
+
+        tabs = ttk.Notebook(frame)
+        tabs.pack(fill="both", expand=True)
+        table_frame = tk.Frame(tabs)
+        tabs.add(table_frame, text="By Period")
         
         columns = ("Date Period", "Orders Count", "Gross Income")
         income_table = ttk.Treeview(table_frame, columns=columns, show="headings")
@@ -742,33 +1017,108 @@ class InventoryApp(tk.Tk):
         
         for col in columns:
             income_table.heading(col, text=col)
-            
+
+        # Product breakdown, summed from the order lines of the same range
+        product_frame = tk.Frame(tabs)
+        tabs.add(product_frame, text="By Product")
+        product_columns = ("Product", "Units Sold", "Orders", "Revenue", "Share")
+        product_table = ttk.Treeview(product_frame, columns=product_columns, show="headings")
+        product_vsb = ttk.Scrollbar(product_frame, orient="vertical", command=product_table.yview)
+        product_table.configure(yscrollcommand=product_vsb.set)
+        product_vsb.pack(side='right', fill='y')
+        product_table.pack(side='left', fill="both", expand=True)
+        product_table.column("Product", width=220, anchor="w")
+        for col in product_columns[1:]:
+            product_table.column(col, width=110, anchor="e")
+        for col in product_columns:
+            product_table.heading(col, text=col)
+
+        def show_product_breakdown(rows):
+            product_table.delete(*product_table.get_children())
+            for product_id, name, units, revenue, orders, share in rows:
+                product_table.insert("", "end", values=(name, units, orders, f"₱{revenue:.2f}", f"{share:.1f}%"))
      
+        def show_income_report(report_data):
+            self.total_sales_label.config(text=f"₱{report_data['total_sales']:.2f}")
+            self.last_30_days_label.config(text=f"₱{report_data['last_30_days']:.2f}")
+        
+           
+            for item in income_table.get_children():
+                income_table.delete(item)
+                
+            for row in report_data['details']:
+                
+                income_table.insert("", "end", values=row)
+
+        def show_income_error(e):
+            self.total_sales_label.config(text="N/A", fg="red")
+            self.last_30_days_label.config(text="DB Error", fg="red")
+            messagebox.showerror("Database Error", f"Could not load income report: {e}")
+
+        def apply_preset(*args):
+            first_day, last_day = presets[preset_var.get()](datetime.date.today())
+            first_day_var.set(first_day.isoformat())
+            last_day_var.set(last_day.isoformat())
+            load_income_report()
+
+        preset_box.bind("<<ComboboxSelected>>", apply_preset)
+        bucket_box.bind("<<ComboboxSelected>>", lambda event: load_income_report())
+
+        # Presets move with the date, so today is part of the version too
+        shown = {'version': None}
+
         def load_income_report():
+            if not first_day_var.get():
+                first_day, last_day = presets[preset_var.get()](datetime.date.today())
+                first_day_var.set(first_day.isoformat())
+                last_day_var.set(last_day.isoformat())
             try:
-                report_data = get_income_report() 
-                
-               
-                self.total_sales_label.config(text=f"₱{report_data['total_sales']:.2f}")
-                self.last_30_days_label.config(text=f"₱{report_data['last_30_days']:.2f}")
-            
-               
-                for item in income_table.get_children():
-                    income_table.delete(item)
-                    
-                for row in report_data['details']:
-                    
-                    income_table.insert("", "end", values=row)
+                first_day = datetime.date.fromisoformat(first_day_var.get().strip())
+                last_day = datetime.date.fromisoformat(last_day_var.get().strip())
+            except ValueError:
+                messagebox.showwarning("Invalid Range", "Enter the dates as YYYY-MM-DD.")
+                return
+            if first_day > last_day:
+                messagebox.showwarning("Invalid Range", "The range must start before it ends.")
+                return
+            bucket = bucket_var.get()
 
-            except Exception as e:
-                self.total_sales_label.config(text="N/A", fg="red")
-                self.last_30_days_label.config(text="DB Error", fg="red")
-                messagebox.showerror("Database Error", f"Could not load income report: {e}")
-            
-        load_income_report()
-        self.switch_frame(frame)
+            def on_version(version):
+                version = (datetime.date.today(), first_day, last_day, bucket, version)
+                if version[-1] is not None and version == shown['version']:
+                    return
+
+                def on_done(report_data):
+                    shown['version'] = version
+                    detail_title.config(text=f"Detailed Sales Records ({first_day} to {last_day}, by {bucket})")
+                    show_income_report(report_data)
+
+                self.run_db(get_income_report, first_day, last_day, bucket,
+                            on_done=on_done, on_error=show_income_error, scope="income")
+                self.run_db(get_product_breakdown, first_day, last_day,
+                            on_done=show_product_breakdown, on_error=show_income_error, scope="income")
+
+            self.run_db(get_orders_version, on_done=on_version, scope="income")
+
+        return frame, load_income_report
+
+
+def report_startup_time(app, exit_after=False):
+    """Prints time-to-login-screen; INVENTORY_STARTUP_LOG appends it as a CSV line too."""
+    app.update_idletasks()
+    elapsed_ms = (time.perf_counter() - _STARTED) * 1000.0
+    print(f"Login screen shown after {elapsed_ms:.1f} ms")
+    log_path = os.environ.get("INVENTORY_STARTUP_LOG")
+    if log_path:
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(f"{datetime.datetime.now().isoformat(timespec='seconds')},{elapsed_ms:.1f}\n")
+    if exit_after:
+        app.on_close()
 
 
 if __name__ == "__main__":
+    metrics.configure_from_env()
     app = InventoryApp()
+    # Idle callbacks run after the pending redraws, i.e. once the login screen is drawn
+    app.after_idle(report_startup_time, app, "--startup-time" in sys.argv[1:])
     app.mainloop()
\ No newline at end of file
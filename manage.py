@@ -0,0 +1,148 @@
+"""Maintenance commands for the inventory database.
+
+    python manage.py migrate
+    python manage.py rebuild-income
+    python manage.py import-catalog supplier.csv [--format parquet]
+    python manage.py export-orders orders.csv [--state export_state.json]
+    python manage.py render-icons
+    python manage.py provision-users users.csv   # username,password per line
+    python manage.py flush-journal [--journal order_journal.db]
+"""
+import argparse
+import csv
+import datetime
+import sys
+
+import catalog_import
+import credentials
+import db
+import icons
+import order_export
+import order_journal
+import schema
+
+
+def cmd_migrate(args):
+    conn = db.connect_db()
+    if not conn:
+        print("Database connection failed.")
+        return 1
+    try:
+        applied = schema.migrate(conn, db.get_backend().name)
+        version = schema.current_version(conn)
+    finally:
+        conn.close()
+    if applied:
+        print(f"Applied migrations {applied}.")
+    print(f"Schema is at version {version}.")
+    return 0
+
+
+def cmd_rebuild_income(args):
+    success, message = db.rebuild_income_rollup()
+    print(message)
+    return 0 if success else 1
+
+
+def cmd_import_catalog(args):
+    def progress(rows, rows_per_sec):
+        print(f"\r{rows} rows ({rows_per_sec:.0f} rows/s)", end="", flush=True)
+
+    success, message, stats = catalog_import.import_catalog(
+        args.path, args.format, args.chunk_size, args.commit_every, progress)
+    print()
+    print(message)
+    return 0 if success else 1
+
+
+def cmd_export_orders(args):
+    success, message, watermark = order_export.export_orders(
+        args.path, args.format, args.since_order_id, args.since,
+        args.fetch_size, args.state)
+    print(message)
+    if success:
+        print(f"Watermark: {watermark.to_dict()}")
+    return 0 if success else 1
+
+
+def cmd_render_icons(args):
+    rendered, errors = icons.render_dashboard_icons(args.dir)
+    for path in rendered:
+        print(f"Cached {path}")
+    for error in errors:
+        print(f"Could not render {error}")
+    return 0 if not errors else 1
+
+
+def cmd_provision_users(args):
+    with open(args.path, newline="", encoding="utf-8") as f:
+        users = [(row[0].strip(), row[1]) for row in csv.reader(f) if row and not row[0].startswith("#")]
+    success, message = credentials.provision_users(users, args.workers)
+    print(message)
+    return 0 if success else 1
+
+
+def cmd_flush_journal(args):
+    journal = order_journal.OrderJournal(args.journal)
+    try:
+        while True:
+            settled, still_pending = journal.flush()
+            if still_pending or not settled:
+                break
+        for outcome in journal.take_outcomes():
+            if outcome['state'] == 'refused':
+                print(f"Refused {outcome['customer_name']}: {outcome['message']}")
+        stats = journal.stats()
+    finally:
+        journal.close()
+    print(f"{stats['placed']} placed, {stats['refused']} refused, {stats['pending']} pending.")
+    if stats['last_error']:
+        print(stats['last_error'])
+    return 0 if not stats['pending'] else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inventory database maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="create missing tables and indexes")
+    migrate.set_defaults(func=cmd_migrate)
+
+    rebuild = commands.add_parser("rebuild-income", help="recompute the daily income rollup from order_header")
+    rebuild.set_defaults(func=cmd_rebuild_income)
+
+    importer = commands.add_parser("import-catalog", help="bulk upsert products from a CSV or Parquet file")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=["csv", "parquet"], help="default: from the file extension")
+    importer.add_argument("--chunk-size", type=int, default=catalog_import.CHUNK_SIZE)
+    importer.add_argument("--commit-every", type=int, default=catalog_import.COMMIT_EVERY)
+    importer.set_defaults(func=cmd_import_catalog)
+
+    exporter = commands.add_parser("export-orders", help="stream orders and their lines to a CSV or Parquet file")
+    exporter.add_argument("path")
+    exporter.add_argument("--format", choices=["csv", "parquet"], help="default: from the file extension")
+    exporter.add_argument("--since-order-id", type=int, help="only orders with a larger order_id")
+    exporter.add_argument("--since", type=datetime.datetime.fromisoformat, help="only orders placed after this time")
+    exporter.add_argument("--state", help="JSON file holding the watermark of the previous export")
+    exporter.add_argument("--fetch-size", type=int, default=order_export.FETCH_SIZE)
+    exporter.set_defaults(func=cmd_export_orders)
+
+    render = commands.add_parser("render-icons", help="pre-render the dashboard icons into the icon cache (needs Pillow)")
+    render.add_argument("--dir", default=".", help="directory holding the icon PNGs")
+    render.set_defaults(func=cmd_render_icons)
+
+    provision = commands.add_parser("provision-users", help="create or reset logins from a username,password CSV")
+    provision.add_argument("path")
+    provision.add_argument("--workers", type=int, default=credentials.PROVISION_WORKERS, help="hashing threads")
+    provision.set_defaults(func=cmd_provision_users)
+
+    flush = commands.add_parser("flush-journal", help="replay sales waiting in the offline order journal")
+    flush.add_argument("--journal", default=order_journal.JOURNAL_PATH, help="default: INVENTORY_ORDER_JOURNAL")
+    flush.set_defaults(func=cmd_flush_journal)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
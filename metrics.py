@@ -0,0 +1,306 @@
+"""Latency histograms and slow-statement logging for the database layer.
+
+Three kinds of series are kept, each a histogram with a row counter:
+
+* calls       - every public db.py / async_db.py function (@instrumented)
+* statements  - every SQL statement sent through db.run_statement
+* acquire     - time spent borrowing a pooled connection
+
+Statements slower than ``slow_query_ms`` are logged with the shape of
+their bind parameters (types and lengths, never the values) to the
+"inventory.slow_queries" logger. Metrics can be read as JSON or in the
+Prometheus text exposition format, written to a file (dump(), or
+periodically when INVENTORY_METRICS_FILE is set), or served by the
+order service at /metrics.
+
+    INVENTORY_SLOW_QUERY_MS=50 INVENTORY_SLOW_QUERY_LOG=slow.log \\
+    INVENTORY_METRICS_FILE=metrics.prom python main2.py
+"""
+import atexit
+import bisect
+import functools
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels).
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_QUERY_MS = 200
+METRICS_DUMP_INTERVAL = 60   # seconds
+
+SLOW_QUERY_LOGGER = "inventory.slow_queries"
+_CO_COROUTINE = 0x0080   # inspect.CO_COROUTINE, without importing inspect at startup
+
+_FAMILIES = {
+    # kind: (metric name, label name, help text)
+    'calls': ("inventory_db_call", "function", "public database function"),
+    'statements': ("inventory_db_statement", "statement", "SQL statement"),
+    'acquire': ("inventory_db_pool_acquire", "pool", "connection pool borrow"),
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total", "max", "rows", "errors")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)   # last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.errors = 0
+
+    def observe(self, seconds, rows=0, error=False):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.rows += rows
+        if error:
+            self.errors += 1
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given quantile (seconds)."""
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (self.max,), self.buckets):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': self.total * 1000.0,
+            'avg_ms': self.total / self.count * 1000.0 if self.count else 0.0,
+            'p50_ms': self.quantile(0.5) * 1000.0,
+            'p99_ms': self.quantile(0.99) * 1000.0,
+            'max_ms': self.max * 1000.0,
+        }
+
+
+class Metrics:
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._series = {kind: {} for kind in _FAMILIES}
+        self._slow = 0
+
+    def observe(self, kind, label, seconds, rows=0, error=False):
+        with self._lock:
+            series = self._series[kind].get(label)
+            if series is None:
+                series = self._series[kind][label] = Histogram()
+            series.observe(seconds, rows, error)
+
+    def observe_statement(self, name, sql, seconds, rows, params, many=False, error=False):
+        self.observe('statements', name, seconds, rows, error)
+        if self.slow_query_ms is not None and seconds * 1000.0 >= self.slow_query_ms:
+            with self._lock:
+                self._slow += 1
+            _slow_query_log().warning(
+                "%.1f ms %s rows=%d params=%s sql=%s",
+                seconds * 1000.0, name, rows, param_shape(params, many), " ".join(sql.split())[:300]
+            )
+
+    def reset(self):
+        with self._lock:
+            self._series = {kind: {} for kind in _FAMILIES}
+            self._slow = 0
+
+    def to_dict(self):
+        with self._lock:
+            snapshot = {
+                kind: {label: series.to_dict() for label, series in sorted(self._series[kind].items())}
+                for kind in _FAMILIES
+            }
+            snapshot['slow_statements'] = self._slow
+            snapshot['slow_query_ms'] = self.slow_query_ms
+        return snapshot
+
+    def to_json(self):
+        import json   # deferred: keeps json (and re) off the app's startup path
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for kind, (metric, label_name, description) in _FAMILIES.items():
+                series = sorted(self._series[kind].items())
+                lines.append(f"# HELP {metric}_seconds Latency of each {description}.")
+                lines.append(f"# TYPE {metric}_seconds histogram")
+                for label, histogram in series:
+                    label = _escape(label)
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float("inf"),), histogram.buckets):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f'{metric}_seconds_bucket{{{label_name}="{label}",le="{le}"}} {cumulative}')
+                    lines.append(f'{metric}_seconds_sum{{{label_name}="{label}"}} {histogram.total!r}')
+                    lines.append(f'{metric}_seconds_count{{{label_name}="{label}"}} {histogram.count}')
+                if kind != 'acquire':
+                    lines.append(f"# HELP {metric}_rows_total Rows returned or changed by each {description}.")
+                    lines.append(f"# TYPE {metric}_rows_total counter")
+                    for label, histogram in series:
+                        lines.append(f'{metric}_rows_total{{{label_name}="{_escape(label)}"}} {histogram.rows}')
+                lines.append(f"# HELP {metric}_errors_total Failures of each {description}.")
+                lines.append(f"# TYPE {metric}_errors_total counter")
+                for label, histogram in series:
+                    lines.append(f'{metric}_errors_total{{{label_name}="{_escape(label)}"}} {histogram.errors}')
+            lines.append("# HELP inventory_db_slow_statements_total Statements slower than the slow-query threshold.")
+            lines.append("# TYPE inventory_db_slow_statements_total counter")
+            lines.append(f"inventory_db_slow_statements_total {self._slow}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, fmt=None):
+        """Writes the metrics to ``path`` atomically; fmt "json" or "prometheus" (default: by extension)."""
+        fmt = fmt or ("json" if path.endswith(".json") else "prometheus")
+        text = self.to_json() if fmt == "json" else self.to_prometheus()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def _slow_query_log():
+    import logging   # deferred: only needed once a statement is slow (or a log file is set)
+    return logging.getLogger(SLOW_QUERY_LOGGER)
+
+
+def _escape(label):
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _value_shape(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def param_shape(params, many=False):
+    """Types and lengths of bind parameters, e.g. "(int, str[12])"; never the values."""
+    if many:
+        params = list(params)
+        if not params:
+            return "0 x ()"
+        return f"{len(params)} x {param_shape(params[0])}"
+    return "(" + ", ".join(_value_shape(value) for value in params) + ")"
+
+
+def _count_rows(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])   # (page rows, next cursor)
+    return 0
+
+
+registry = Metrics()
+
+
+def instrumented(fn):
+    """Records latency, rows and raised errors of a (sync or async) function call."""
+    label = f"{fn.__module__}.{fn.__qualname__}"
+
+    if getattr(fn, "__code__", None) is not None and fn.__code__.co_flags & _CO_COROUTINE:
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException:
+                registry.observe('calls', label, time.perf_counter() - started, error=True)
+                raise
+            registry.observe('calls', label, time.perf_counter() - started, _count_rows(result))
+            return result
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            registry.observe('calls', label, time.perf_counter() - started, error=True)
+            raise
+        registry.observe('calls', label, time.perf_counter() - started, _count_rows(result))
+        return result
+    return wrapper
+
+
+def observe_statement(name, sql, seconds, rows, params, many=False, error=False):
+    registry.observe_statement(name, sql, seconds, rows, params, many, error)
+
+
+def observe_acquire(pool, seconds):
+    registry.observe('acquire', pool, seconds)
+
+
+def get_metrics():
+    return registry.to_dict()
+
+
+def to_prometheus():
+    return registry.to_prometheus()
+
+
+def dump(path, fmt=None):
+    registry.dump(path, fmt)
+
+
+def reset():
+    registry.reset()
+
+
+def configure(slow_query_ms=None, slow_query_log_path=None):
+    """Sets the slow-statement threshold and, optionally, a file for the slow log."""
+    if slow_query_ms is not None:
+        registry.slow_query_ms = slow_query_ms
+    if slow_query_log_path:
+        import logging
+        handler = logging.FileHandler(slow_query_log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        log = _slow_query_log()
+        log.addHandler(handler)
+        log.setLevel(logging.WARNING)
+
+
+_dump_thread = None
+
+
+def start_periodic_dump(path, interval=METRICS_DUMP_INTERVAL, fmt=None):
+    """Rewrites ``path`` every ``interval`` seconds from a daemon thread, and once more at exit."""
+    global _dump_thread
+    if _dump_thread is not None:
+        return
+
+    def write():
+        try:
+            dump(path, fmt)
+        except OSError as e:
+            print(f"Could not write metrics to {path}: {e}")
+
+    def run():
+        while True:
+            time.sleep(interval)
+            write()
+
+    atexit.register(write)
+    _dump_thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    _dump_thread.start()
+
+
+def configure_from_env(environ=os.environ):
+    """Applies INVENTORY_SLOW_QUERY_MS / _SLOW_QUERY_LOG / _METRICS_FILE / _METRICS_INTERVAL."""
+    slow_ms = environ.get("INVENTORY_SLOW_QUERY_MS")
+    configure(float(slow_ms) if slow_ms else None, environ.get("INVENTORY_SLOW_QUERY_LOG"))
+    path = environ.get("INVENTORY_METRICS_FILE")
+    if path:
+        start_periodic_dump(path, float(environ.get("INVENTORY_METRICS_INTERVAL", METRICS_DUMP_INTERVAL)))
@@ -0,0 +1,224 @@
+"""Streaming export of orders and their line items for the warehouse.
+
+One joined query walks order_header and order_items in order_id order
+through an unbuffered cursor, and rows are written out as they arrive, so
+memory stays bounded by ``fetch_size`` whatever the size of the history.
+Exports can be incremental: pass the watermark returned by the previous
+run and only newer orders are read.
+
+AUTO_INCREMENT ids are handed out when an order is inserted, not when it
+commits, so order 105 can become visible after an export that already
+saw 106. Incremental exports from a state file therefore re-read the last
+WATERMARK_OVERLAP ids below the watermark and skip the ones the state
+file lists as already exported.
+
+    python manage.py export-orders orders.csv --state export_state.json
+"""
+import csv
+import datetime
+import json
+import os
+
+import db
+from backends import DB_ERRORS
+
+FETCH_SIZE = 1000
+WATERMARK_OVERLAP = int(os.environ.get("INVENTORY_EXPORT_OVERLAP", 1000))   # ids re-read below the watermark
+COLUMNS = (
+    "order_id", "customer_name", "order_date", "total_amount", "payment_status",
+    "order_item_id", "product_id", "product_name", "quantity", "price_at_sale",
+)
+
+
+def iter_order_lines(since_order_id=None, since_date=None, fetch_size=FETCH_SIZE):
+    """Yields one tuple per order line (COLUMNS), ordered by order_id.
+
+    Orders without lines are yielded once with the item columns set to None.
+    ``since_order_id`` / ``since_date`` skip orders at or before that point.
+    """
+    conn = db.connect_db()
+    if not conn:
+        raise ConnectionError("Database connection failed.")
+
+    query = """
+        SELECT oh.order_id, oh.customer_name, oh.order_date, oh.total_amount, oh.payment_status,
+               oi.order_item_id, oi.product_id, p.name, oi.quantity, oi.price_at_sale
+        FROM order_header oh
+        LEFT JOIN order_items oi ON oi.order_id = oh.order_id
+        LEFT JOIN products p ON p.product_id = oi.product_id
+    """
+    conditions = []
+    params = []
+    if since_order_id is not None:
+        conditions.append("oh.order_id > ?")
+        params.append(since_order_id)
+    if since_date is not None:
+        conditions.append("oh.order_date > ?")
+        params.append(since_date)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY oh.order_id, oi.order_item_id"
+
+    try:
+        cursor = db.get_backend().streaming_cursor(conn)
+        cursor.execute(query, tuple(params))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _clean(row)
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _clean(row):
+    row = list(row)
+    row[3] = float(row[3])
+    if row[9] is not None:
+        row[9] = float(row[9])
+    return tuple(row)
+
+
+class Watermark:
+    """Tracks the newest order seen, to resume the next export after it.
+
+    ``recent`` holds the ids exported within ``overlap`` of the newest one.
+    ``tracked_from`` is the id tracking started after, for state files
+    written before ``recent`` existed; the overlap never reaches below it.
+    """
+
+    def __init__(self, order_id=None, order_date=None, recent=(), tracked_from=None, overlap=WATERMARK_OVERLAP):
+        self.order_id = order_id
+        self.order_date = order_date
+        self.recent = set(recent)
+        self.tracked_from = tracked_from
+        self.overlap = overlap
+
+    def observe(self, row):
+        if self.order_id is None or row[0] > self.order_id:
+            self.order_id = row[0]
+        if self.order_date is None or row[2] > self.order_date:
+            self.order_date = row[2]
+        self.recent.add(row[0])
+
+    def resume_after(self):
+        """The order_id to read after: the watermark less the overlap."""
+        if self.order_id is None:
+            return None
+        return max(self.order_id - self.overlap, self.tracked_from or 0)
+
+    def to_dict(self):
+        order_date = self.order_date
+        if isinstance(order_date, datetime.datetime):
+            order_date = order_date.isoformat(" ", timespec="seconds")
+        floor = (self.order_id or 0) - self.overlap
+        tracked_from = self.tracked_from if self.tracked_from is not None and self.tracked_from > floor else None
+        return {'order_id': self.order_id, 'order_date': order_date,
+                'recent': sorted(order_id for order_id in self.recent if order_id > floor),
+                'tracked_from': tracked_from}
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        order_date = state.get('order_date')
+        if order_date:
+            order_date = datetime.datetime.fromisoformat(order_date)
+        if 'recent' not in state:
+            return cls(state.get('order_id'), order_date, tracked_from=state.get('order_id'))
+        return cls(state.get('order_id'), order_date, state['recent'], state.get('tracked_from'))
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+
+def write_csv(rows, path, watermark):
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            watermark.observe(row)
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_parquet(rows, path, watermark, row_group_size=FETCH_SIZE * 10):
+    """Writes row groups of ``row_group_size`` lines; needs the 'pyarrow' package."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export needs the 'pyarrow' package.")
+
+    arrow_schema = pa.schema([
+        ("order_id", pa.int64()), ("customer_name", pa.string()),
+        ("order_date", pa.timestamp("s")), ("total_amount", pa.float64()),
+        ("payment_status", pa.string()), ("order_item_id", pa.int64()),
+        ("product_id", pa.int64()), ("product_name", pa.string()),
+        ("quantity", pa.int64()), ("price_at_sale", pa.float64()),
+    ])
+    count = 0
+    with pq.ParquetWriter(path, arrow_schema) as writer:
+        batch = []
+        for row in rows:
+            watermark.observe(row)
+            batch.append(row)
+            if len(batch) == row_group_size:
+                writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], arrow_schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], arrow_schema))
+            count += len(batch)
+    return count
+
+
+def export_orders(path, file_format=None, since_order_id=None, since_date=None,
+                  fetch_size=FETCH_SIZE, state_path=None):
+    """Streams order lines to a CSV or Parquet file; returns (success, message, watermark).
+
+    With ``state_path`` the watermark is read from that JSON file before the
+    export (unless one is passed explicitly) and written back afterwards.
+    Only new orders are exported incrementally; status changes to orders
+    already exported are not picked up. An order that commits more than
+    WATERMARK_OVERLAP ids behind the watermark is missed as well, and an
+    explicit ``since_order_id`` gets no overlap at all.
+    """
+    watermark = Watermark()
+    exported = frozenset()
+    if state_path and since_order_id is None and since_date is None:
+        previous = Watermark.load(state_path)
+        since_order_id = previous.resume_after()
+        exported = frozenset(previous.recent)
+        watermark = Watermark(previous.order_id, previous.order_date, previous.recent, previous.tracked_from)
+
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format == "csv":
+        writer = write_csv
+    elif file_format in ("parquet", "pq"):
+        writer = write_parquet
+    else:
+        return False, f"Unsupported export format '{file_format}' (use csv or parquet).", watermark
+
+    rows = iter_order_lines(since_order_id, since_date, fetch_size)
+    try:
+        count = writer((row for row in rows if row[0] not in exported), path, watermark)
+    except (ValueError, OSError) as e:
+        return False, f"Export failed: {e}", watermark
+    except DB_ERRORS as e:
+        return False, f"Database Error during export: {e}", watermark
+    finally:
+        rows.close()   # hands the connection back if the writer stopped early
+
+    if state_path:
+        watermark.save(state_path)
+    return True, f"Exported {count} order lines to {path} (up to order {watermark.order_id}).", watermark
@@ -0,0 +1,243 @@
+"""Write-behind order journal for tills on a slow or unreliable database link.
+
+A sale is committed to a local SQLite file (WAL, synchronous=FULL, so it
+survives a crash or power cut) and the till moves on at once. A background
+flusher replays pending orders to the main database in batches through
+db.place_orders, each with the idempotency key it was journaled with, so
+a batch that committed but whose reply was lost is not placed twice when
+it is resent. What happens next follows the order's outcome code:
+
+- unavailable (no connection): stays pending, the flusher backs off;
+- retry (lock timeout, stock moved mid-checkout, ...): stays pending for
+  up to MAX_ATTEMPTS tries that reached the database, then fails;
+- refused (stock ran out, unknown product) and failed (the database
+  rejected the values, or the retries ran out): final, handed to the UI
+  by take_outcomes().
+
+    INVENTORY_ORDER_JOURNAL=/var/lib/inventory/orders.db python main2.py
+
+Replayed orders keep the time they were taken at as their order_date.
+"""
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+import db
+
+JOURNAL_PATH = os.environ.get("INVENTORY_ORDER_JOURNAL")   # unset: orders go straight to the database
+FLUSH_BATCH_SIZE = 50
+FLUSH_INTERVAL = 2.0        # seconds between flushes while nothing new arrives
+MAX_BACKOFF = 60.0          # seconds; longest wait between retries while the database is down
+KEEP_DAYS = 30              # settled and reported orders are pruned after this long
+MAX_ATTEMPTS = int(os.environ.get("INVENTORY_JOURNAL_MAX_ATTEMPTS", 20))   # tries that reached the database
+
+JOURNAL_DDL = [
+    """CREATE TABLE IF NOT EXISTS journal_orders (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        customer_name TEXT NOT NULL,
+        items TEXT NOT NULL,
+        accepted_at TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        order_id INTEGER,
+        message TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        reported INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_journal_orders_state ON journal_orders (state, reported, seq)",
+]
+
+
+class OrderJournal:
+    """Orders accepted locally and replayed to the database in the background.
+
+    One SQLite connection is shared by the Tk thread (submit, take_outcomes)
+    and the flusher thread, guarded by a lock; each call is one short local
+    transaction.
+    """
+
+    def __init__(self, path=None, batch_size=FLUSH_BATCH_SIZE, interval=FLUSH_INTERVAL,
+                 max_attempts=MAX_ATTEMPTS):
+        self.path = path or JOURNAL_PATH or "order_journal.db"
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")   # a sale is on disk before submit() returns
+        with self._conn:
+            for statement in JOURNAL_DDL:
+                self._conn.execute(statement)
+
+    def submit(self, customer_name, order_items_list):
+        """Journals one order and wakes the flusher; returns its idempotency key."""
+        key = uuid.uuid4().hex
+        items = json.dumps([[product_id, quantity] for product_id, quantity in order_items_list])
+        accepted_at = datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO journal_orders (idempotency_key, customer_name, items, accepted_at) VALUES (?, ?, ?, ?)",
+                (key, customer_name, items, accepted_at)
+            )
+        self._wake.set()
+        return key
+
+    def flush(self):
+        """Replays up to batch_size pending orders; returns (settled, still_pending).
+
+        Settled orders were placed, refused or failed; the rest could not
+        reach the database or hit a transient error, and stay pending for
+        the next flush. ``attempts`` counts only the tries that reached it,
+        so an outage never fails a sale.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, idempotency_key, customer_name, items, accepted_at, attempts FROM journal_orders "
+                "WHERE state = 'pending' ORDER BY seq LIMIT ?", (self.batch_size,)
+            ).fetchall()
+        if not rows:
+            return 0, 0
+
+        results = db.place_orders(
+            [(customer_name, [tuple(line) for line in json.loads(items)])
+             for seq, key, customer_name, items, accepted_at, attempts in rows],
+            idempotency_keys=[key for seq, key, customer_name, items, accepted_at, attempts in rows],
+            order_dates=[datetime.datetime.fromisoformat(accepted_at)
+                         for seq, key, customer_name, items, accepted_at, attempts in rows],
+        )
+
+        settled = 0
+        with self._lock, self._conn:
+            for row, (order_id, message, outcome) in zip(rows, results):
+                seq, attempts = row[0], row[5]
+                if outcome != db.ORDER_UNAVAILABLE:
+                    attempts += 1
+                if outcome in (db.ORDER_PLACED, db.ORDER_REFUSED, db.ORDER_FAILED):
+                    state = outcome
+                elif outcome == db.ORDER_RETRY and attempts >= self.max_attempts:
+                    state = 'failed'
+                    message = f"Gave up after {attempts} attempts: {message}"
+                else:
+                    self.last_error = message
+                    state = 'pending'
+                settled += state != 'pending'
+                self._conn.execute(
+                    "UPDATE journal_orders SET state=?, order_id=?, message=?, attempts=? WHERE seq=?",
+                    (state, order_id, message, attempts, seq)
+                )
+        if settled == len(rows):
+            self.last_error = None
+        return settled, len(rows) - settled
+
+    def _run(self):
+        backoff = 0.0
+        while not self._stopping.is_set():
+            if backoff:
+                # The database is unreachable: new sales do not cut the wait short
+                self._stopping.wait(backoff)
+            else:
+                self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                settled, still_pending = self.flush()
+            except Exception as e:   # e.g. a journal file error; keep the thread alive
+                settled, still_pending = 0, 1
+                self.last_error = str(e)
+            if still_pending:
+                backoff = min(MAX_BACKOFF, max(self.interval, backoff * 2))
+            else:
+                backoff = 0.0
+                if settled == self.batch_size:
+                    self._wake.set()   # a full batch: there may be more waiting
+
+    def start(self):
+        """Prunes old settled orders and starts the flusher thread."""
+        if self._thread is None:
+            self.prune()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="order-journal", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stops the flusher; orders still pending are replayed on the next start()."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._conn.close()
+
+    def take_outcomes(self):
+        """Placed, refused and failed orders not yet handed out, oldest first; each is returned once.
+
+        Returns [{'key', 'customer_name', 'state', 'order_id', 'message'}].
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT seq, idempotency_key, customer_name, state, order_id, message FROM journal_orders "
+                "WHERE state != 'pending' AND reported = 0 ORDER BY seq"
+            ).fetchall()
+            self._conn.executemany("UPDATE journal_orders SET reported = 1 WHERE seq = ?",
+                                   [(row[0],) for row in rows])
+        return [
+            {'key': key, 'customer_name': customer_name, 'state': state, 'order_id': order_id, 'message': message}
+            for seq, key, customer_name, state, order_id, message in rows
+        ]
+
+    def pending(self):
+        """[(idempotency_key, customer_name, accepted_at, attempts)] not yet in the database."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT idempotency_key, customer_name, accepted_at, attempts FROM journal_orders "
+                "WHERE state = 'pending' ORDER BY seq"
+            ).fetchall()
+
+    def prune(self, keep_days=KEEP_DAYS):
+        """Deletes settled, reported orders accepted more than keep_days ago; returns how many."""
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=keep_days)).isoformat(sep=" ", timespec="seconds")
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM journal_orders WHERE state != 'pending' AND reported = 1 AND accepted_at < ?",
+                (cutoff,)
+            ).rowcount
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM journal_orders GROUP BY state").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(accepted_at) FROM journal_orders WHERE state = 'pending'").fetchone()[0]
+        return {
+            'pending': counts.get('pending', 0),
+            'placed': counts.get('placed', 0),
+            'refused': counts.get('refused', 0),
+            'failed': counts.get('failed', 0),
+            'oldest_pending': oldest,
+            'last_error': self.last_error,
+        }
+
+
+_journal = None
+
+
+def get_journal():
+    """The running journal if INVENTORY_ORDER_JOURNAL is set, else None (write straight through)."""
+    global _journal
+    if _journal is None and JOURNAL_PATH:
+        _journal = OrderJournal(JOURNAL_PATH).start()
+    return _journal
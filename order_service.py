@@ -0,0 +1,373 @@
+"""Localhost JSON service over db.py, for webshop and scanner order intake.
+
+    python order_service.py --port 8765
+
+    GET  /products?prefix=ap&in_stock=1      search (or ?after=<id> to page)
+    GET  /orders?after=<cursor>              order history page, newest first
+    GET  /orders/<id>/items                  line items of one order
+    POST /orders                             {"customer_name": ..., "items": [{"product_id": 1, "quantity": 2}]}
+                                             optional Idempotency-Key header (or "idempotency_key")
+    GET  /reports/income?from=2025-01-01&to=2025-03-31&bucket=week
+                                             income summary and per-period details (hour/day/week/month)
+    GET  /stats                              batching, queue, pool and statement counters
+    GET  /metrics                            latency histograms, Prometheus text (?format=json for JSON)
+
+Concurrent POST /orders requests are micro-batched: an OrderBatcher worker
+drains up to BATCH_MAX_SIZE queued orders and places them with db.place_orders, one
+transaction per batch with a savepoint per order. The queue is bounded; when
+it is full the service answers 503 with Retry-After instead of piling up
+work it cannot finish.
+
+POST /orders answers 201 when the order is placed (or was already placed
+under the same idempotency key), 409 when it is refused (stock, unknown
+product), 422 when the database rejected its values, 503 when the
+database failed and 504 when the batch did not finish within
+ORDER_TIMEOUT. After a 503 or 504 the order may or may not
+have been placed; resend it with the same Idempotency-Key to find out
+without placing it twice.
+"""
+import argparse
+import datetime
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import db
+import metrics
+
+HOST = "127.0.0.1"
+PORT = 8765
+QUEUE_SIZE = 1000          # orders waiting for a batch before 503s start
+BATCH_MAX_SIZE = 50
+# Seconds a batch may wait for more orders. 0 takes only what is already
+# queued: no added latency when idle, and under load orders pile up while
+# the previous batch commits, so batches grow on their own.
+BATCH_MAX_WAIT = 0.0
+BATCH_WORKERS = 2
+ORDER_TIMEOUT = 30         # seconds a request waits for its order's batch
+IDEMPOTENCY_KEY_MAX = 64   # order_idempotency.idempotency_key is VARCHAR(64)
+# HTTP status per db.place_orders outcome code
+OUTCOME_STATUS = {
+    db.ORDER_PLACED: 201,
+    db.ORDER_REFUSED: 409,
+    db.ORDER_FAILED: 422,
+    db.ORDER_RETRY: 503,
+    db.ORDER_UNAVAILABLE: 503,
+}
+
+
+log = logging.getLogger("inventory.order_service")
+
+
+class QueueFull(Exception):
+    """Raised by OrderBatcher.submit when the intake queue is at capacity."""
+
+
+class OrderTimeout(Exception):
+    """Raised by OrderBatcher.submit when the order's batch has not finished in time."""
+
+
+class _PendingOrder:
+    __slots__ = ("customer_name", "items", "idempotency_key", "done", "result")
+
+    def __init__(self, customer_name, items, idempotency_key=None):
+        self.customer_name = customer_name
+        self.items = items
+        self.idempotency_key = idempotency_key
+        self.done = threading.Event()
+        self.result = None
+
+
+class OrderBatcher:
+    """Groups concurrently submitted orders into db.place_orders calls."""
+
+    def __init__(self, max_size=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT,
+                 queue_size=QUEUE_SIZE, workers=BATCH_WORKERS, place_batch=None):
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.place_batch = place_batch or db.place_orders
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._orders = 0
+        self._rejected = 0
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._work, name=f"order-batcher-{n}", daemon=True)
+            for n in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, customer_name, items, idempotency_key=None, timeout=ORDER_TIMEOUT):
+        """Queues one order and waits for its batch; returns (order_id, message, outcome).
+
+        Raises QueueFull if the queue is at capacity and OrderTimeout if the
+        batch is still running after ``timeout`` seconds (the order may yet
+        be placed).
+        """
+        pending = _PendingOrder(customer_name, items, idempotency_key)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise QueueFull("Order queue is full.")
+        if not pending.done.wait(timeout):
+            raise OrderTimeout("Timed out waiting for the database.")
+        return pending.result
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while self._running:
+            batch = self._next_batch()
+            batch = [pending for pending in batch if pending is not None]
+            if not batch:
+                continue
+            try:
+                results = self.place_batch([(p.customer_name, p.items) for p in batch],
+                                           idempotency_keys=[p.idempotency_key for p in batch])
+            except Exception as e:
+                results = [(None, f"Order batch failed: {e}", db.ORDER_RETRY)] * len(batch)
+            for pending, result in zip(batch, results):
+                pending.result = result
+                pending.done.set()
+            with self._lock:
+                self._batches += 1
+                self._orders += len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'batches': self._batches,
+                'orders': self._orders,
+                'avg_batch_size': self._orders / self._batches if self._batches else 0.0,
+                'rejected_full': self._rejected,
+            }
+
+    def close(self):
+        self._running = False
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)   # wakes idle workers
+            except queue.Full:
+                pass
+
+
+def _whole_number(value, field, minimum=1):
+    """``value`` if it is a JSON integer of at least ``minimum``; 1.7, "2" and true are refused."""
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ValueError(f"{field} must be a whole number of at least {minimum}, not {value!r}")
+    return value
+
+
+def _limit(params, default):
+    if "limit" not in params:
+        return default
+    return _whole_number(int(params["limit"]), "limit")
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return float(value)   # Decimal
+
+
+def _encode_orders_cursor(after):
+    if after is None:
+        return None
+    order_date, order_id = after
+    if isinstance(order_date, datetime.datetime):
+        order_date = order_date.isoformat(" ")
+    return f"{order_date}|{order_id}"
+
+
+def _decode_orders_cursor(token):
+    order_date, order_id = token.rsplit("|", 1)
+    return datetime.datetime.fromisoformat(order_date), int(order_id)
+
+
+class OrderServiceHandler(BaseHTTPRequestHandler):
+    server_version = "InventoryOrderService/1.0"
+    protocol_version = "HTTP/1.1"   # keep-alive for load generators and scanners
+    # Headers and body go out in separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK (~40 ms per keep-alive request).
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload, headers=(), content_type="application/json"):
+        if isinstance(payload, str):
+            body = payload.encode()
+        else:
+            body = json.dumps(payload, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/products":
+                self._get_products(params)
+            elif url.path == "/orders":
+                after = _decode_orders_cursor(params["after"]) if params.get("after") else None
+                rows, next_after = db.get_orders_page(after, _limit(params, db.PAGE_SIZE))
+                self._send(200, {'orders': rows, 'next': _encode_orders_cursor(next_after)})
+            elif re.fullmatch(r"/orders/\d+/items", url.path):
+                order_id = int(url.path.split("/")[2])
+                self._send(200, {'order_id': order_id, 'items': db.get_order_items(order_id)})
+            elif url.path == "/reports/income":
+                self._send(200, db.get_income_report(
+                    datetime.date.fromisoformat(params["from"]) if params.get("from") else None,
+                    datetime.date.fromisoformat(params["to"]) if params.get("to") else None,
+                    params.get("bucket", "day")))
+            elif url.path == "/stats":
+                self._send(200, {
+                    'batcher': self.server.batcher.stats(),
+                    'pool': db.get_pool_stats(),
+                    'catalog': db.get_catalog_cache_stats(),
+                    'statements': db.get_statement_stats(),
+                })
+            elif url.path == "/metrics":
+                if params.get("format") == "json":
+                    self._send(200, metrics.get_metrics())
+                else:
+                    self._send(200, metrics.to_prometheus(), content_type="text/plain; version=0.0.4")
+            else:
+                self._send(404, {'error': "Not found."})
+        except (KeyError, ValueError) as e:
+            self._send(400, {'error': f"Bad request: {e}"})
+        except Exception as e:   # a database error: answer rather than drop the connection
+            log.exception("GET %s failed", self.path)
+            self._send(500, {'error': f"Internal error: {e}"})
+
+    def _get_products(self, params):
+        in_stock_only = params.get("in_stock") in ("1", "true")
+        limit = _limit(params, db.SEARCH_LIMIT)
+        if params.get("prefix"):
+            self._send(200, {'products': db.search_products(params["prefix"], limit, in_stock_only)})
+        else:
+            after = int(params["after"]) if params.get("after") else None
+            rows, next_after = db.get_products_page(after, limit, in_stock_only)
+            self._send(200, {'products': rows, 'next': next_after})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/orders":
+            self._send(404, {'error': "Not found."})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            customer_name = str(payload["customer_name"]).strip()
+            items = [(_whole_number(item["product_id"], "product_id"), _whole_number(item["quantity"], "quantity"))
+                     for item in payload["items"]]
+            if not customer_name or not items:
+                raise ValueError("customer_name and at least one item are required")
+            idempotency_key = self.headers.get("Idempotency-Key") or payload.get("idempotency_key")
+            if idempotency_key is not None:
+                idempotency_key = str(idempotency_key).strip()
+                if not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX:
+                    raise ValueError(f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX} characters")
+        except (KeyError, TypeError, ValueError) as e:
+            self._send(400, {'error': f"Bad request: {e}"})
+            return
+
+        try:
+            order_id, message, outcome = self.server.batcher.submit(customer_name, items, idempotency_key)
+        except QueueFull as e:
+            self._send(503, {'error': str(e)}, headers=[("Retry-After", "1")])
+            return
+        except OrderTimeout as e:
+            self._send(504, {'error': str(e)})
+            return
+        except Exception as e:
+            log.exception("POST %s failed", self.path)
+            self._send(500, {'error': f"Internal error: {e}"})
+            return
+        status = OUTCOME_STATUS[outcome]
+        if status == 201:
+            self._send(201, {'order_id': order_id, 'message': message})
+        elif status == 503:
+            self._send(503, {'error': message}, headers=[("Retry-After", "1")])
+        else:
+            self._send(status, {'error': message})
+
+
+class OrderService(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128   # listen backlog; the default 5 drops bursts of connects
+
+    def __init__(self, host=HOST, port=PORT, batcher=None, verbose=False):
+        super().__init__((host, port), OrderServiceHandler)
+        self.batcher = batcher or OrderBatcher()
+        self.verbose = verbose
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local JSON order-intake service.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--batch-size", type=int, default=BATCH_MAX_SIZE, help="1 disables batching")
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_MAX_WAIT * 1000)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--slow-query-ms", type=float, help="log statements slower than this")
+    parser.add_argument("--slow-query-log", help="file for the slow-query log (default: stderr)")
+    parser.add_argument("--metrics-file", help="rewrite this file with the metrics periodically (.json or Prometheus text)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s %(name)s %(message)s")
+    metrics.configure_from_env()
+    metrics.configure(args.slow_query_ms, args.slow_query_log)
+    if args.metrics_file:
+        metrics.start_periodic_dump(args.metrics_file)
+
+    batcher = OrderBatcher(args.batch_size, args.batch_wait_ms / 1000, args.queue_size, args.workers)
+    service = OrderService(args.host, args.port, batcher, args.verbose)
+    print(f"Order service listening on http://{args.host}:{args.port}")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Per-product, per-day and per-customer sales, aggregated column by column.
+
+income_daily only knows each day's order count and header total. The
+breakdowns here are materialized from the order lines themselves
+(quantity * price_at_sale): one streamed join over the lines of the Paid
+orders in the range is loaded into parallel columns, with every product,
+day, customer and order replaced by a small integer code, and each
+aggregate is then a grouped sum over those codes. With NumPy installed the
+sums are np.bincount calls; without it the same sums run in plain Python,
+slower on a long history but with identical results.
+
+Reports are cached per (orders version, range), so reopening the Income
+screen or switching its tabs costs one version query until an order
+changes.
+"""
+import collections
+import datetime
+import threading
+
+import db
+from metrics import instrumented
+
+FETCH_SIZE = 5000
+REPORT_CACHE_SIZE = 8
+
+_np = False     # numpy module, None when not installed; looked up on first use
+
+
+def _numpy():
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+
+class SalesColumns:
+    """Paid order lines as parallel columns; products, days, customers and orders are integer codes."""
+
+    def __init__(self):
+        self.product_ids = []   # code -> product_id
+        self.days = []          # code -> 'YYYY-MM-DD'
+        self.customers = []     # code -> customer_name
+        self.order_count = 0
+        self.product = []
+        self.day = []
+        self.customer = []
+        self.order = []
+        self.quantity = []
+        self.revenue = []
+
+    def __len__(self):
+        return len(self.product)
+
+    @classmethod
+    def load(cls, first_day=None, last_day=None, fetch_size=FETCH_SIZE):
+        """Reads the lines of Paid orders placed from first_day to last_day (inclusive, None: open)."""
+        conn = db.connect_db()
+        if not conn:
+            raise ConnectionError("Database connection failed.")
+
+        query = """
+            SELECT oi.product_id, DATE(oh.order_date), oh.customer_name, oh.order_id,
+                   oi.quantity, oi.price_at_sale
+            FROM order_header oh
+            JOIN order_items oi ON oi.order_id = oh.order_id
+            WHERE oh.payment_status = 'Paid'
+        """
+        params = []
+        if first_day is not None:
+            query += " AND oh.order_date >= ?"
+            params.append(datetime.datetime.combine(first_day, datetime.time()))
+        if last_day is not None:
+            query += " AND oh.order_date < ?"
+            params.append(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time()))
+
+        columns = cls()
+        products, days, customers, orders = {}, {}, {}, {}
+        try:
+            cursor = db.get_backend().streaming_cursor(conn)
+            cursor.execute(query, tuple(params))
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for product_id, day, customer_name, order_id, quantity, price in rows:
+                    columns.product.append(products.setdefault(product_id, len(products)))
+                    columns.day.append(days.setdefault(str(day)[:10], len(days)))
+                    columns.customer.append(customers.setdefault(customer_name, len(customers)))
+                    columns.order.append(orders.setdefault(order_id, len(orders)))
+                    columns.quantity.append(quantity)
+                    columns.revenue.append(quantity * float(price))
+            cursor.close()
+        finally:
+            conn.close()
+
+        columns.product_ids = list(products)
+        columns.days = list(days)
+        columns.customers = list(customers)
+        columns.order_count = len(orders)
+        np = _numpy()
+        if np is not None:
+            for name, dtype in (("product", np.int64), ("day", np.int64), ("customer", np.int64),
+                                ("order", np.int64), ("quantity", np.float64), ("revenue", np.float64)):
+                setattr(columns, name, np.asarray(getattr(columns, name), dtype=dtype))
+        return columns
+
+
+def _group_sums(codes, size, *values):
+    """Sums each values column per code; returns one list of ``size`` sums per column."""
+    np = _numpy()
+    if np is not None:
+        return [np.bincount(codes, weights=column, minlength=size).tolist() for column in values]
+    sums = [[0.0] * size for _ in values]
+    for column_sums, column in zip(sums, values):
+        for code, value in zip(codes, column):
+            column_sums[code] += value
+    return sums
+
+
+def _distinct_orders(codes, size, orders, order_count):
+    """How many different orders have at least one line under each code."""
+    np = _numpy()
+    if np is not None:
+        pairs = np.unique(codes * max(order_count, 1) + orders)
+        return np.bincount(pairs // max(order_count, 1), minlength=size).tolist()
+    counts = [0] * size
+    for code, order in set(zip(codes, orders)):
+        counts[code] += 1
+    return counts
+
+
+class SalesReport:
+    """Aggregates of one SalesColumns load; revenue is summed from the order lines."""
+
+    def __init__(self, columns, first_day=None, last_day=None):
+        self.first_day = first_day
+        self.last_day = last_day
+        self.lines = len(columns)
+        self.orders = columns.order_count
+
+        size = len(columns.product_ids)
+        units, revenue = _group_sums(columns.product, size, columns.quantity, columns.revenue)
+        orders = _distinct_orders(columns.product, size, columns.order, columns.order_count)
+        # (product_id, units, revenue, orders), best sellers first
+        self.by_product = sorted(
+            ((product_id, int(units[i]), revenue[i], orders[i]) for i, product_id in enumerate(columns.product_ids)),
+            key=lambda row: (-row[2], row[0]))
+
+        size = len(columns.days)
+        units, revenue = _group_sums(columns.day, size, columns.quantity, columns.revenue)
+        orders = _distinct_orders(columns.day, size, columns.order, columns.order_count)
+        # (day, orders, units, revenue), newest first
+        self.by_day = sorted(
+            ((day, orders[i], int(units[i]), revenue[i]) for i, day in enumerate(columns.days)),
+            reverse=True)
+
+        size = len(columns.customers)
+        revenue, = _group_sums(columns.customer, size, columns.revenue)
+        orders = _distinct_orders(columns.customer, size, columns.order, columns.order_count)
+        # (customer_name, orders, revenue), biggest spenders first
+        self.by_customer = sorted(
+            ((customer, orders[i], revenue[i]) for i, customer in enumerate(columns.customers)),
+            key=lambda row: (-row[2], row[0]))
+
+        self.total_revenue = sum(row[2] for row in self.by_product)
+        self.total_units = sum(row[1] for row in self.by_product)
+
+    def top_sellers(self, limit=10):
+        return self.by_product[:limit]
+
+
+_cache = collections.OrderedDict()   # (orders version, first_day, last_day) -> SalesReport
+_cache_lock = threading.Lock()
+
+
+@instrumented
+def get_sales_report(first_day=None, last_day=None):
+    """SalesReport of Paid orders placed from first_day to last_day (dates, inclusive; None: open).
+
+    Served from the cache while db.get_orders_version() is unchanged.
+    Raises ConnectionError if the database is unreachable.
+    """
+    version = db.get_orders_version()
+    if version is None:
+        raise ConnectionError("Database connection failed.")
+    key = (version, first_day, last_day)
+    with _cache_lock:
+        report = _cache.get(key)
+        if report is not None:
+            _cache.move_to_end(key)
+            return report
+
+    report = SalesReport(SalesColumns.load(first_day, last_day), first_day, last_day)
+    with _cache_lock:
+        _cache[key] = report
+        while len(_cache) > REPORT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return report
+
+
+@instrumented
+def get_product_breakdown(first_day=None, last_day=None, limit=None):
+    """[(product_id, name, units, revenue, orders, share of revenue %)], best sellers first."""
+    report = get_sales_report(first_day, last_day)
+    names = {row[0]: row[1] for row in db.get_products()}
+    rows = report.by_product if limit is None else report.top_sellers(limit)
+    return [
+        (product_id, names.get(product_id, f"#{product_id}"), units, revenue, orders,
+         revenue / report.total_revenue * 100.0 if report.total_revenue else 0.0)
+        for product_id, units, revenue, orders in rows
+    ]
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,211 @@
+"""Database schema and versioned migrations for both storage backends.
+
+Each backend runs migrate() on its first connection; ``python manage.py
+migrate`` does the same explicitly. Applied versions are recorded in the
+schema_version table, and every statement is idempotent, so running a
+migration against a database that already has the object is harmless.
+"""
+
+BASE_TABLES = {
+    "mariadb": [
+        """CREATE TABLE IF NOT EXISTS products (
+            product_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            stock INT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB""",
+        """CREATE TABLE IF NOT EXISTS order_header (
+            order_id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_name VARCHAR(255) NOT NULL,
+            order_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            total_amount DECIMAL(10, 2) NOT NULL DEFAULT 0,
+            payment_status VARCHAR(20) NOT NULL DEFAULT 'Pending'
+        ) ENGINE=InnoDB""",
+        """CREATE TABLE IF NOT EXISTS order_items (
+            order_item_id INT AUTO_INCREMENT PRIMARY KEY,
+            order_id INT NOT NULL,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL,
+            price_at_sale DECIMAL(10, 2) NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES order_header (order_id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products (product_id)
+        ) ENGINE=InnoDB""",
+        """CREATE TABLE IF NOT EXISTS User (
+            username VARCHAR(50) PRIMARY KEY,
+            password VARCHAR(255) NOT NULL
+        ) ENGINE=InnoDB""",
+    ],
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS products (
+            product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(255) NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            stock INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS order_header (
+            order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name VARCHAR(255) NOT NULL,
+            order_date DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+            total_amount DECIMAL(10, 2) NOT NULL DEFAULT 0,
+            payment_status VARCHAR(20) NOT NULL DEFAULT 'Pending'
+        )""",
+        """CREATE TABLE IF NOT EXISTS order_items (
+            order_item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL REFERENCES order_header (order_id) ON DELETE CASCADE,
+            product_id INTEGER NOT NULL REFERENCES products (product_id),
+            quantity INTEGER NOT NULL,
+            price_at_sale DECIMAL(10, 2) NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS User (
+            username VARCHAR(50) PRIMARY KEY,
+            password VARCHAR(255) NOT NULL
+        )""",
+    ],
+}
+
+INCOME_DAILY_DDL = """
+    CREATE TABLE IF NOT EXISTS income_daily (
+        sale_date DATE PRIMARY KEY,
+        order_count INTEGER NOT NULL DEFAULT 0,
+        revenue DECIMAL(12, 2) NOT NULL DEFAULT 0
+    )
+"""
+
+INCOME_DAILY_BACKFILL = [
+    "DELETE FROM income_daily",
+    """INSERT INTO income_daily (sale_date, order_count, revenue)
+       SELECT DATE(order_date), COUNT(order_id), SUM(total_amount)
+       FROM order_header
+       WHERE payment_status = 'Paid'
+       GROUP BY DATE(order_date)""",
+]
+
+# (version, description, statements); statements is a list of SQL strings
+# or a dict of such lists keyed by backend name.
+MIGRATIONS = [
+    (1, "base tables", BASE_TABLES),
+    (2, "daily income rollup", [INCOME_DAILY_DDL] + INCOME_DAILY_BACKFILL),
+    (3, "lookup and report indexes", [
+        # handle_add_or_update looks products up by exact name
+        "CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)",
+        # order history pages and income rebuilds filter/sort on these
+        "CREATE INDEX IF NOT EXISTS idx_order_header_date_status ON order_header (order_date, payment_status)",
+        # item lookups per order, and the ON DELETE CASCADE from order_header
+        "CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)",
+    ]),
+    # Product names are the natural key (handle_add_or_update, bulk import
+    # upserts). Names duplicated before the index existed are renamed first:
+    # the oldest product keeps the name, later ones get " (#<product_id>)"
+    # appended, or " (duplicate #<product_id>)" where a product already has
+    # that name. Should even that be taken, the index fails with a duplicate
+    # key error and the names have to be fixed by hand before migrating.
+    (4, "unique product names", {
+        "mariadb": [
+            # Wrapped in derived tables: MariaDB before 10.3.2 refuses to read the table an UPDATE writes
+            """UPDATE products SET name = CONCAT(LEFT(name, 240), ' (#', product_id, ')')
+               WHERE product_id IN (
+                   SELECT product_id FROM (
+                       SELECT d.product_id FROM products d
+                       WHERE d.product_id NOT IN (SELECT MIN(product_id) FROM products GROUP BY name)
+                         AND NOT EXISTS (SELECT 1 FROM products t
+                                         WHERE t.name = CONCAT(LEFT(d.name, 240), ' (#', d.product_id, ')'))
+                   ) AS renames)""",
+            """UPDATE products SET name = CONCAT(LEFT(name, 225), ' (duplicate #', product_id, ')')
+               WHERE product_id NOT IN (
+                   SELECT keep_id FROM (SELECT MIN(product_id) AS keep_id FROM products GROUP BY name) AS keepers)""",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_products_name ON products (name)",
+            "DROP INDEX IF EXISTS idx_products_name ON products",
+        ],
+        "sqlite": [
+            """UPDATE products SET name = name || ' (#' || product_id || ')'
+               WHERE product_id NOT IN (SELECT MIN(product_id) FROM products GROUP BY name)
+                 AND NOT EXISTS (SELECT 1 FROM products t
+                                 WHERE t.name = products.name || ' (#' || products.product_id || ')')""",
+            """UPDATE products SET name = name || ' (duplicate #' || product_id || ')'
+               WHERE product_id NOT IN (SELECT MIN(product_id) FROM products GROUP BY name)""",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_products_name ON products (name)",
+            "DROP INDEX IF EXISTS idx_products_name",
+        ],
+    }),
+    (5, "order idempotency keys", {
+        # order_journal replays orders with a key, so a retried batch never places one twice
+        "mariadb": [
+            """CREATE TABLE IF NOT EXISTS order_idempotency (
+                idempotency_key VARCHAR(64) PRIMARY KEY,
+                order_id INT NOT NULL,
+                FOREIGN KEY (order_id) REFERENCES order_header (order_id) ON DELETE CASCADE
+            ) ENGINE=InnoDB""",
+        ],
+        "sqlite": [
+            """CREATE TABLE IF NOT EXISTS order_idempotency (
+                idempotency_key VARCHAR(64) PRIMARY KEY,
+                order_id INTEGER NOT NULL REFERENCES order_header (order_id) ON DELETE CASCADE
+            )""",
+        ],
+    }),
+    (6, "orders version counter", {
+        # Bumped in the same transaction as every order write, so
+        # get_orders_version() is one primary-key read instead of a scan
+        "mariadb": [
+            """CREATE TABLE IF NOT EXISTS orders_version (
+                id INT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            ) ENGINE=InnoDB""",
+            "INSERT IGNORE INTO orders_version (id, version) VALUES (1, 0)",
+        ],
+        "sqlite": [
+            """CREATE TABLE IF NOT EXISTS orders_version (
+                id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )""",
+            "INSERT OR IGNORE INTO orders_version (id, version) VALUES (1, 0)",
+        ],
+    }),
+    (7, "closed income periods version", {
+        # Row 2 moves only on writes that can change a past day (status
+        # changes, deletes, back-dated orders); db.IncomeMemo is keyed on it
+        "mariadb": ["INSERT IGNORE INTO orders_version (id, version) VALUES (2, 0)"],
+        "sqlite": ["INSERT OR IGNORE INTO orders_version (id, version) VALUES (2, 0)"],
+    }),
+]
+
+
+def _statements(migration_statements, backend_name):
+    if isinstance(migration_statements, dict):
+        return migration_statements[backend_name]
+    return migration_statements
+
+
+def current_version(conn):
+    cursor = conn.cursor()
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY,"
+        " description VARCHAR(255) NOT NULL)"
+    )
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(conn, backend_name):
+    """Applies every pending migration; returns the list of versions applied."""
+    applied = []
+    version = current_version(conn)
+    conn.commit()
+    for migration_version, description, statements in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        cursor = conn.cursor()
+        try:
+            for statement in _statements(statements, backend_name):
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (migration_version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration_version)
+    return applied
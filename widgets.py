@@ -0,0 +1,281 @@
+from tkinter import ttk
+
+
+class VirtualTable(ttk.Frame):
+    """Treeview + scrollbar that only materializes the rows in view.
+
+    The full data set lives in Python, keyed by the primary key at
+    ``key_index`` of each row tuple. Only the visible rows plus ``buffer``
+    extra rows exist as Treeview items, and every refresh is applied as a
+    diff (insert/update/delete by key) instead of a full rebuild.
+
+    Use ``.tree`` for column setup, bindings, focus() and selection(); item
+    ids are ``str(key)``. With ``expandable=True`` a row can carry child rows
+    (set_children), shown under a disclosure arrow; their item ids are
+    ``"<key>/<n>"`` and ``parent_key()`` maps any item id back to its row.
+    """
+
+    def __init__(self, parent, columns, key_index=0, height=None, buffer=20, on_scroll_end=None,
+                 expandable=False):
+        super().__init__(parent)
+        self.key_index = key_index
+        self.buffer = buffer
+        self.on_scroll_end = on_scroll_end   # called when the view reaches the last row
+
+        options = {"columns": columns, "show": "tree headings" if expandable else "headings"}
+        if height is not None:
+            options["height"] = height
+        self.tree = ttk.Treeview(self, **options)
+        if expandable:
+            self.tree.column("#0", width=24, stretch=False)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.configure(yscrollcommand=self._on_tree_scroll)
+
+        self._keys = []        # every row's iid, in display order
+        self._rows = {}        # iid -> values tuple
+        self._shown = {}       # iid -> values currently in the Treeview
+        self._children = {}    # iid -> tuple of child value tuples
+        self._shown_children = {}
+        self._open = set()     # expanded rows, kept across scrolling
+        self._offset = 0
+        self._rendering = False
+        self._end_pending = False
+
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_by(3))
+        self.tree.bind("<Configure>", lambda e: self._render())
+        self.tree.bind("<<TreeviewOpen>>", lambda e: self._open.add(self.tree.focus()))
+        self.tree.bind("<<TreeviewClose>>", lambda e: self._open.discard(self.tree.focus()))
+
+    # --- data model -------------------------------------------------------
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _iid(self, row):
+        return str(row[self.key_index])
+
+    def rows(self):
+        return [self._rows[iid] for iid in self._keys]
+
+    def set_rows(self, rows):
+        """Replaces the data set; only rows in view that changed touch Tk."""
+        self._keys = []
+        self._rows = {}
+        for row in rows:
+            iid = self._iid(row)
+            if iid not in self._rows:
+                self._keys.append(iid)
+            self._rows[iid] = tuple(row)
+        for iid in [iid for iid in self._children if iid not in self._rows]:
+            del self._children[iid]
+        self._open &= set(self._rows)
+        self._render()
+
+    def extend_rows(self, rows):
+        for row in rows:
+            iid = self._iid(row)
+            if iid not in self._rows:
+                self._keys.append(iid)
+            self._rows[iid] = tuple(row)
+        self._render()
+
+    def upsert_row(self, row):
+        iid = self._iid(row)
+        if iid not in self._rows:
+            self._keys.append(iid)
+        self._rows[iid] = tuple(row)
+        self._render()
+
+    def delete_row(self, key):
+        iid = str(key)
+        if iid in self._rows:
+            del self._rows[iid]
+            self._children.pop(iid, None)
+            self._open.discard(iid)
+            self._keys.remove(iid)
+            self._render()
+
+    def set_children(self, children_by_key):
+        """Attaches child rows: {key: [values, ...]}; keys not loaded are ignored."""
+        for key, children in children_by_key.items():
+            iid = str(key)
+            if iid in self._rows:
+                self._children[iid] = tuple(tuple(values) for values in children)
+        self._render()
+
+    def parent_key(self, iid):
+        """The row item id owning ``iid`` (itself for a top-level row)."""
+        return iid.split("/", 1)[0]
+
+    def clear(self):
+        self.set_rows([])
+
+    # --- rendering --------------------------------------------------------
+
+    def _visible_count(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return int(self.tree.cget("height") or 10)
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or 20
+        return max(1, height // int(row_height))
+
+    def _render(self):
+        visible = self._visible_count()
+        self._offset = max(0, min(self._offset, len(self._keys) - visible))
+        window = self._keys[self._offset:self._offset + visible + self.buffer]
+        wanted = set(window)
+
+        self._rendering = True
+        try:
+            for iid in self.tree.get_children():
+                if iid not in wanted:
+                    self.tree.delete(iid)
+                    self._shown.pop(iid, None)
+                    self._shown_children.pop(iid, None)
+
+            current = list(self.tree.get_children())
+            in_order = [iid for iid in window if iid in self._shown] == current
+            for position, iid in enumerate(window):
+                values = self._rows[iid]
+                if iid not in self._shown:
+                    self.tree.insert("", position, iid=iid, values=values, open=iid in self._open)
+                else:
+                    if self._shown[iid] != values:
+                        self.tree.item(iid, values=values)
+                    if not in_order:
+                        self.tree.move(iid, "", position)
+                self._shown[iid] = values
+                self._sync_children(iid)
+            self.tree.yview_moveto(0)
+        finally:
+            self._rendering = False
+
+        total = len(self._keys)
+        if total:
+            self.scrollbar.set(self._offset / total, min(1.0, (self._offset + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+        if (self.on_scroll_end is not None and not self._end_pending
+                and self._offset + visible + self.buffer >= total):
+            self._end_pending = True
+            self.after_idle(self._fire_scroll_end)
+
+    def _sync_children(self, iid):
+        children = self._children.get(iid, ())
+        if self._shown_children.get(iid, ()) == children:
+            return
+        self.tree.delete(*self.tree.get_children(iid))
+        for n, values in enumerate(children):
+            self.tree.insert(iid, "end", iid=f"{iid}/{n}", values=values)
+        self._shown_children[iid] = children
+
+    def _fire_scroll_end(self):
+        self._end_pending = False
+        self.on_scroll_end()
+
+    # --- scrolling --------------------------------------------------------
+
+    def _scroll_by(self, rows):
+        self._offset += rows
+        self._render()
+        return "break"
+
+    def _on_wheel(self, event):
+        step = -1 if event.delta > 0 else 1
+        if abs(event.delta) >= 120:
+            step *= abs(event.delta) // 120
+        return self._scroll_by(3 * step)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._offset = int(float(amount) * len(self._keys))
+        elif unit == "pages":
+            self._offset += int(amount) * self._visible_count()
+        else:
+            self._offset += int(amount)
+        self._render()
+
+    def _on_tree_scroll(self, first, last):
+        # The Treeview scrolled itself (keyboard navigation, see()): fold that
+        # movement into our offset and pin the materialized window to the top.
+        if self._rendering or float(first) <= 0:
+            return
+        shown = len(self.tree.get_children())
+        self._offset += max(1, int(round(float(first) * shown)))
+        self.after_idle(self._render)
+
+
+def _run_inline(fn, on_done):
+    on_done(fn())
+
+
+class PagedTreeLoader:
+    """Feeds a VirtualTable one keyset page at a time as the user scrolls down.
+
+    ``runner(fn, on_done=...)`` decides where the fetches run; the default
+    runs them inline, InventoryApp.run_db runs them on a worker thread.
+    ``on_rows(rows)`` is called with every batch of rows put in the table.
+    """
+
+    def __init__(self, table, fetch_page, runner=None, on_rows=None):
+        self.table = table
+        self.fetch_page = fetch_page   # fetch_page(after) -> (rows, next_after)
+        self.runner = runner or _run_inline
+        self.on_rows = on_rows
+        self.after = None
+        self.exhausted = False
+        self._loading = False
+        self._generation = 0           # bumped by refresh() to drop stale pages
+        table.on_scroll_end = self.load_more
+
+    def refresh(self):
+        """Re-reads as many rows as are loaded and applies them as a diff."""
+        wanted = max(len(self.table), 1)
+        self._generation += 1
+        generation = self._generation
+        self._loading = True
+
+        def fetch():
+            rows = []
+            after = None
+            while True:
+                page, after = self.fetch_page(after)
+                rows.extend(page)
+                if after is None or len(rows) >= wanted:
+                    return rows, after
+
+        def apply(result):
+            if generation != self._generation:
+                return
+            rows, self.after = result
+            self.exhausted = self.after is None
+            self._loading = False
+            self.table.set_rows(rows)
+            if self.on_rows:
+                self.on_rows(rows)
+
+        self.runner(fetch, on_done=apply)
+
+    def load_more(self):
+        if self.exhausted or self._loading:
+            return
+        self._loading = True
+        generation = self._generation
+        after = self.after
+
+        def apply(result):
+            if generation != self._generation:
+                return
+            rows, self.after = result
+            self.exhausted = self.after is None
+            self._loading = False
+            self.table.extend_rows(rows)
+            if self.on_rows:
+                self.on_rows(rows)
+
+        self.runner(lambda: self.fetch_page(after), on_done=apply)